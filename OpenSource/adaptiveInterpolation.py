@@ -0,0 +1,139 @@
+import numpy as np
+from time import time
+
+import batchInterpolation
+import polyInterpolation
+
+# Methods of the adaptive mode, from the cheapest to the most expensive
+ladder = ['BiLi4', 'BiQ9', 'BiC16']
+
+# This function computes a cheap roughness metric of the central pixel from its 5*5 matrix
+def roughness(rasterBlock_elev):
+    '''
+    The second differences bound the error of a bilinear surface inside the central pixel ((|d2x| + |d2y|) / 8), and the third
+    differences bound the error of a biquadratic surface ((|d3x| + |d3y|) / 16)
+    :param rasterBlock_elev: (N, 5, 5) elevations of the pixels
+    :return: two (N,) arrays: estimated error (in elevation units) of BiLi4 and of BiQ9
+    '''
+    z = rasterBlock_elev
+    d2x = z[:, 2, 1] - 2 * z[:, 2, 2] + z[:, 2, 3]
+    d2y = z[:, 1, 2] - 2 * z[:, 2, 2] + z[:, 3, 2]
+    d3x = (z[:, 2, 4] - 2 * z[:, 2, 3] + 2 * z[:, 2, 1] - z[:, 2, 0]) / 2
+    d3y = (z[:, 0, 2] - 2 * z[:, 1, 2] + 2 * z[:, 3, 2] - z[:, 4, 2]) / 2
+    return (np.abs(d2x) + np.abs(d2y)) / 8, (np.abs(d3x) + np.abs(d3y)) / 16
+
+# This function selects the lowest-order method of each point that meets the tolerance
+def selectMethods(rasterBlock_elev, tolerance):
+    '''
+    :param rasterBlock_elev: (N, 5, 5) elevations of the pixels
+    :param tolerance: maximum estimated error (in elevation units) of a lower-order method
+    :return: (N,) index of the method of each point in ladder (windows with nodata use BiC16)
+    '''
+    errorBiLi, errorBiQ = roughness(rasterBlock_elev)
+    choice = np.full(len(rasterBlock_elev), 2, dtype='int64')
+    choice[errorBiQ <= tolerance] = 1
+    choice[errorBiLi <= tolerance] = 0
+    choice[np.isnan(rasterBlock_elev).any(axis=(1, 2))] = 2 # nodata pixels that the roughness does not use
+    return choice
+
+# This function interpolates N points with the method selected for each of them
+def interpolateAdaptive(x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, cellSize, tolerance):
+    '''
+    The points are evaluated in vectorized groups, one per method
+    :param x: (N,) x coordinates of the points in the local coordinate system of their 5*5 matrix
+    :param y: (N,) y coordinates of the points in the local coordinate system of their 5*5 matrix
+    :param rasterBlock_x: (5, 5) x coordinates of the pixels
+    :param rasterBlock_y: (5, 5) y coordinates of the pixels
+    :param rasterBlock_elev: (N, 5, 5) elevations of the pixels
+    :param cellSize: raster cell size
+    :param tolerance: see selectMethods
+    :return: (N,) estimated elevations and (N,) index of the method of each point in ladder
+    '''
+    choice = selectMethods(rasterBlock_elev, tolerance)
+    z = np.full(len(x), np.nan)
+    for i, mth in enumerate(ladder):
+        group = np.flatnonzero(choice == i)
+        if len(group):
+            z[group] = batchInterpolation.interpolateMethod(mth, x[group], y[group], rasterBlock_x, rasterBlock_y,
+                                                            rasterBlock_elev[group], cellSize)
+    return z, choice
+
+class AdaptiveStats(object):
+    '''
+    Accumulator of the adaptive mode: number of points per method and, for the points compared with BiC16, the compute saved
+    (measured, and modeled by the size of the kernels) and the error added
+    '''
+    def __init__(self):
+        self.counts = np.zeros(len(ladder), dtype='int64')
+        self.secondsAdaptive = 0.0
+        self.secondsFull = 0.0
+        self.compared = 0
+        self.count = 0
+        self.sumAbs = 0.0
+        self.sumSq = 0.0
+        self.maxAbs = 0.0
+
+    def update(self, choice, z, zFull, secondsAdaptive, secondsFull=0.0):
+        '''
+        :param choice: (n,) index of the method of each point in ladder
+        :param z: (k,) adaptive estimates of the points compared with BiC16 (empty if none is compared)
+        :param zFull: (k,) BiC16 estimates of the same points
+        :param secondsAdaptive: time of the adaptive mode on the n points
+        :param secondsFull: time of BiC16 on the k points
+        '''
+        self.counts += np.bincount(choice, minlength=len(ladder))
+        self.secondsAdaptive += secondsAdaptive
+        self.secondsFull += secondsFull
+        self.compared += len(zFull)
+        added = np.abs(np.asarray(z) - np.asarray(zFull))
+        added = added[~np.isnan(added)]
+        self.count += len(added)
+        self.sumAbs += added.sum()
+        self.sumSq += (added ** 2).sum()
+        self.maxAbs = max(self.maxAbs, added.max()) if len(added) else self.maxAbs
+
+    def summary(self):
+        '''
+        The measured compute saved compares the time per point of the adaptive mode with the time per point of BiC16 on the compared
+        points; it and the error added are None when no point was compared
+        :return: a dictionary with the number of points per method, the compute saved (fraction) and the error added (elevation units)
+        '''
+        # cost of a point: weights (coefficients * neighbor pixels) and their dot product with the elevations
+        cost = np.array([(polyInterpolation.polyMethods[mth][0] + 1) * polyInterpolation.stencilKernel(mth).shape[1] for mth in ladder])
+        points = self.counts.sum()
+        report = dict((mth, int(n)) for mth, n in zip(ladder, self.counts))
+        report.update({'points': int(points), 'compared': int(self.compared),
+                       'computeSaved': 1 - (self.secondsAdaptive / points) / (self.secondsFull / self.compared)
+                                       if points and self.compared and self.secondsFull else None,
+                       'modeledComputeSaved': 1 - float((self.counts * cost).sum()) / (points * cost[-1]) if points else None,
+                       'meanAbsAdded': self.sumAbs / self.count if self.count else None,
+                       'rmsAdded': np.sqrt(self.sumSq / self.count) if self.count else None,
+                       'maxAbsAdded': self.maxAbs if self.count else None})
+        return report
+
+# This function runs the adaptive mode, and compares it with BiC16 on a random sample of the points
+def compareAdaptive(x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, cellSize, tolerance, stats, sample=0.0, rng=None):
+    '''
+    BiC16 is only evaluated on the sampled points, so the adaptive mode keeps its compute saving when the comparison is small or off
+    :param stats: an AdaptiveStats
+    :param sample: fraction of the points compared with BiC16 (0: no comparison, 1: all of the points)
+    :param rng: numpy random Generator of the sample
+    :return: (N,) adaptive estimates, (N,) index of the method of each point in ladder and (N,) BiC16 estimates (nan at the points
+             that are not compared)
+    '''
+    temp = time()
+    z, choice = interpolateAdaptive(x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, cellSize, tolerance)
+    secondsAdaptive = time() - temp
+
+    zFull = np.full(len(x), np.nan)
+    if sample >= 1:
+        compared = np.arange(len(x))
+    else:
+        compared = np.flatnonzero((rng or np.random.default_rng()).random(len(x)) < sample) if sample > 0 else np.arange(0)
+    temp = time()
+    if len(compared):
+        zFull[compared] = batchInterpolation.interpolateMethod('BiC16', x[compared], y[compared], rasterBlock_x, rasterBlock_y,
+                                                               rasterBlock_elev[compared], cellSize)
+    secondsFull = time() - temp if len(compared) else 0.0
+    stats.update(choice, z[compared], zFull[compared], secondsAdaptive, secondsFull)
+    return z, choice, zFull
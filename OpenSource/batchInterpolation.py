@@ -0,0 +1,98 @@
+import numpy as np
+
+# Import my modules
+import findValue # point indices and 5*5 matrices of the points
+import neighbors # create the proper contiguity configuration for an interpolation method
+import polyInterpolation # Polynomial interpolation
+import inverseDistanecWeighting # IDW interpolation
+import instrumentation # per-stage profiling
+
+# Contiguity configuration used by each interpolation method
+contiguity = {'WP': 1, 'WA4': 4, 'WA9': 9, 'WA16': 16, 'WA25': 25}
+contiguity.update((mth, polyInterpolation.polyMethods[mth][0]) for mth in polyInterpolation.polyMethods)
+
+# Weighted average (IDW) methods and the power of the inverse distance
+idwMethods = ['WA4', 'WA9', 'WA16', 'WA25']
+idwPower = 2
+
+# This function estimates the surface-adjusted elevation of N points with one interpolation method
+def interpolateMethod(method, x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, cellSize):
+    '''
+    :param method: interpolation method (see contiguity)
+    :param x: (N,) x coordinates of the points in the local coordinate system of their 5*5 matrix
+    :param y: (N,) y coordinates of the points in the local coordinate system of their 5*5 matrix
+    :param rasterBlock_x: (5, 5) or (N, 5, 5) x coordinates of the pixels
+    :param rasterBlock_y: (5, 5) or (N, 5, 5) y coordinates of the pixels
+    :param rasterBlock_elev: (N, 5, 5) elevations of the pixels
+    :param cellSize: raster cell size
+    :return: (N,) estimated elevations
+    '''
+    with instrumentation.stage('neighbor select'):
+        xCoor, yCoor, elev = neighbors.neibrBatch(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, contiguity[method])
+
+    if method == 'WP': # whithin a pixel
+        return elev[:, 0]
+    if method in idwMethods: # weighted average
+        with instrumentation.stage('evaluate'):
+            return inverseDistanecWeighting.IDWBatch(x, y, xCoor, yCoor, elev, idwPower, neighbors.centerColumn[contiguity[method]])
+    with instrumentation.stage('fit'):
+        weights = polyInterpolation.stencilWeights(x, y, cellSize, method)
+    with instrumentation.stage('evaluate'):
+        return np.sum(weights * elev, axis=-1)
+
+# This function estimates the surface-adjusted elevation of N points with several interpolation methods
+def interpolateWindows(x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, cellSize, methods):
+    '''
+    The inputs are the outputs of findValue.extractWindows
+    :return: a dictionary (method -> (N,) estimated elevations)
+    '''
+    return dict((mth, interpolateMethod(mth, x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, cellSize)) for mth in methods)
+
+# This function estimates the surface-adjusted elevation of N points, fitting each unique stencil only once
+def interpolateShared(X, Y, band, transform, cellSize, methods, nodata=None):
+    '''
+    Points that fall in the same pixel and quadrant have the same neighbor pixels, so they are grouped by (row, col, quadrant):
+    the 5*5 matrix, the neighbor pixels and the polynomial coefficients are computed once per group, and each point only evaluates
+    the shared polynomial at its own coordinates
+    :param X: (N,) x coordinates of points
+    :param Y: (N,) y coordinates of points
+    :param band: 2D array of elevations
+    :param transform: affine transform of the raster
+    :param cellSize: raster cell size
+    :param methods: list of interpolation methods (see contiguity)
+    :param nodata: nodata value of the raster
+    :return: a dictionary (method -> (N,) estimated elevations) and a report (points, unique stencils and their ratio)
+    '''
+    if len(X) == 0: # e.g. an empty chunk of points
+        return dict((mth, np.empty(0)) for mth in methods), {'points': 0, 'uniqueStencils': 0, 'ratio': 0.0}
+    with instrumentation.stage('window read'):
+        rows, cols = findValue.pointIndex(X, Y, transform)
+        x, y = findValue.localCoordinates(X, Y, rows, cols, transform)
+        q = neighbors.quadrant(x, y)
+
+        # one key per (row, col, quadrant); rows and columns outside of the raster are shifted to keep the key non-negative
+        rowMin, colMin = min(rows.min(), 0), min(cols.min(), 0)
+        key = ((rows - rowMin) * (cols.max() - colMin + 1) + (cols - colMin)) * 4 + q
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        rasterBlock_x, rasterBlock_y = findValue.localGrid(cellSize)
+        rasterBlock_elev = findValue.gatherWindows(band, rows[first], cols[first], nodata)
+
+    estimates = {}
+    for mth in methods:
+        with instrumentation.stage('neighbor select'):
+            xCoor, yCoor, elev = neighbors.neibrBatch(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x[first], y[first], contiguity[mth])
+        if mth == 'WP': # whithin a pixel
+            estimates[mth] = elev[inverse, 0]
+        elif mth in idwMethods: # weighted average (the weights depend on the position of each point)
+            with instrumentation.stage('evaluate'):
+                estimates[mth] = inverseDistanecWeighting.IDWBatch(x, y, xCoor[inverse], yCoor[inverse], elev[inverse], idwPower,
+                                                                    neighbors.centerColumn[contiguity[mth]])
+        else:
+            with instrumentation.stage('fit'):
+                coefficients = polyInterpolation.stencilCoefficients(q[first], elev, mth)
+            with instrumentation.stage('evaluate'):
+                estimates[mth] = polyInterpolation.polyval2dBatch(x / cellSize, y / cellSize, coefficients[inverse])
+
+    report = {'points': len(X), 'uniqueStencils': len(first), 'ratio': len(first) / float(len(X)) if len(X) else 0.0}
+    return estimates, report
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+'''----------------------------------------------------------------------------------
+File Name      : benchmark.py
+
+-- Description --
+**Performance benchmark of the interpolation stages on synthetic DEMs
+**Analytic and fractal surfaces are generated at several resolutions together with random points,
+then the throughput (points/s) and peak memory of each stage are measured for several point counts.
+The batch stages are checked against the per-point reference functions for numerical parity.
+The results are saved as a JSON file so regressions can be tracked.
+----------------------------------------------------------------------------------'''
+# Import modules
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from time import time
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+# Import my modules
+import findValue
+import neighbors
+import polyInterpolation
+import inverseDistanecWeighting
+import batchInterpolation
+import demPyramid
+
+# Methods of the full pipeline
+methods = ['WP', 'WA4', 'Li3', 'BiLi4', 'BiQ9', 'BiC16']
+polyMethods = [mth for mth in methods if mth in polyInterpolation.polyMethods]
+
+# This function creates an analytic surface (a combination of hills and a trend) for UTM coordinates
+def analyticSurface(X, Y, extent):
+    '''
+    :param X: x coordinates (relative to the lower left corner of the study area)
+    :param Y: y coordinates (relative to the lower left corner of the study area)
+    :param extent: width of the study area in meters
+    :return: elevations
+    '''
+    u, v = 2 * np.pi * X / extent, 2 * np.pi * Y / extent
+    return 500 + 0.01 * X + 150 * np.sin(3 * u) * np.cos(2 * v) + 40 * np.cos(11 * u + 7 * v)
+
+# This function creates a fractal surface with spectral synthesis (power-law spectrum)
+def fractalSurface(size, cellSize, beta=3.2, relief=300.0, seed=0):
+    '''
+    :param size: number of rows (and columns) of the DEM
+    :param cellSize: raster cell size (the frequencies of the spectrum are in cycles per meter)
+    :param beta: spectral exponent (higher is smoother)
+    :param relief: standard deviation of the elevations
+    :param seed: random seed
+    :return: 2D array of elevations
+    '''
+    rng = np.random.default_rng(seed)
+    fy = np.fft.fftfreq(size, cellSize)[:, np.newaxis]
+    fx = np.fft.rfftfreq(size, cellSize)[np.newaxis, :]
+    f = np.sqrt(fx ** 2 + fy ** 2)
+    f[0, 0] = np.inf
+    spectrum = f ** (-beta / 2.0) * np.exp(2j * np.pi * rng.random(f.shape))
+    elev = np.fft.irfft2(spectrum, s=(size, size))
+    return 500 + relief * (elev - elev.mean()) / elev.std()
+
+# This function writes a synthetic DEM as a GeoTIFF
+def writeDEM(path, elev, cellSize, west=400000.0, north=3960000.0):
+    with rasterio.open(path, 'w', driver='GTiff', height=elev.shape[0], width=elev.shape[1], count=1, dtype='float32',
+                       transform=from_origin(west, north, cellSize, cellSize), nodata=-9999, tiled=True) as dst:
+        dst.write(elev.astype('float32'), 1)
+    return path
+
+# This function creates the synthetic DEMs of all surfaces and resolutions
+def makeDEMs(directory, extent, resolutions, west=400000.0, north=3960000.0):
+    '''
+    The fractal surface is generated once at the finest resolution and aggregated (block means) to the coarser resolutions, so
+    all of the fractal DEMs have the same terrain. The resolutions are snapped to multiples of the finest resolution
+    (see demPyramid.levelFactor)
+    :return: list of (surface name, resolution, path)
+    '''
+    finest = min(resolutions)
+    fractal = fractalSurface(int(extent // finest), finest)
+    DEMs = []
+    for factor in sorted(set(demPyramid.levelFactor(res, finest) for res in resolutions)):
+        res = factor * finest
+        size = int(extent // finest) // factor
+        centers = (np.arange(size) + 0.5) * res
+        X, Y = np.meshgrid(centers, extent - centers)
+        DEMs.append(('analytic', res, writeDEM(os.path.join(directory, 'analytic{:g}.tif'.format(res)),
+                                               analyticSurface(X, Y, extent), res, west, north)))
+        DEMs.append(('fractal', res, writeDEM(os.path.join(directory, 'fractal{:g}.tif'.format(res)),
+                                              demPyramid.aggregate(fractal, factor)[0], res, west, north)))
+    return DEMs
+
+# This function creates random points that are at least 3 pixels away from the edges of the DEM
+def randomPoints(n, dataset, seed=0):
+    rng = np.random.default_rng(seed)
+    left, bottom, right, top = dataset.bounds
+    margin = 3 * dataset.res[0]
+    return rng.uniform(left + margin, right - margin, n), rng.uniform(bottom + margin, top - margin, n)
+
+# This function runs a function and measures its wall time and peak memory
+def measure(func, *args):
+    '''
+    The function is run twice: the wall time is measured without tracemalloc (which slows down every allocation), and the
+    peak memory is measured in a second run under tracemalloc
+    :return: (seconds, peak memory in bytes, result of the function)
+    '''
+    temp = time()
+    result = func(*args)
+    seconds = time() - temp
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, result
+
+# This function runs the per-point reference functions (the original workflow of main.py) for a few points
+def referenceEstimates(X, Y, dataset):
+    '''
+    :return: a dictionary (stage -> seconds) and a dictionary (method -> (N,) estimated elevations)
+    '''
+    cellSize = dataset.res[0]
+    seconds = dict((stage, 0.0) for stage in ['extractWindow', 'neibr', 'IDW', 'polyfit2d/polyval2d'])
+    estimates = dict((mth, np.zeros(len(X))) for mth in methods)
+    for i in range(len(X)):
+        temp = time()
+        x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = findValue.extractWindow(X[i], Y[i], dataset, cellSize)
+        seconds['extractWindow'] += time() - temp
+
+        temp = time()
+        stencils = dict((m, neighbors.neibr(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, m)) for m in [1, 3, 4, 9, 16])
+        seconds['neibr'] += time() - temp
+        estimates['WP'][i] = stencils[1][2]
+
+        temp = time()
+        estimates['WA4'][i] = inverseDistanecWeighting.IDW(x, y, stencils[4][0], stencils[4][1], stencils[4][2], 2)
+        seconds['IDW'] += time() - temp
+
+        temp = time()
+        for mth in polyMethods:
+            m, order = polyInterpolation.polyMethods[mth]
+            estimates[mth][i] = polyInterpolation.polyval2d(x, y, polyInterpolation.polyfit2d(stencils[m][0], stencils[m][1], stencils[m][2], order))
+        seconds['polyfit2d/polyval2d'] += time() - temp
+    return seconds, estimates
+
+# This function measures all of the batch stages of one DEM for one point count
+def benchmarkBatch(X, Y, dataset, band):
+    '''
+    :return: a dictionary (stage -> (seconds, peak memory)) and a dictionary (method -> (N,) estimated elevations)
+    '''
+    cellSize = dataset.res[0]
+    stages = {}
+    seconds, peak, windows = measure(findValue.extractWindows, X, Y, band, dataset.transform, cellSize, dataset.nodata)
+    stages['extractWindows'] = (seconds, peak)
+    x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = windows
+
+    def neibrStage():
+        return [neighbors.neibrBatch(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, m) for m in [1, 3, 4, 9, 16]]
+    seconds, peak, _ = measure(neibrStage)
+    stages['neibrBatch'] = (seconds, peak)
+
+    seconds, peak, _ = measure(batchInterpolation.interpolateMethod, 'WA4', x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, cellSize)
+    stages['IDW'] = (seconds, peak)
+
+    def polyBatchStage(): # one linear solve per point (polyfit2dBatch/polyval2dBatch)
+        for mth in polyMethods:
+            xCoor, yCoor, elev = neighbors.neibrBatch(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, polyInterpolation.polyMethods[mth][0])
+            polyInterpolation.polyInterpBatch(x, y, xCoor, yCoor, elev, mth)
+    seconds, peak, _ = measure(polyBatchStage)
+    stages['polyfit2dBatch/polyval2dBatch'] = (seconds, peak)
+
+    def polyKernelStage(): # precomputed kernels
+        for mth in polyMethods:
+            batchInterpolation.interpolateMethod(mth, x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, cellSize)
+    seconds, peak, _ = measure(polyKernelStage)
+    stages['polyKernel'] = (seconds, peak)
+
+    def pipeline():
+        windows = findValue.extractWindows(X, Y, band, dataset.transform, cellSize, dataset.nodata)
+        return batchInterpolation.interpolateWindows(*(windows + (cellSize, methods)))
+    seconds, peak, estimates = measure(pipeline)
+    stages['pipeline'] = (seconds, peak)
+    return stages, estimates
+
+# This function runs the benchmark on all synthetic DEMs and point counts
+def runBenchmark(directory, extent, resolutions, pointCounts, referencePoints):
+    '''
+    :return: list of records (one per surface, resolution, stage and point count)
+    '''
+    records = []
+    for surface, res, path in makeDEMs(directory, extent, resolutions):
+        with rasterio.open(path) as dataset:
+            band = findValue.readBand(dataset)
+            for n in pointCounts:
+                X, Y = randomPoints(n, dataset)
+                stages, estimates = benchmarkBatch(X, Y, dataset, band)
+                for stage, (seconds, peak) in stages.items():
+                    records.append({'surface': surface, 'resolution': res, 'stage': stage, 'points': n, 'seconds': seconds,
+                                    'pointsPerSecond': n / seconds if seconds else None, 'peakMemory': peak})
+
+                # per-point reference and numerical parity of the batch path
+                nRef = min(n, referencePoints)
+                if nRef:
+                    seconds, reference = referenceEstimates(X[:nRef], Y[:nRef], dataset)
+                    for stage in seconds:
+                        records.append({'surface': surface, 'resolution': res, 'stage': stage + ' (reference)', 'points': nRef,
+                                        'seconds': seconds[stage], 'pointsPerSecond': nRef / seconds[stage] if seconds[stage] else None})
+                    for mth in methods:
+                        records.append({'surface': surface, 'resolution': res, 'stage': 'parity ' + mth, 'points': nRef,
+                                        'maxAbsDiff': float(np.nanmax(np.abs(estimates[mth][:nRef] - reference[mth])))})
+                print (surface + ' {:g}m, '.format(res) + str(n) + ' points: ' +
+                       str(int(n / stages['pipeline'][0])) + ' points/s (full pipeline)')
+    return records
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark of the interpolation stages on synthetic DEMs')
+    parser.add_argument('--output', default='benchmark.json', help='JSON file of the results')
+    parser.add_argument('--extent', type=float, default=20000.0, help='width of the synthetic study area in meters')
+    parser.add_argument('--resolutions', type=float, nargs='+', default=[10, 30, 100, 1000])
+    parser.add_argument('--points', type=int, nargs='+', default=[1000, 10000, 100000, 1000000, 10000000],
+                        help='point counts (e.g. 1000 ... 10000000)')
+    parser.add_argument('--reference-points', type=int, default=1000,
+                        help='number of points processed with the per-point reference functions (parity check)')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        records = runBenchmark(directory, args.extent, args.resolutions, args.points, args.reference_points)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump({'extent': args.extent, 'resolutions': args.resolutions, 'points': args.points, 'records': records}, f, indent=1)
+    print ('Results are saved in ' + args.output)
@@ -0,0 +1,177 @@
+import numpy as np
+from collections import OrderedDict
+from rasterio.windows import Window
+
+import findValue
+import instrumentation
+
+# Width of the halo read around each block, so the 5*5 matrix of any point inside the block is available
+halo = 2
+
+# This function returns the block shape used for scheduling the points of a raster
+def blockShape(dataset, defaultShape=(256, 256)):
+    '''
+    The native tiling of the raster is used when it is tiled; striped rasters (e.g. ESRI Grid or untiled GeoTIFF) use square blocks
+    :param dataset: a raster object imported by Rasterio
+    :param defaultShape: block shape (rows, cols) for striped rasters
+    :return: (rows, cols) of a block
+    '''
+    rows, cols = dataset.block_shapes[0]
+    if rows < 64 or cols < 64:
+        return defaultShape
+    return rows, cols
+
+# This function interleaves the bits of the block rows and columns (Morton / Z-order)
+def mortonKey(blockRows, blockCols):
+    '''
+    Sorting the points with this key visits the blocks in Z-order, so neighboring blocks are processed close in time
+    :param blockRows: array of block rows (non-negative)
+    :param blockCols: array of block columns (non-negative)
+    :return: array of Morton keys
+    '''
+    key = np.zeros(np.shape(blockRows), dtype='uint64')
+    blockRows = np.asarray(blockRows).astype('uint64')
+    blockCols = np.asarray(blockCols).astype('uint64')
+    for bit in range(32):
+        key |= ((blockCols >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit)
+        key |= ((blockRows >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit + 1)
+    return key
+
+class BlockCache(object):
+    '''
+    A bounded LRU cache of raster blocks, each one read with a 2-pixel halo
+    Pixels outside of the raster and nodata pixels are stored as nan
+    '''
+    def __init__(self, dataset, maxBlocks=64, shape=None):
+        '''
+        :param dataset: a raster object imported by Rasterio
+        :param maxBlocks: maximum number of blocks kept in memory
+        :param shape: block shape (rows, cols); the blockShape function is used by default
+        '''
+        self.dataset = dataset
+        self.maxBlocks = maxBlocks
+        self.shape = shape or blockShape(dataset)
+        self.blocks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytesRead = 0
+
+    def readBlock(self, blockRow, blockCol):
+        '''
+        This function reads a block and its halo from the raster (the parts outside of the raster are filled with nan)
+        :return: 2D array of elevations (float64)
+        '''
+        rows, cols = self.shape
+        rowStart, colStart = blockRow * rows - halo, blockCol * cols - halo
+        block = np.full((rows + 2 * halo, cols + 2 * halo), np.nan)
+
+        # the part of the block (and its halo) that overlaps the raster
+        r0, r1 = max(rowStart, 0), min(rowStart + rows + 2 * halo, self.dataset.height)
+        c0, c1 = max(colStart, 0), min(colStart + cols + 2 * halo, self.dataset.width)
+        if r0 < r1 and c0 < c1:
+            data = self.dataset.read(1, window=Window(c0, r0, c1 - c0, r1 - r0))
+            self.bytesRead += data.nbytes
+            data = data.astype('float64')
+            if self.dataset.nodata is not None:
+                data[data == self.dataset.nodata] = np.nan
+            block[r0 - rowStart:r1 - rowStart, c0 - colStart:c1 - colStart] = data
+        return block
+
+    def getBlock(self, blockRow, blockCol):
+        '''
+        This function returns a block from the cache, reading it (and evicting the least recently used block) if needed
+        '''
+        key = (blockRow, blockCol)
+        if key in self.blocks:
+            self.hits += 1
+            self.blocks.move_to_end(key)
+            return self.blocks[key]
+
+        self.misses += 1
+        block = self.readBlock(blockRow, blockCol)
+        self.blocks[key] = block
+        if len(self.blocks) > self.maxBlocks:
+            self.blocks.popitem(last=False)
+            self.evictions += 1
+        return block
+
+    def report(self):
+        '''
+        :return: a dictionary with the cache statistics (hits, misses, hit rate, evictions and bytes read)
+        '''
+        requests = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hitRate': self.hits / float(requests) if requests else 0.0,
+                'evictions': self.evictions, 'bytesRead': self.bytesRead}
+
+# This function sorts the points by raster block and extracts their 5*5 matrices block by block
+def iterBlockWindows(X, Y, cache, stageName='window read'):
+    '''
+    Each block (plus its halo) is requested from the cache once, and the points inside it are processed in a batch
+    :param X: (N,) x coordinates of points
+    :param Y: (N,) y coordinates of points
+    :param cache: a BlockCache of the raster
+    :param stageName: stage of the instrumentation module that the reads are recorded in
+    :return: a generator of (index, x, y, rasterBlock_elev) per block, where index is the position of the points in X, Y and
+             x, y, rasterBlock_elev are the same as in findValue.extractWindows
+    '''
+    transform = cache.dataset.transform
+    rows, cols, schedule = blockSchedule(X, Y, transform, cache.shape)
+    for index, blockRow, blockCol in schedule:
+        with instrumentation.stage(stageName):
+            bytesRead = cache.bytesRead
+            block = cache.getBlock(blockRow, blockCol)
+            instrumentation.profiler.addBytes(stageName, cache.bytesRead - bytesRead)
+            x, y, rasterBlock_elev = blockWindows(X, Y, rows, cols, index, block, blockRow, blockCol, cache.shape, transform)
+        yield index, x, y, rasterBlock_elev
+
+# This function sorts the points by raster block (in Morton order)
+def blockSchedule(X, Y, transform, shape):
+    '''
+    :param X: (N,) x coordinates of points
+    :param Y: (N,) y coordinates of points
+    :param transform: affine transform of the raster
+    :param shape: block shape (rows, cols)
+    :return: the rows and columns of the points, and a list of (index, block row, block column), where index is the position of
+             the points of the block in X, Y
+    '''
+    if len(X) == 0:
+        return np.zeros(0, dtype='int64'), np.zeros(0, dtype='int64'), []
+    rows, cols = findValue.pointIndex(X, Y, transform)
+    blockRows, blockCols = rows // shape[0], cols // shape[1]
+
+    # points outside of the raster are shifted so the Morton key stays non-negative; they get a block full of nan
+    key = mortonKey(blockRows - min(blockRows.min(), 0), blockCols - min(blockCols.min(), 0))
+    order = np.argsort(key, kind='stable')
+    starts = np.flatnonzero(np.r_[True, key[order][1:] != key[order][:-1]])
+    schedule = []
+    for start, stop in zip(starts, np.r_[starts[1:], len(X)]):
+        index = order[start:stop]
+        schedule.append((index, blockRows[index[0]], blockCols[index[0]]))
+    return rows, cols, schedule
+
+# This function extracts the 5*5 matrices of the points of one block
+def blockWindows(X, Y, rows, cols, index, block, blockRow, blockCol, shape, transform):
+    '''
+    :return: x, y, rasterBlock_elev of the points (as in findValue.extractWindows)
+    '''
+    # rows and columns of the points inside the block (including the halo)
+    localRows = rows[index] - blockRow * shape[0] + halo
+    localCols = cols[index] - blockCol * shape[1] + halo
+    rasterBlock_elev = findValue.gatherWindows(block, localRows, localCols)
+
+    x, y = findValue.localCoordinates(np.take(X, index), np.take(Y, index), rows[index], cols[index], transform)
+    return x, y, rasterBlock_elev
+
+# This function extracts the values of N points block by block (e.g. the benchmark elevations from a DEM larger than RAM)
+def sampleValues(X, Y, cache):
+    '''
+    :param X: (N,) x coordinates of points
+    :param Y: (N,) y coordinates of points
+    :param cache: a BlockCache of the raster
+    :return: (N,) elevations (float64); points outside of the raster and nodata pixels are nan
+    '''
+    val = np.full(len(X), np.nan)
+    for index, _, _, rasterBlock_elev in iterBlockWindows(X, Y, cache, 'benchmark sample'):
+        val[index] = rasterBlock_elev[:, halo, halo]
+    return val
@@ -0,0 +1,89 @@
+import numpy as np
+
+import findValue
+import neighbors
+import polyInterpolation
+
+# This function returns the (row, col) offsets of the neighbor pixels of a method from the central pixel, for each quadrant
+def stencilOffsets(method):
+    '''
+    :param method: name of the method in polyInterpolation.polyMethods
+    :return: two (4, m) integer arrays (row offsets and column offsets)
+    '''
+    index = neighbors.stencilIndex[polyInterpolation.polyMethods[method][0]]
+    return index // 5 - 2, index % 5 - 2
+
+# This function computes the polynomial coefficients of every pixel and quadrant of a block of the DEM
+def blockCoefficients(padded, method):
+    '''
+    Each coefficient is a correlation of the (padded) elevations with one row of the inverse design matrix, so the whole block
+    is computed with m shifted array operations per quadrant instead of one linear solve per pixel
+    :param padded: 2D elevations of the block with a 2-pixel halo on each side
+    :param method: name of the method in polyInterpolation.polyMethods
+    :return: (rows, cols, 4, number of coefficients) coefficients in normalized cell units
+    '''
+    kernel = polyInterpolation.stencilKernel(method) # (4, number of coefficients, m)
+    rowOffsets, colOffsets = stencilOffsets(method)
+    rows, cols = padded.shape[0] - 4, padded.shape[1] - 4
+    coefficients = np.zeros((rows, cols, 4, kernel.shape[1]))
+    for q in range(4):
+        for j in range(kernel.shape[2]):
+            dr, dc = rowOffsets[q, j], colOffsets[q, j]
+            shifted = padded[2 + dr:2 + dr + rows, 2 + dc:2 + dc + cols]
+            coefficients[:, :, q, :] += shifted[:, :, np.newaxis] * kernel[q, :, j]
+    return coefficients
+
+# This function builds the coefficient cube (pixel * quadrant * coefficient) of a DEM for a polynomial method, block by block
+def buildCoefficientCube(band, method, nodata=None, blockSize=512, dtype='float64', path=None):
+    '''
+    After the cube is built, interpolating any number of points is a gather plus a polynomial evaluation (see cubeInterpolate)
+    :param band: 2D array of elevations (in memory or memory-mapped)
+    :param method: name of the method in polyInterpolation.polyMethods
+    :param nodata: nodata value of the DEM (nodata pixels and pixels outside of the DEM give nan coefficients)
+    :param blockSize: number of rows and columns of the blocks
+    :param dtype: data type of the cube
+    :param path: if given, the cube is written to a memory-mapped .npy file instead of RAM
+    :return: (rows, cols, 4, number of coefficients) array
+    '''
+    shape = (band.shape[0], band.shape[1], 4, polyInterpolation.stencilKernel(method).shape[1])
+    if path is None:
+        cube = np.empty(shape, dtype=dtype)
+    else:
+        cube = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+
+    for r0 in range(0, band.shape[0], blockSize):
+        for c0 in range(0, band.shape[1], blockSize):
+            r1, c1 = min(r0 + blockSize, band.shape[0]), min(c0 + blockSize, band.shape[1])
+
+            # the block with a 2-pixel halo (nan outside of the DEM)
+            padded = np.full((r1 - r0 + 4, c1 - c0 + 4), np.nan)
+            pr0, pc0 = max(r0 - 2, 0), max(c0 - 2, 0)
+            pr1, pc1 = min(r1 + 2, band.shape[0]), min(c1 + 2, band.shape[1])
+            padded[pr0 - r0 + 2:pr1 - r0 + 2, pc0 - c0 + 2:pc1 - c0 + 2] = band[pr0:pr1, pc0:pc1]
+            if nodata is not None:
+                padded[padded == nodata] = np.nan
+
+            cube[r0:r1, c0:c1] = blockCoefficients(padded, method)
+    return cube
+
+# This function interpolates the elevations of N points from a coefficient cube
+def cubeInterpolate(cube, X, Y, transform, cellSize, method):
+    '''
+    :param cube: coefficient cube returned by buildCoefficientCube
+    :param X: (N,) x coordinates of points
+    :param Y: (N,) y coordinates of points
+    :param transform: affine transform of the DEM
+    :param cellSize: raster cell size
+    :param method: name of the method in polyInterpolation.polyMethods
+    :return: (N,) estimated elevations (nan outside of the DEM)
+    '''
+    rows, cols = findValue.pointIndex(X, Y, transform)
+    x, y = findValue.localCoordinates(X, Y, rows, cols, transform)
+    inside = (rows >= 0) & (rows < cube.shape[0]) & (cols >= 0) & (cols < cube.shape[1])
+    z = np.full(len(rows), np.nan)
+
+    coefficients = cube[rows[inside], cols[inside], neighbors.quadrant(x[inside], y[inside])] # (n, number of coefficients)
+    order = polyInterpolation.polyMethods[method][1]
+    terms = polyInterpolation.polyTerms2d(x[inside] / cellSize, y[inside] / cellSize, order)
+    z[inside] = np.sum(terms * coefficients, axis=-1)
+    return z
@@ -0,0 +1,147 @@
+import warnings
+import numpy as np
+import rasterio
+
+import findValue
+import pointStream
+import residualStats
+import instrumentation
+
+# This function aggregates a DEM by an integer factor (each block of factor * factor pixels becomes one pixel)
+def aggregate(elev, factor, method='mean', count=None, nodata=None, stripSize=2 ** 22):
+    '''
+    The rows and columns that do not fill a whole block (at the right and bottom edges) are dropped, so the coarse DEM has the
+    same origin as the fine DEM. The blocks are aggregated in strips of about stripSize pixels of elev, so elev is never copied
+    as a whole (it can be a memory-mapped band)
+    :param elev: 2D array of elevations (nan or nodata at nodata pixels)
+    :param factor: aggregation factor
+    :param method: 'mean' or 'median' of the valid pixels of each block
+    :param count: number of benchmark pixels behind each pixel of elev (used for weighting the means); None means one per valid pixel
+    :param nodata: nodata value of elev
+    :param stripSize: number of pixels of elev aggregated at once
+    :return: the coarse elevations (nan where the whole block is nodata; data type of elev, float32 for integer DEMs) and the
+             number of benchmark pixels behind each coarse pixel
+    '''
+    if method not in ('mean', 'median'):
+        raise ValueError('Unknown aggregation method: ' + str(method))
+    rows, cols = elev.shape[0] // factor, elev.shape[1] // factor
+    coarse = np.empty((rows, cols), dtype=np.result_type(elev.dtype, np.float32))
+    total = np.empty((rows, cols))
+    step = max(1, stripSize // max(factor * factor * cols, 1)) # coarse rows per strip
+
+    for r0 in range(0, rows, step):
+        r1 = min(r0 + step, rows)
+        blocks = np.array(elev[r0 * factor:r1 * factor, :cols * factor], dtype='float64')
+        if nodata is not None:
+            blocks[blocks == nodata] = np.nan
+        blocks = blocks.reshape(r1 - r0, factor, cols, factor)
+        if count is None:
+            counts = (~np.isnan(blocks)).astype('float64')
+        else:
+            counts = count[r0 * factor:r1 * factor, :cols * factor].reshape(r1 - r0, factor, cols, factor)
+        total[r0:r1] = counts.sum(axis=(1, 3))
+
+        with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+            warnings.simplefilter('ignore', RuntimeWarning) # blocks without any valid pixel
+            if method == 'mean': # weighted by the number of benchmark pixels, so the mean of a level built from a level is exact
+                strip = np.nansum(blocks * counts, axis=(1, 3)) / total[r0:r1]
+            else: # median of the medians of the previous level
+                strip = np.nanmedian(blocks, axis=(1, 3))
+        strip[total[r0:r1] == 0] = np.nan
+        coarse[r0:r1] = strip
+    return coarse, total
+
+# This function returns the aggregation factor of a resolution (the nearest integer multiple of the cell size)
+def levelFactor(res, cellSize):
+    '''
+    A resolution that is not an integer multiple of the cell size (e.g. 1000 m from a 3 m benchmark) is snapped to the nearest
+    multiple (999 m), with a warning
+    :return: the aggregation factor
+    '''
+    factor = int(np.floor(res / float(cellSize) + 0.5))
+    if factor < 1:
+        raise ValueError('The resolution ' + str(res) + ' is finer than the benchmark cell size ' + str(cellSize))
+    if not np.isclose(factor * cellSize, res):
+        warnings.warn('The resolution ' + str(res) + ' is not a multiple of the benchmark cell size ' + str(cellSize) +
+                      '; it is snapped to ' + '{:g}'.format(factor * cellSize))
+    return factor
+
+# This function builds the levels of a DEM pyramid from the benchmark DEM
+def pyramidLevels(band, transform, cellSize, resolutions, nodata=None, method='mean'):
+    '''
+    Each level is aggregated from the coarsest previous level whose resolution divides its resolution (e.g. 12 m from 6 m,
+    9 m from 3 m), so most of the work is done on small arrays. The benchmark is not copied, the levels keep its data type, and a
+    level is released as soon as no coarser level is aggregated from it
+    :param band: 2D array of the benchmark elevations
+    :param transform: affine transform of the benchmark DEM
+    :param cellSize: cell size of the benchmark DEM
+    :param resolutions: resolutions of the levels (snapped to integer multiples of cellSize, see levelFactor)
+    :param nodata: nodata value of the benchmark DEM
+    :param method: 'mean' or 'median' (see aggregate)
+    :return: a generator of (resolution, elevations, transform, cell size), from the finest to the coarsest level; the resolution
+             is the snapped resolution
+    '''
+    factors = sorted(set(levelFactor(res, cellSize) for res in resolutions))
+    # source of each level: the coarsest finer level whose factor divides its factor (1: the benchmark)
+    sources = dict((g, max([f for f in factors if f < g and g % f == 0] or [1])) for g in factors)
+    levels = {} # factor -> (elevations, number of benchmark pixels)
+
+    for i, factor in enumerate(factors):
+        if factor not in levels:
+            source = sources[factor]
+            elev, count = levels[source] if source in levels else (band, None)
+            with instrumentation.stage('aggregate'):
+                levels[factor] = aggregate(elev, factor // source, method, count, nodata if source == 1 else None)
+        levelTransform = rasterio.Affine(transform.a * factor, transform.b, transform.c, transform.d, transform.e * factor, transform.f)
+        yield factor * cellSize, levels[factor][0], levelTransform, cellSize * factor
+
+        # the levels that are not the source of a coarser level are not needed anymore
+        elev = count = None # the locals do not keep a released level
+        for f in list(levels):
+            if f not in [sources[g] for g in factors[i + 1:]]:
+                del levels[f]
+
+# This function sweeps the interpolation methods over a dense range of resolutions derived from the benchmark DEM
+def sweepResolutions(X, Y, benchmark, resolutions, methods, aggregation='mean', chunkSize=100000, cache=None, backend=None):
+    '''
+    The levels of the pyramid are passed to the interpolation engine in memory (no intermediate rasters are written), one level
+    at a time, so only the levels that coarser levels are aggregated from are kept
+    :param X: (N,) x coordinates of points
+    :param Y: (N,) y coordinates of points
+    :param benchmark: path of the benchmark DEM
+    :param resolutions: resolutions of the sweep (snapped to integer multiples of the benchmark cell size, see levelFactor)
+    :param methods: list of interpolation methods (see batchInterpolation.contiguity)
+    :param aggregation: 'mean' or 'median'
+    :param chunkSize: number of points per chunk
+    :param cache: a rasterCache.RasterCache; if given, the benchmark DEM is memory-mapped from the cache
+    :param backend: backend of fusedKernels.interpolatePoints
+    :return: a residualStats.StatsTable (fields: method + resolution) and a DataFrame of the statistics by resolution and method
+    '''
+    X = np.asarray(X, dtype='float64')
+    Y = np.asarray(Y, dtype='float64')
+    with instrumentation.stage('open'):
+        src = rasterio.open(benchmark)
+    with src:
+        transform, cellSize, nodata = src.transform, src.res[0], src.nodata
+        with instrumentation.stage('window read'):
+            band = cache.band(benchmark)[0] if cache else findValue.readBand(src)
+            instrumentation.profiler.addBytes('window read', band.nbytes)
+
+    stats = residualStats.StatsTable([])
+    labels = []
+    for res, elev, levelTransform, levelCellSize in pyramidLevels(band, transform, cellSize, resolutions, nodata, aggregation):
+        fields = [mth + '{:g}'.format(res) for mth in methods]
+        levelStats = residualStats.StatsTable(fields)
+        for start in range(0, len(X), chunkSize):
+            rows = pointStream.evaluateChunk(X[start:start + chunkSize], Y[start:start + chunkSize], (band, transform, nodata),
+                                             [(elev, levelTransform, levelCellSize, None)], methods, backend=backend)
+            with instrumentation.stage('stats'):
+                for i, fld in enumerate(fields):
+                    levelStats.update(fld, rows[:, 1 + len(fields) + i])
+        stats.merge(levelStats)
+        labels += [(res, mth) for mth in methods]
+
+    frame = stats.toDataFrame()
+    frame.insert(0, 'method', [mth for res, mth in labels])
+    frame.insert(0, 'resolution', [res for res, mth in labels])
+    return stats, frame.reset_index(drop=True)
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+'''----------------------------------------------------------------------------------
+File Name      : elevationService.py
+
+-- Description --
+**Local HTTP service of surface-adjusted elevations
+**The DEMs are memory-mapped once (decoded to .npy files, or from the raster cache), and the kernels are kept warm.
+Concurrent queries are coalesced into vectorized batches within a small latency budget.
+  GET  /elevation?dem=dem10m&method=BiC16&x=...&y=...        one point
+  POST /elevation {"dem": "dem10m", "methods": ["BiC16"], "x": [...], "y": [...]}   a batch of points
+  GET  /stats                                                  latency percentiles (p50/p99) and throughput
+----------------------------------------------------------------------------------'''
+# Import modules
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import threading
+from time import time
+from collections import deque
+import queue
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import rasterio
+
+# Import my modules
+import batchInterpolation
+import parallelDriver
+import fusedKernels
+
+# This function memory-maps the elevation bands of the DEMs served by the service
+def loadDEMs(paths, cache=None, directory=None):
+    '''
+    The bands are not held in the memory of the process: the operating system pages in the parts of the DEMs that are queried
+    :param paths: list of DEM paths (the name of a DEM in the queries is the base name of its path, e.g. dem10m)
+    :param cache: a rasterCache.RasterCache; if given, the bands are memory-mapped from the cache
+    :param directory: directory of the decoded bands (.npy files) when there is no cache; a new temporary directory by default
+    :return: a dictionary (name -> (band, transform, cell size, nodata))
+    '''
+    if cache is None and directory is None:
+        directory = tempfile.mkdtemp(prefix='elevationService')
+    dems = {}
+    for i, path in enumerate(paths):
+        with rasterio.open(path) as src:
+            if cache:
+                band = cache.band(path)[0]
+            else:
+                band = np.load(parallelDriver.shareBand(path, os.path.join(directory, 'band' + str(i) + '.npy'))['path'], mmap_mode='r')
+            dems[os.path.splitext(os.path.basename(os.path.normpath(path)))[0]] = (band, src.transform, src.res[0], src.nodata)
+    if cache:
+        cache.flush()
+    return dems
+
+class _Request(object):
+    '''
+    A query waiting for its batch
+    '''
+    def __init__(self, dem, methods, X, Y):
+        self.dem = dem
+        self.methods = methods
+        self.X = X
+        self.Y = Y
+        self.start = time()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class MicroBatcher(object):
+    '''
+    This class coalesces the concurrent queries into vectorized batches: a batch is closed when it has maxBatch points or when
+    its first query has waited maxDelay seconds. The latency of the last queries and the throughput are recorded
+    '''
+    def __init__(self, dems, maxBatch=100000, maxDelay=0.002, history=10000, backend=None, timeout=30.0):
+        '''
+        :param dems: dictionary returned by loadDEMs
+        :param maxBatch: maximum number of points of a batch
+        :param maxDelay: latency budget (seconds) for collecting the queries of a batch
+        :param history: number of queries kept for the latency percentiles
+        :param backend: backend of fusedKernels.interpolatePoints
+        :param timeout: default time (seconds) a query waits for its batch
+        '''
+        self.dems = dems
+        self.maxBatch = maxBatch
+        self.maxDelay = maxDelay
+        self.timeout = timeout
+        self.backend = backend
+        self.queue = queue.Queue()
+        self.latencies = deque(maxlen=history)
+        self.lock = threading.Lock()
+        self.started = time()
+        self.requests = 0
+        self.points = 0
+        self.batches = 0
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def warmUp(self, methods):
+        '''
+        This function builds the kernels (and compiles the Numba backend) before the first query
+        '''
+        for name, (band, transform, cellSize, nodata) in self.dems.items():
+            X = np.array([transform.c + transform.a * band.shape[1] / 2.0])
+            Y = np.array([transform.f + transform.e * band.shape[0] / 2.0])
+            fusedKernels.interpolatePoints(X, Y, band, transform, cellSize, methods, nodata, backend=self.backend)
+
+    def query(self, dem, methods, X, Y, timeout=None):
+        '''
+        :param dem: name of the DEM
+        :param methods: list of interpolation methods (see batchInterpolation.contiguity)
+        :param X: (n,) x coordinates of points
+        :param Y: (n,) y coordinates of points
+        :param timeout: time (seconds) the query waits for its batch (self.timeout by default); TimeoutError is raised after it
+        :return: a dictionary (method -> (n,) estimated elevations)
+        '''
+        if not isinstance(dem, str) or dem not in self.dems:
+            raise KeyError('Unknown DEM: ' + str(dem))
+        if not isinstance(methods, (list, tuple)) or not all(isinstance(mth, str) for mth in methods):
+            raise ValueError('methods must be a list of method names')
+        for mth in methods:
+            if mth not in batchInterpolation.contiguity:
+                raise KeyError('Unknown method: ' + str(mth))
+        request = _Request(dem, list(methods), np.asarray(X, dtype='float64').ravel(), np.asarray(Y, dtype='float64').ravel())
+        if len(request.X) != len(request.Y):
+            raise ValueError('x and y have different lengths')
+        if not self.thread.is_alive():
+            raise RuntimeError('The batching thread is not running')
+        self.queue.put(request)
+        if not request.done.wait(self.timeout if timeout is None else timeout):
+            raise TimeoutError('The query timed out')
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self):
+        '''
+        :return: the queries of the next batch
+        '''
+        batch = [self.queue.get()]
+        deadline = batch[0].start + self.maxDelay
+        size = len(batch[0].X)
+        while size < self.maxBatch:
+            remaining = deadline - time()
+            try:
+                request = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.X)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                batch = self._collect()
+                self._evaluate(batch)
+            except Exception as error: # the thread keeps serving; the queries of the failed batch receive the error
+                for request in batch:
+                    if not request.done.is_set():
+                        request.error = error
+                        request.done.set()
+
+    def _evaluate(self, batch):
+        '''
+        This function evaluates a batch: one vectorized evaluation per DEM, for the union of the requested methods
+        '''
+        for dem in set(request.dem for request in batch):
+            requests = [request for request in batch if request.dem == dem]
+            methods = sorted(set(mth for request in requests for mth in request.methods))
+            try:
+                band, transform, cellSize, nodata = self.dems[dem]
+                X = np.concatenate([request.X for request in requests])
+                Y = np.concatenate([request.Y for request in requests])
+                estimates = fusedKernels.interpolatePoints(X, Y, band, transform, cellSize, methods, nodata, backend=self.backend)
+            except Exception as error:
+                for request in requests:
+                    request.error = error
+                    request.done.set()
+                continue
+            start = 0
+            for request in requests:
+                stop = start + len(request.X)
+                request.result = dict((mth, estimates[start:stop, methods.index(mth)]) for mth in request.methods)
+                start = stop
+        end = time()
+        with self.lock:
+            self.batches += 1
+            for request in batch:
+                self.requests += 1
+                self.points += len(request.X)
+                self.latencies.append(end - request.start)
+        for request in batch:
+            request.done.set()
+
+    def stats(self):
+        '''
+        :return: a dictionary with the counters of the service (latencies in seconds)
+        '''
+        with self.lock:
+            latencies = np.array(self.latencies)
+            uptime = time() - self.started
+            return {'requests': self.requests, 'points': self.points, 'batches': self.batches,
+                    'meanBatchRequests': self.requests / float(self.batches) if self.batches else 0.0,
+                    'p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                    'p99': float(np.percentile(latencies, 99)) if len(latencies) else None,
+                    'requestsPerSecond': self.requests / uptime, 'pointsPerSecond': self.points / uptime, 'uptime': uptime}
+
+# This function converts an array of elevations to a JSON list (nan -> null)
+def _toList(values):
+    return [None if np.isnan(v) else v for v in np.asarray(values, dtype='float64').tolist()]
+
+class ElevationHandler(BaseHTTPRequestHandler):
+    '''
+    HTTP interface of a MicroBatcher (the server has a batcher attribute)
+    '''
+    def _send(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _answer(self, dem, methods, X, Y, single):
+        try:
+            result = self.server.batcher.query(dem, methods, X, Y)
+        except (KeyError, ValueError) as error:
+            self._send(400, {'error': str(error).strip("'")})
+            return
+        except TimeoutError as error:
+            self._send(504, {'error': str(error)})
+            return
+        except Exception as error: # 503 if the batching thread is not running
+            self._send(500 if self.server.batcher.thread.is_alive() else 503, {'error': str(error)})
+            return
+        if single:
+            self._send(200, {'dem': dem, 'elevations': dict((mth, _toList(z)[0]) for mth, z in result.items())})
+        else:
+            self._send(200, {'dem': dem, 'elevations': dict((mth, _toList(z)) for mth, z in result.items())})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/stats':
+            self._send(200, self.server.batcher.stats())
+        elif url.path == '/elevation':
+            params = parse_qs(url.query)
+            try:
+                dem = params['dem'][0]
+                methods = params.get('method', ['BiC16'])
+                X, Y = [float(params['x'][0])], [float(params['y'][0])]
+            except (KeyError, ValueError):
+                self._send(400, {'error': 'dem, x and y are required'})
+                return
+            self._answer(dem, methods, X, Y, True)
+        else:
+            self._send(404, {'error': 'Unknown path'})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/elevation':
+            self._send(404, {'error': 'Unknown path'})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+            dem, X, Y = body['dem'], body['x'], body['y']
+            methods = body.get('methods', [body.get('method', 'BiC16')])
+        except (KeyError, ValueError, TypeError):
+            self._send(400, {'error': 'The body must be a JSON object with dem, x and y'})
+            return
+        self._answer(dem, methods, X, Y, False)
+
+    def log_message(self, format, *args): # the counters of /stats replace the access log
+        pass
+
+# This function creates the HTTP server of the service (call serve_forever to start it)
+def makeServer(dems, host='127.0.0.1', port=8080, maxBatch=100000, maxDelay=0.002, backend=None, warmMethods=None, timeout=30.0):
+    '''
+    :param dems: dictionary returned by loadDEMs
+    :param port: port of the server (0: any free port, see server.server_address)
+    :param timeout: time (seconds) a query waits for its batch before the server answers 504
+    :param warmMethods: methods whose kernels are built before the server starts
+    :return: the server; server.batcher is its MicroBatcher
+    '''
+    server = ThreadingHTTPServer((host, port), ElevationHandler)
+    server.daemon_threads = True
+    server.batcher = MicroBatcher(dems, maxBatch, maxDelay, backend=backend, timeout=timeout)
+    if warmMethods:
+        server.batcher.warmUp(warmMethods)
+    return server
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Local HTTP service of surface-adjusted elevations')
+    parser.add_argument('dems', nargs='+', help='paths of the DEMs (queried by their base name, e.g. dem10m)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch', type=int, default=100000, help='maximum number of points of a batch')
+    parser.add_argument('--max-delay', type=float, default=2.0, help='latency budget of a batch in milliseconds')
+    parser.add_argument('--backend', choices=['numba', 'numpy'], default=None, help='Numba when it is installed by default')
+    parser.add_argument('--timeout', type=float, default=30.0, help='time in seconds a query waits for its batch (then 504)')
+    parser.add_argument('--cache-dir', default=None, help='memory-map the DEMs from this raster cache directory')
+    args = parser.parse_args()
+
+    cache, directory = None, None
+    if args.cache_dir:
+        import rasterCache
+        cache = rasterCache.RasterCache(args.cache_dir)
+    else: # the bands are decoded once to memory-mapped files, removed when the server stops
+        directory = tempfile.mkdtemp(prefix='elevationService')
+    try:
+        server = makeServer(loadDEMs(args.dems, cache, directory), args.host, args.port, args.max_batch, args.max_delay / 1000.0,
+                            args.backend, ['WP', 'WA4', 'Li3', 'BiLi4', 'BiQ9', 'BiC16'], args.timeout)
+        print ('Serving ' + ', '.join(sorted(server.batcher.dems)) + ' on http://' + args.host + ':' + str(server.server_address[1]))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+    finally:
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
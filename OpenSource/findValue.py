@@ -1,4 +1,5 @@
 import numpy as np
+from rasterio.windows import Window
 
 def extractValue(x, y, dataset):
     '''
@@ -9,7 +10,25 @@ def extractValue(x, y, dataset):
     :return: return the elevation of point
     '''
     val = dataset.sample([(x, y)])
-    return val.next()[0]
+    return next(val)[0]
+
+def extractValues(X, Y, band, transform, nodata=None):
+    '''
+    This function is the vectorized version of extractValue: it extracts the values of N points from an elevation array
+    :param X: (N,) x coordinates of points
+    :param Y: (N,) y coordinates of points
+    :param band: 2D array of elevations (in memory or memory-mapped)
+    :param transform: affine transform of the raster
+    :param nodata: nodata value of the raster
+    :return: (N,) elevations (float64); points outside of the raster and nodata pixels are nan
+    '''
+    rows, cols = pointIndex(X, Y, transform)
+    inside = (rows >= 0) & (rows < band.shape[0]) & (cols >= 0) & (cols < band.shape[1])
+    val = np.full(len(rows), np.nan)
+    val[inside] = band[rows[inside], cols[inside]]
+    if nodata is not None:
+        val[val == nodata] = np.nan
+    return val
 
 def extractWindow(x, y, dataset, cellSize):
     '''
@@ -25,7 +44,7 @@ def extractWindow(x, y, dataset, cellSize):
     rasterBlock_elev = dataset.read(1, window=((row-2, row+3), (col-2, col+3))) # extract the 5*5 raster block
     
     #find the upper left corner coordinates of the extracted 5*5 matrix
-    ulp = dataset.affine * (col-2, row-2)#src.affine * (col, row)
+    ulp = dataset.transform * (col-2, row-2)#src.affine * (col, row)
     ulpCX= ulp[0] + (cellSize/2.0) # coordinates of central point of the upper left corner pixel
     ulpCY= ulp[1] - (cellSize/2.0)
 
@@ -43,6 +62,113 @@ def extractWindow(x, y, dataset, cellSize):
     
     return x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev
 
+# Offsets of the rows/columns of the 5*5 matrix from the central pixel
+_windowOffsets = np.arange(-2, 3)
+
+# Local coordinate grids of the 5*5 matrix for each cell size
+_localGrids = {}
+
+def readBand(dataset):
+    '''
+    This function loads the elevation band of a raster once, so the 5*5 matrices of all points can be extracted from memory
+    :param dataset: a raster object imported by Rasterio
+    :return: 2D array of elevations
+    '''
+    return dataset.read(1)
+
+def readBandInto(dataset, out, stripRows=None):
+    '''
+    This function copies the elevation band of a raster into an existing array (e.g. a memory-mapped .npy file) strip by strip,
+    so the whole DEM is never held in memory
+    :param dataset: a raster object imported by Rasterio
+    :param out: (height, width) array that receives the elevations
+    :param stripRows: number of rows read at a time (by default whole rows of blocks, about 2**24 pixels per strip)
+    :return: out
+    '''
+    if stripRows is None:
+        blockRows = dataset.block_shapes[0][0]
+        stripRows = max(blockRows, 2 ** 24 // dataset.width // blockRows * blockRows)
+    for row in range(0, dataset.height, stripRows):
+        window = Window(0, row, dataset.width, min(stripRows, dataset.height - row))
+        out[row:row + window.height] = dataset.read(1, window=window)
+    return out
+
+def localGrid(cellSize):
+    '''
+    This function returns the coordinates of the 5*5 matrix in the local coordinate system (the center of the matrix is (0,0))
+    The grid is the same for all points of a DEM, so it is only generated once per cell size
+    :param cellSize: raster cell size
+    :return: two 5*5 matrix (x and y)
+    '''
+    if cellSize not in _localGrids:
+        rasterBlock_x, rasterBlock_y = np.meshgrid(_windowOffsets * cellSize, -_windowOffsets * cellSize)
+        rasterBlock_x.flags.writeable = False
+        rasterBlock_y.flags.writeable = False
+        _localGrids[cellSize] = (rasterBlock_x, rasterBlock_y)
+    return _localGrids[cellSize]
+
+def pointIndex(X, Y, transform):
+    '''
+    This function finds the row and column of the pixels in which the points are located (same as dataset.index for north-up rasters)
+    :param X: array of x coordinates of points
+    :param Y: array of y coordinates of points
+    :param transform: affine transform of the raster
+    :return: two integer arrays (rows and columns)
+    '''
+    cols = np.floor((np.asarray(X, dtype='float64') - transform.c) / transform.a).astype('int64')
+    rows = np.floor((np.asarray(Y, dtype='float64') - transform.f) / transform.e).astype('int64')
+    return rows, cols
+
+def localCoordinates(X, Y, rows, cols, transform):
+    '''
+    This function converts the UTM coordinates of points to the local coordinate system of their 5*5 matrix
+    (the center of the central pixel is (0,0))
+    :param X: (N,) x coordinates of points
+    :param Y: (N,) y coordinates of points
+    :param rows: (N,) rows of the central pixels returned by pointIndex
+    :param cols: (N,) columns of the central pixels returned by pointIndex
+    :param transform: affine transform of the raster
+    :return: two (N,) arrays (x and y)
+    '''
+    x = np.asarray(X, dtype='float64') - (transform.c + (cols + 0.5) * transform.a)
+    y = np.asarray(Y, dtype='float64') - (transform.f + (rows + 0.5) * transform.e)
+    return x, y
 
+def gatherWindows(band, rows, cols, nodata=None):
+    '''
+    This function extracts the 5*5 matrices centered on the given pixels from an elevation array with one fancy-index operation
+    Pixels outside of the array and nodata pixels are set to nan
+    :param band: 2D array of elevations (in memory or memory-mapped)
+    :param rows: (N,) rows of the central pixels
+    :param cols: (N,) columns of the central pixels
+    :param nodata: nodata value of the raster
+    :return: (N, 5, 5) elevations
+    '''
+    rowIndex = rows[:, np.newaxis, np.newaxis] + _windowOffsets[np.newaxis, :, np.newaxis]
+    colIndex = cols[:, np.newaxis, np.newaxis] + _windowOffsets[np.newaxis, np.newaxis, :]
+    inside = (rowIndex >= 0) & (rowIndex < band.shape[0]) & (colIndex >= 0) & (colIndex < band.shape[1])
+    rasterBlock_elev = band[np.clip(rowIndex, 0, band.shape[0] - 1), np.clip(colIndex, 0, band.shape[1] - 1)].astype('float64')
+    if nodata is not None:
+        inside &= rasterBlock_elev != nodata
+    rasterBlock_elev[~inside] = np.nan
+    return rasterBlock_elev
 
+def extractWindows(X, Y, band, transform, cellSize, nodata=None):
+    '''
+    This function is the vectorized version of extractWindow: it extracts the 5*5 matrices of N points from an elevation array
+    Also, this function convert the UTM coordinates to the local coordinate system of each extracted matrix
+    :param X: (N,) x coordinates of points
+    :param Y: (N,) y coordinates of points
+    :param band: 2D array of elevations returned by readBand (or memory-mapped)
+    :param transform: affine transform of the raster
+    :param cellSize: raster cell size
+    :param nodata: nodata value of the raster
+    :return: the local coordinates of the points (two (N,) arrays), the local grid (two 5*5 matrix shared by all points),
+             and the (N, 5, 5) elevations
+    '''
+    rows, cols = pointIndex(X, Y, transform)
+    rasterBlock_elev = gatherWindows(band, rows, cols, nodata)
+    x, y = localCoordinates(X, Y, rows, cols, transform)
 
+    rasterBlock_x, rasterBlock_y = localGrid(cellSize)
+    return x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev
@@ -0,0 +1,169 @@
+import numpy as np
+
+import findValue
+import neighbors
+import polyInterpolation
+import batchInterpolation
+
+# Numba is optional: without it, interpolatePoints uses the NumPy batch path
+try:
+    import numba
+    prange = numba.prange
+except ImportError:
+    numba = None
+    prange = range
+
+# Numba is installed (the fused kernel can be used)
+available = numba is not None
+
+# Kinds of methods in the fused kernel
+_WP, _IDW, _POLY = 0, 1, 2
+
+# This function builds the tables of the fused kernel (one row per method)
+def methodTables(methods):
+    '''
+    :param methods: list of interpolation methods (see batchInterpolation.contiguity)
+    :return: kind, number of neighbor pixels, polynomial order, number of coefficients and column of the central pixel in the
+             neighbor pixels (-1 if it is not used) of each method, (methods, 4, 25) indices of the neighbor pixels in the flattened 5*5 matrix and (methods, 4, 16, 25) polynomial kernels
+    '''
+    kinds = np.zeros(len(methods), dtype='int64')
+    counts = np.zeros(len(methods), dtype='int64')
+    orders = np.full(len(methods), -1, dtype='int64')
+    ncoef = np.zeros(len(methods), dtype='int64')
+    centers = np.full(len(methods), -1, dtype='int64')
+    index = np.zeros((len(methods), 4, 25), dtype='int64')
+    kernels = np.zeros((len(methods), 4, 16, 25))
+    for j, mth in enumerate(methods):
+        m = batchInterpolation.contiguity[mth]
+        counts[j] = m
+        index[j, :, :m] = neighbors.stencilIndex[m]
+        if neighbors.centerColumn[m] is not None:
+            centers[j] = neighbors.centerColumn[m]
+        if mth == 'WP':
+            kinds[j] = _WP
+        elif mth in batchInterpolation.idwMethods:
+            kinds[j] = _IDW
+        else:
+            kinds[j] = _POLY
+            kernel = polyInterpolation.stencilKernel(mth)
+            orders[j] = polyInterpolation.polyMethods[mth][1]
+            ncoef[j] = kernel.shape[1]
+            kernels[j, :, :kernel.shape[1], :m] = kernel
+    return kinds, counts, orders, ncoef, centers, index, kernels
+
+# This function fills the terms of the polynomial function of one point (same order as polyInterpolation.polyTerms2d)
+def _polyTerms(x, y, order, t):
+    t[0] = 1.0
+    t[1] = x
+    t[2] = y
+    if order >= 1:
+        t[3] = x * y
+    if order == 2:
+        t[4] = x ** 2
+        t[5] = y ** 2
+        t[6] = x ** 2 * y ** 2
+        t[7] = x ** 2 * y
+        t[8] = y ** 2 * x
+    if order == 3:
+        t[4] = x ** 2
+        t[5] = y ** 2
+        t[6] = x ** 3
+        t[7] = y ** 3
+        t[8] = x ** 2 * y
+        t[9] = y ** 2 * x
+        t[10] = x ** 3 * y
+        t[11] = y ** 3 * x
+        t[12] = x ** 2 * y ** 2
+        t[13] = y ** 3 * x ** 3
+        t[14] = y ** 3 * x ** 2
+        t[15] = y ** 2 * x ** 3
+
+# This function is the fused loop over the points: window gather, quadrant selection and weighted evaluation of all methods
+def _fusedLoop(X, Y, band, a, c, e, f, nodata, hasNodata, cellSize, power, kinds, counts, orders, ncoef, centers, index, kernels, out):
+    height, width = band.shape
+    for i in prange(len(X)):
+        col = int(np.floor((X[i] - c) / a))
+        row = int(np.floor((Y[i] - f) / e))
+        x = X[i] - (c + (col + 0.5) * a)
+        y = Y[i] - (f + (row + 0.5) * e)
+        q = (1 if x > 0 else 0) + (2 if y < 0 else 0)
+
+        # 5*5 matrix of the point (nan outside of the raster and at nodata pixels)
+        window = np.empty(25)
+        for r in range(5):
+            for s in range(5):
+                rr, cc = row + r - 2, col + s - 2
+                value = np.nan
+                if rr >= 0 and rr < height and cc >= 0 and cc < width:
+                    value = float(band[rr, cc])
+                    if hasNodata and value == nodata:
+                        value = np.nan
+                window[r * 5 + s] = value
+
+        t = np.empty(16)
+        for j in range(len(kinds)):
+            if kinds[j] == 0: # whithin a pixel
+                out[i, j] = window[12]
+            elif kinds[j] == 1: # weighted average
+                # points closer than 1 cm to the central pixel get its elevation
+                if centers[j] >= 0 and np.sqrt(x ** 2 + y ** 2) < 0.01:
+                    out[i, j] = window[12]
+                else:
+                    num = 0.0
+                    den = 0.0
+                    for jj in range(counts[j]):
+                        k = index[j, q, jj]
+                        w = 1.0 / (np.sqrt((x - (k % 5 - 2) * cellSize) ** 2 + (y - (2 - k // 5) * cellSize) ** 2) ** power)
+                        num += window[k] * w
+                        den += w
+                    out[i, j] = num / den
+            else: # polynomial: weights of the neighbor pixels = terms * kernel
+                _polyTerms(x / cellSize, y / cellSize, orders[j], t)
+                z = 0.0
+                for jj in range(counts[j]):
+                    w = 0.0
+                    for k in range(ncoef[j]):
+                        w += t[k] * kernels[j, q, k, jj]
+                    z += w * window[index[j, q, jj]]
+                out[i, j] = z
+
+if numba is not None:
+    _polyTerms = numba.njit(cache=True)(_polyTerms)
+    _fusedLoop = numba.njit(parallel=True, cache=True)(_fusedLoop)
+
+# This function estimates the surface-adjusted elevations of N points with several methods, writing into the result columns
+def interpolatePoints(X, Y, band, transform, cellSize, methods, nodata=None, out=None, backend=None):
+    '''
+    With Numba, the window gather, the quadrant selection and the weighted evaluation of all methods are fused in one parallel loop
+    over the points, so no intermediate (N, m) arrays are built. The NumPy backend is the batch path (findValue.extractWindows and
+    batchInterpolation.interpolateMethod); both give the same results (to floating-point rounding)
+    :param X: (N,) x coordinates of points
+    :param Y: (N,) y coordinates of points
+    :param band: 2D array of elevations
+    :param transform: affine transform of the raster
+    :param cellSize: raster cell size
+    :param methods: list of interpolation methods (see batchInterpolation.contiguity)
+    :param nodata: nodata value of the raster
+    :param out: (N, number of methods) array that receives the estimated elevations (e.g. a DEM of a resultStore.ResultTable)
+    :param backend: 'numba', 'numpy', or None (Numba when it is installed)
+    :return: out
+    '''
+    X = np.asarray(X, dtype='float64')
+    Y = np.asarray(Y, dtype='float64')
+    if out is None:
+        out = np.full((len(X), len(methods)), np.nan)
+    if backend is None:
+        backend = 'numba' if available else 'numpy'
+    if backend == 'numba' and not available:
+        raise ImportError('The numba backend needs Numba (pip install numba)')
+
+    if backend == 'numba':
+        kinds, counts, orders, ncoef, centers, index, kernels = methodTables(methods)
+        _fusedLoop(X, Y, band, transform.a, transform.c, transform.e, transform.f, float(nodata) if nodata is not None else 0.0,
+                   nodata is not None, float(cellSize), float(batchInterpolation.idwPower), kinds, counts, orders, ncoef, centers,
+                   index, kernels, out)
+    else:
+        x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = findValue.extractWindows(X, Y, band, transform, cellSize, nodata)
+        for j, mth in enumerate(methods):
+            out[:, j] = batchInterpolation.interpolateMethod(mth, x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, cellSize)
+    return out
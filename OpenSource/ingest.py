@@ -0,0 +1,98 @@
+import os
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.windows import Window
+
+import rasterCache
+
+# Tile size of the converted DEMs: a 5*5 window (2-pixel halo) rarely crosses a tile, and blockCache.blockShape uses the tiles
+tileSize = 256
+
+# Overview factors of the converted DEMs (only the ones that leave at least one tile are built)
+overviewFactors = [2, 4, 8, 16, 32]
+
+# This function returns the path of the converted DEM in the store
+def storePath(dem, directory):
+    '''
+    :param dem: path of the source DEM (e.g. an ESRI Grid directory such as dem10m)
+    :param directory: directory of the converted DEMs
+    :return: path of the tiled GeoTIFF
+    '''
+    return os.path.join(directory, os.path.splitext(os.path.basename(os.path.normpath(dem)))[0] + '.tif')
+
+# This function returns the conversion options recorded in the tags of a converted DEM
+def storeOptions(blockSize, compress):
+    return repr({'blockSize': int(blockSize), 'compress': str(compress).lower()})
+
+# This function checks if a converted DEM was made from the current version of its source with the same options
+def isUpToDate(dem, target, blockSize=tileSize, compress='deflate'):
+    '''
+    The sizes and modification times of the source files are compared first; the content hash is only computed when they changed
+    :param blockSize: tile size of the conversion (see convertDEM)
+    :param compress: compression of the conversion
+    :return: True if the options and the fingerprint recorded in the converted DEM match
+    '''
+    if not os.path.exists(target):
+        return False
+    with rasterio.open(target) as dst:
+        tags = dst.tags()
+    if tags.get('STORE_OPTIONS') != storeOptions(blockSize, compress):
+        return False
+    if tags.get('SOURCE_SIGNATURE') == repr(rasterCache.sourceSignature(dem)):
+        return True
+    if tags.get('SOURCE_HASH') == rasterCache.contentHash(dem): # touched but not modified
+        with rasterio.open(target, 'r+') as dst:
+            dst.update_tags(SOURCE_SIGNATURE=repr(rasterCache.sourceSignature(dem)))
+        return True
+    return False
+
+# This function converts a DEM to a tiled, compressed GeoTIFF with overviews
+def convertDEM(dem, target, blockSize=tileSize, compress='deflate'):
+    '''
+    The DEM is copied in strips of blockSize rows, so the memory does not depend on the size of the DEM. The fingerprint of the
+    source (file signature and content hash) and the conversion options are saved in the tags of the GeoTIFF
+    :param dem: path of the source DEM
+    :param target: path of the GeoTIFF
+    :param blockSize: tile size (rows and columns)
+    :param compress: compression of the tiles
+    :return: target
+    '''
+    with rasterio.open(dem) as src:
+        profile = {'driver': 'GTiff', 'height': src.height, 'width': src.width, 'count': 1, 'dtype': src.dtypes[0], 'crs': src.crs,
+                   'transform': src.transform, 'nodata': src.nodata, 'tiled': True, 'blockxsize': blockSize,
+                   'blockysize': blockSize, 'compress': compress, 'BIGTIFF': 'IF_SAFER',
+                   'predictor': 3 if np.dtype(src.dtypes[0]).kind == 'f' else 2}
+        temp = target + '.tmp.tif'
+        with rasterio.open(temp, 'w', **profile) as dst:
+            for row in range(0, src.height, blockSize):
+                window = Window(0, row, src.width, min(blockSize, src.height - row))
+                dst.write(src.read(1, window=window), 1, window=window)
+            factors = [f for f in overviewFactors if min(src.height, src.width) // f >= blockSize]
+            if factors:
+                dst.build_overviews(factors, Resampling.average)
+            dst.update_tags(SOURCE=os.path.abspath(dem), SOURCE_SIGNATURE=repr(rasterCache.sourceSignature(dem)),
+                            SOURCE_HASH=rasterCache.contentHash(dem), STORE_OPTIONS=storeOptions(blockSize, compress))
+    os.replace(temp, target)
+    return target
+
+# This function converts the input DEMs once; the DEMs that are up to date are skipped
+def ingestDEMs(DEMs, directory, blockSize=tileSize, compress='deflate'):
+    '''
+    :param DEMs: list of source DEM paths
+    :param directory: directory of the converted DEMs (created if it does not exist)
+    :param blockSize: tile size (rows and columns); DEMs converted with another tile size are converted again
+    :param compress: compression of the tiles; DEMs converted with another compression are converted again
+    :return: a dictionary (source DEM -> path of the converted DEM) and the list of converted DEMs
+    '''
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    stores = {}
+    converted = []
+    for dem in DEMs:
+        target = storePath(dem, directory)
+        if not isUpToDate(dem, target, blockSize, compress):
+            convertDEM(dem, target, blockSize, compress)
+            converted.append(dem)
+        stores[dem] = target
+    return stores, converted
@@ -0,0 +1,123 @@
+import csv
+import json
+import tracemalloc
+from time import time
+from contextlib import contextmanager
+
+# Named stages of the processing pipeline
+stages = ['open', 'aggregate', 'benchmark sample', 'window read', 'neighbor select', 'fit', 'evaluate', 'residual', 'stats', 'write']
+
+class _NoStage(object):
+    '''
+    Context manager used when the profiler is disabled (it does nothing)
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_noStage = _NoStage()
+
+class Profiler(object):
+    '''
+    This class records the wall time, number of calls, bytes read and peak memory of each stage, per DEM
+    The stages should not be nested, because the peak memory of a stage is measured from its start. tracemalloc slows down every
+    allocation, so the wall times of a run that measures the peak memory are labeled (tracemalloc column) and should not be
+    compared with the wall times of a run without it
+    '''
+    def __init__(self, enabled=False, traceMemory=False):
+        '''
+        :param enabled: record the stages (when False, stage() costs one attribute lookup)
+        :param traceMemory: measure the peak memory of each stage with tracemalloc (slower)
+        '''
+        self.enabled = enabled
+        self.traceMemory = traceMemory
+        self.dem = None # DEM currently processed (set with forDEM)
+        self.records = {} # (stage, DEM) -> dictionary of measurements
+
+    def start(self):
+        self.enabled = True
+        if self.traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        self.enabled = False
+        if self.traceMemory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _record(self, name):
+        key = (name, self.dem)
+        if key not in self.records:
+            self.records[key] = {'stage': name, 'dem': self.dem, 'seconds': 0.0, 'calls': 0, 'bytesRead': 0, 'peakMemory': None,
+                                 'tracemalloc': False}
+        return self.records[key]
+
+    @contextmanager
+    def forDEM(self, dem):
+        '''
+        The stages recorded inside this context are labeled with the DEM
+        '''
+        previous, self.dem = self.dem, dem
+        try:
+            yield
+        finally:
+            self.dem = previous
+
+    def stage(self, name):
+        '''
+        :param name: name of the stage (see stages)
+        :return: a context manager that measures the stage
+        '''
+        if not self.enabled:
+            return _noStage
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name):
+        record = self._record(name)
+        if self.traceMemory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        temp = time()
+        try:
+            yield record
+        finally:
+            record['seconds'] += time() - temp
+            record['calls'] += 1
+            if self.traceMemory and tracemalloc.is_tracing():
+                peak = tracemalloc.get_traced_memory()[1]
+                record['peakMemory'] = max(record['peakMemory'] or 0, peak)
+                record['tracemalloc'] = True # the wall time includes the overhead of tracemalloc
+
+    def addBytes(self, name, nbytes):
+        '''
+        This function adds the number of bytes read from the rasters to a stage
+        '''
+        if self.enabled:
+            self._record(name)['bytesRead'] += int(nbytes)
+
+    def report(self):
+        '''
+        :return: list of the measurements, ordered by DEM and stage
+        '''
+        order = dict((name, i) for i, name in enumerate(stages))
+        return sorted(self.records.values(), key=lambda r: (str(r['dem']), order.get(r['stage'], len(stages)), r['stage']))
+
+    def writeJson(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+
+    def writeCsv(self, path):
+        with open(path, 'w') as f:
+            writer = csv.DictWriter(f, fieldnames=['dem', 'stage', 'seconds', 'calls', 'bytesRead', 'peakMemory', 'tracemalloc'], lineterminator='\n')
+            writer.writeheader()
+            writer.writerows(self.report())
+
+# Profiler shared by all modules; it is disabled until a driver (e.g. main.py) starts it
+profiler = Profiler()
+
+def stage(name):
+    '''
+    Shortcut for profiler.stage
+    '''
+    return profiler.stage(name)
@@ -22,3 +22,27 @@ def IDW(x, y, xCoords, yCoords, elevs, order=2):
 
     return z
 
+# This function interpolates N points at once; the distances and weights of all neighbor pixels are computed in one array operation
+def IDWBatch(x, y, xCoords, yCoords, elevs, order=2, center=0):
+    '''
+    :param x: (N,) x coordinates of the points
+    :param y: (N,) y coordinates of the points
+    :param xCoords: (N, m) x coordinates of the neighbor pixels returned by the neighbors module (any contiguity configuration)
+    :param yCoords: (N, m) y coordinates of the neighbor pixels
+    :param elevs: (N, m) elevations of the neighbor pixels
+    :param order: power of the distance
+    :param center: column of the central pixel in the neighbor pixels (neighbors.centerColumn; None if it is not one of them)
+    :return: (N,) estimated elevations
+    '''
+    x = np.asarray(x, dtype='float64')[:, np.newaxis]
+    y = np.asarray(y, dtype='float64')[:, np.newaxis]
+    d = np.sqrt((x - xCoords) ** 2 + (y - yCoords) ** 2)
+
+    # points closer than 1 cm to the central pixel get its elevation, as in IDW
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w = 1.0 / (d ** order)
+        z = np.sum(elevs * w, axis=-1) / np.sum(w, axis=-1)
+    if center is not None:
+        near = d[:, center] < 0.01
+        z[near] = np.asarray(elevs)[near, center]
+    return z
@@ -13,19 +13,94 @@ methods and different contiguity configurations across different resolutions
 ----------------------------------------------------------------------------------'''
 # Import modules
 import os
+import argparse
+import cProfile
 from time import time
+import numpy as np
 import geopandas as gpd
-import pandas as pd
 import rasterio
 
 # Import my modules
 import findValue # This module extracts value of a point from raster. Also it is possible to extract a chunck of raster centered on the point
-import neighbors # create the proper contiguity configuration for an interpolation method
-import polyInterpolation # Polynomial interpolation
-import inverseDistanecWeighting # IDW interpolation
+import batchInterpolation # interpolate all of the points of a DEM at once (neighbors, polynomial and IDW interpolation)
+import blockCache # read DEMs larger than RAM block by block
+import parallelDriver # split the work by (DEM, point chunk) across a process pool
+import pointStream # process the points chunk by chunk with bounded memory
+import resultStore # numeric result columns written in columnar formats
+import residualStats # one-pass, mergeable statistics of the residuals
+import instrumentation # per-stage profiling (wall time, calls, bytes read and peak memory)
+import rasterCache # on-disk cache of decoded DEMs (memory-mapped in later runs)
+import resampleRaster # resample a coarse DEM onto the benchmark grid (elevation and residual rasters)
+import fusedKernels # optional Numba backend (one fused loop over the points for all methods)
+import demPyramid # coarser DEMs aggregated from the benchmark in memory (dense resolution sweeps)
+import prefetchReader # read the next raster blocks on a thread pool while the current block is interpolated
+import ingest # one-time conversion of the ESRI Grid DEMs to tiled GeoTIFFs
+import adaptiveInterpolation # lowest-order polynomial that meets a tolerance, per point
+import polyInterpolation # polynomial methods (their coefficient cubes are cached with --coefficient-cube)
+import coefficientCube # polynomial coefficients of every pixel and quadrant of a DEM
 
 if __name__ == '__main__':
 
+    # Processing options
+    parser = argparse.ArgumentParser(description='Surface-adjusted elevation of random points across different resolutions')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes (1: serial run)')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='number of points per task of a worker')
+    parser.add_argument('--block-cache', type=int, default=None,
+                        help='number of raster blocks kept in memory when the DEMs are larger than RAM (serial run only)')
+    parser.add_argument('--methods', nargs='+', choices=sorted(batchInterpolation.contiguity),
+                        default=['WP', 'WA4', 'Li3', 'BiLi4', 'BiQ9', 'BiC16'],
+                        help='interpolation methods (Li5, BiLi9, BiQ16, BiQ25 and BiC25 are best-fitting polynomials)')
+    parser.add_argument('--prefetch', type=int, default=None,
+                        help='number of threads reading the raster blocks ahead of the interpolation (serial run)')
+    parser.add_argument('--prefetch-depth', type=int, default=8, help='maximum number of blocks read ahead by --prefetch')
+    parser.add_argument('--share-stencils', action='store_true',
+                        help='fit each unique (pixel, quadrant) stencil once and share it between its points (serial run)')
+    parser.add_argument('--backend', choices=['auto', 'numba', 'numpy'], default='auto',
+                        help='numba: fused kernel for all methods (serial run); auto uses it when Numba is installed')
+    parser.add_argument('--adaptive', type=float, default=None,
+                        help='tolerance (m) of the curvature-adaptive mode (BiLi4/BiQ9/BiC16 per point)')
+    parser.add_argument('--adaptive-sample', type=float, default=0.0,
+                        help='fraction of the points of --adaptive also evaluated with BiC16 for the error added and the measured saving (0: none)')
+    parser.add_argument('--results', choices=['npz', 'parquet'], default='npz', help='columnar format of the results')
+    parser.add_argument('--vector', choices=['shp', 'gpkg'], default=None, help='also export the results as shapefiles or GeoPackages')
+    parser.add_argument('--dtype', choices=['float32', 'float64'], default='float64', help='precision of the stored estimates')
+    parser.add_argument('--stream', choices=['csv', 'parquet'], default=None,
+                        help='process the points in chunks of --chunk-size and append the results to CSV or Parquet files')
+    parser.add_argument('--resample', nargs='+', default=None,
+                        help='resample these DEMs (e.g. dem30m) onto the benchmark grid and save the elevation and residual rasters')
+    parser.add_argument('--resample-methods', nargs='+', default=['BiC16'], help='interpolation methods of --resample')
+    parser.add_argument('--sweep', type=float, nargs='+', default=None,
+                        help='resolutions of DEMs aggregated from the benchmark, instead of the DEM files (snapped to multiples of the benchmark cell size, e.g. 1000 -> 999 for 3 m)')
+    parser.add_argument('--aggregation', choices=['mean', 'median'], default='mean', help='aggregation of the --sweep DEMs')
+    parser.add_argument('--ingest', default=None,
+                        help='convert the DEMs once to tiled GeoTIFFs with overviews in this directory, and read the converted DEMs')
+    parser.add_argument('--cache-dir', default=None, help='directory of the decoded DEMs cached between runs')
+    parser.add_argument('--cache-size', type=float, default=8, help='maximum size of the cache in GB')
+    parser.add_argument('--coefficient-cube', action='store_true',
+                        help='interpolate the polynomial methods from coefficient cubes built once per DEM and method in --cache-dir (serial run)')
+    parser.add_argument('--single-pass', action='store_true',
+                        help='with --stream: evaluate each chunk on all DEMs at once and write one row per point (benchmark, estimates and residuals)')
+    parser.add_argument('--profile-report', default=None, help='save the per-stage profiling report as a .json or .csv file')
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help='measure the peak memory of each stage (slower: the stage times of this run include the tracemalloc overhead)')
+    parser.add_argument('--cprofile', default=None, help='save the cProfile statistics of the run in this file')
+    args = parser.parse_args()
+    if args.adaptive is not None and (args.workers > 1 or args.share_stencils or args.backend == 'numba'):
+        parser.error('--adaptive uses the 5*5 matrices of the serial run; it cannot be combined with --workers, --share-stencils or --backend numba')
+    if args.coefficient_cube and (not args.cache_dir or args.workers > 1 or args.prefetch or args.block_cache or args.share_stencils or
+                                  args.backend == 'numba' or args.adaptive is not None):
+        parser.error('--coefficient-cube needs --cache-dir; it cannot be combined with --workers, --prefetch, --block-cache, '
+                     '--share-stencils, --backend numba or --adaptive')
+
+    # Profiling of the named stages (and optionally cProfile) is switched on from the command line
+    profiler = instrumentation.profiler
+    profiler.traceMemory = args.tracemalloc
+    if args.profile_report or args.tracemalloc:
+        profiler.start()
+    if args.cprofile:
+        cProfiler = cProfile.Profile()
+        cProfiler.enable()
+
     # Set the current workspace (all of the input DEMs are in this folder)
     os.chdir(r"E:\Surface_adjusted\ICC17\Code\Data\NC_cub_resample2")
 
@@ -39,102 +114,238 @@ if __name__ == '__main__':
     DEMs = ['dem10m', 'dem30m', 'dem100m', 'dem1000m']
     resolutions = [10, 30, 100, 1000]
     
-    #Random points: extract the benchmark elevation of each point from 3m lidar
-    with rasterio.open(benchmark) as dem3m:
-        samples = gpd.read_file(output + r'\randomPnts.shp') # randomPnts shapefile is imported as a geodataframe
-        samples['elev3m'] = None # adding a new attribute "elev3m" to the geodataframe
-        for index, row in samples.iterrows(): # Extract the elevation of each point from benchmark
-            X = row['geometry'].x
-            Y = row['geometry'].y
-            samples.at[index, 'elev3m'] = findValue.extractValue(X,Y,dem3m).astype('float64')
-
-    # Create the residual geodataframe. This dataframe is completed at the end
-    residuals = samples.copy()
+    # Decoded DEMs are reused between runs (they are only decoded again when the source files change)
+    demCache = rasterCache.RasterCache(args.cache_dir, int(args.cache_size * 2 ** 30)) if args.cache_dir else None
+
+    # The ESRI Grids are converted once (again only when they change), and all of the steps below read the converted DEMs
+    if args.ingest:
+        temp = time()
+        stores, converted = ingest.ingestDEMs([benchmark] + DEMs, args.ingest)
+        print ("Converted DEMs: " + (', '.join(converted) or 'none (up to date)') + " in " + str(time() - temp) + " s")
+        benchmark = stores[benchmark]
+        DEMs = [stores[dem] for dem in DEMs]
+        if args.resample:
+            args.resample = [stores[dem] for dem in args.resample]
 
     # Methods used for calculating surface area
-    methods = ['WP', 'WA4', 'Li3', 'BiLi4', 'BiQ9', 'BiC16']
-
-    # Declare vaqriable to keep track of time for each interpolation method
-    for mth in methods:
-        globals()['time' + mth] = 0
-
-    #Add new feilds to the the "samples" geodataframe based on all combinations of resolutions and methods
-    fields = []
-    for res in resolutions:
-        for mth in methods:
-            samples[mth + str(int(res))] = None
-            fields = fields + [mth + str(res)]
-        
-    for dem in DEMs:  # for each resolution surface-adjusted elevations are estimated for various interpolation methods
-        with rasterio.open(dem) as src:
-            cellSize = src.transform[1] # get actual DEM resolution fo computations
+    methods = args.methods
+
+    if args.stream: # the points are processed chunk by chunk, and the results are appended to CSV/Parquet files
+        temp = time()
+        if args.single_pass:
+            stats = pointStream.streamRows(output + r'\randomPnts.shp', benchmark, DEMs, resolutions, methods, output + r'\rows.' + args.stream,
+                                           args.chunk_size, demCache, None if args.backend == 'auto' else args.backend)
+        else:
+            stats = pointStream.streamPoints(output + r'\randomPnts.shp', benchmark, DEMs, resolutions, methods, output + r'\samples.' + args.stream,
+                                             output + r'\residuals.' + args.stream, args.chunk_size, args.block_cache or 64)
+        timing = {}
+        print ("Processing time of the streaming pipeline is: " + str(time() - temp))
+    elif args.resample: # full residual maps: every pixel of the benchmark grid is interpolated from the coarse DEMs
+        fields = [mth + str(int(resolutions[DEMs.index(dem)])) for dem in args.resample for mth in args.resample_methods]
+        stats = residualStats.StatsTable(fields)
+        for dem in args.resample:
+            for mth in args.resample_methods:
+                fld = mth + str(int(resolutions[DEMs.index(dem)]))
+                with profiler.forDEM(dem):
+                    report, stats.stats[fld] = resampleRaster.resampleDEM(dem, benchmark, output + '\\' + fld + '.tif',
+                                                                          output + '\\' + fld + '_residual.tif', mth)
+                print ("Resampling of " + dem + " with " + mth + ": " + str(round(report['megapixelsPerSecond'], 2)) + " MP/s")
+        timing = {}
+    elif args.sweep: # error against scale: the DEMs are aggregated from the benchmark (a pyramid) and passed to the interpolation in memory
+        points = gpd.read_file(output + r'\randomPnts.shp')
+        temp = time()
+        stats, sweep = demPyramid.sweepResolutions(points.geometry.x.values, points.geometry.y.values, benchmark, args.sweep, methods,
+                                                   args.aggregation, args.chunk_size, demCache, None if args.backend == 'auto' else args.backend)
+        sweep.to_csv(output + r'\sweep.csv', index=False)
+        print ("Processing time of the resolution sweep is: " + str(time() - temp))
+        timing = {}
+    else:
+        #Random points: extract the benchmark elevation of each point from 3m lidar
+        points = gpd.read_file(output + r'\randomPnts.shp') # randomPnts shapefile is imported as a geodataframe
+        X = points.geometry.x.values
+        Y = points.geometry.y.values
+
+        # The results are stored in preallocated numeric columns (points * DEM * method)
+        results = resultStore.ResultTable(X, Y, resolutions, methods, args.dtype)
+        with profiler.forDEM(benchmark):
+            with instrumentation.stage('open'):
+                dem3m = rasterio.open(benchmark)
+            with dem3m, instrumentation.stage('benchmark sample'): # Extract the elevation of all points from benchmark at once
+                band = demCache.band(benchmark)[0] if demCache else findValue.readBand(dem3m)
+                profiler.addBytes('benchmark sample', band.nbytes)
+                results.benchmark[:] = findValue.extractValues(X, Y, band, dem3m.transform, dem3m.nodata)
+                del band
+
+        # Declare vaqriable to keep track of time for each interpolation method
+        timing = dict((mth, 0) for mth in methods)
+
+        # Surface-adjusted elevations: DEM -> method -> estimated elevation of each point
+        estimates = {}
+        adaptive = {} # curvature-adaptive estimates and methods of each DEM (--adaptive)
+        if args.workers > 1: # the DEMs are shared through memory-mapped files, and the results are merged in the order of the points
+            temp = time()
+            parallelTiming = {}
+            estimates = parallelDriver.interpolateParallel(X, Y, DEMs, methods, args.workers, args.chunk_size, cache=demCache,
+                                                           timing=parallelTiming)
+            timing.update(parallelTiming.get(DEMs[0], {})) # time of the workers for the first DEM, as in the serial run
+            print ("Processing time of all methods with " + str(args.workers) + " workers is: " + str(time() - temp))
+            for dem in DEMs:
+                for mth in methods:
+                    results.column(resolutions[DEMs.index(dem)], mth)[:] = estimates[dem][mth]
+
+        for dem in DEMs:  # for each resolution surface-adjusted elevations are estimated for various interpolation methods
+            if dem in estimates:
+                continue
             res = resolutions[DEMs.index(dem)] # get nominal DEM resolution for labeling
+            with profiler.forDEM(dem), instrumentation.stage('open'):
+                src = rasterio.open(dem)
+            with src, profiler.forDEM(dem):
+                cellSize = src.res[0] # get actual DEM resolution fo computations
+                rasterBlock_x, rasterBlock_y = findValue.localGrid(cellSize)
+                windowMethods = methods # methods evaluated from the 5*5 matrices
 
-            for index, row in samples.iterrows(): # iterating through all of the points
-                X = row['geometry'].x
-                Y = row['geometry'].y
-                # The extractWindow function in the findValue module returns the 5*5 elevation matrix for the DEM based on the point
-                # The coordinate of the central pixel is (0,0). x,y are the coordinates of the point in this local coordinate system
-                x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = findValue.extractWindow(X, Y, src, cellSize)
-                
-                # for the point x,y, the n closest pixel value from the 5*5 matrix is selected
-                xCoor1, yCoor1, elev1 = neighbors.neibr (rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, 1)
-                xCoor3, yCoor3, elev3 = neighbors.neibr (rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, 3)
-                xCoor4, yCoor4, elev4 = neighbors.neibr (rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, 4)
-                xCoor9, yCoor9, elev9 = neighbors.neibr (rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, 9)
-                xCoor16, yCoor16, elev16 = neighbors.neibr (rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, 16)
-                
-                #whithin a pixel
-                if dem == DEMs[0]: temp = time()
-                samples.at[index, 'WP' + str(res)] = elev1.astype('float64')
-                if dem == DEMs[0]: timeWP = timeWP + (time() - temp)
-    
-                #weighted average
-                if dem == DEMs[0]: temp = time()
-                samples.at[index, 'WA4'+ str(res)] = inverseDistanecWeighting.IDW(x, y, xCoor4, yCoor4, elev4, 2).astype('float64')
-                if dem == DEMs[0]: timeWA4 = timeWA4 + (time() - temp)
-    
-                #Linear interpolation
-                if dem == DEMs[0]: temp = time()
-                samples.at[index, 'Li3'+ str(res)] = polyInterpolation.polyval2d(x,y,polyInterpolation.polyfit2d(xCoor3, yCoor3, elev3, 0)).astype('float64')
-                if dem == DEMs[0]: timeLi3 = timeLi3 + (time() - temp)
-    
-                #Bilinear interpolation
-                if dem == DEMs[0]: temp = time()
-                samples.at[index, 'BiLi4'+ str(res)] = polyInterpolation.polyval2d(x,y,polyInterpolation.polyfit2d(xCoor4, yCoor4, elev4, 1)).astype('float64')
-                if dem == DEMs[0]: timeBiLi4 = timeBiLi4 + (time() - temp)
-    
-                #Biquadratic interpolation
-                if dem == DEMs[0]: temp = time()
-                samples.at[index, 'BiQ9'+ str(res)] = polyInterpolation.polyval2d(x,y,polyInterpolation.polyfit2d(xCoor9, yCoor9, elev9, 2)).astype('float64')
-                if dem == DEMs[0]: timeBiQ9 = timeBiQ9 + (time() - temp)
-    
-                #BiCubic interpolation
-                if dem == DEMs[0]: temp = time()
-                samples.at[index, 'BiC16'+ str(res)] = polyInterpolation.polyval2d(x,y,polyInterpolation.polyfit2d(xCoor16, yCoor16, elev16, 3)).astype('float64')
-                if dem == DEMs[0]: timeBiC16 = timeBiC16 + (time() - temp)
+                # The extractWindows function in the findValue module returns the 5*5 elevation matrix of every point
+                # The coordinate of the central pixel of each matrix is (0,0). x,y are the coordinates of the points in these local coordinate systems
+                if args.prefetch: # the points are sorted by raster block, and the next blocks are read on a thread pool
+                    reader = prefetchReader.PrefetchReader(dem, args.prefetch, args.prefetch_depth)
+                    windows = reader.windows(X, Y)
+                elif args.block_cache: # the points are sorted by raster block and each block is read (at most) once through an LRU cache
+                    blocks = blockCache.BlockCache(src, args.block_cache)
+                    windows = blockCache.iterBlockWindows(X, Y, blocks)
+                elif args.share_stencils: # points in the same pixel and quadrant share their 5*5 matrix and polynomial coefficients
+                    with instrumentation.stage('window read'):
+                        band = demCache.band(dem)[0] if demCache else findValue.readBand(src)
+                        profiler.addBytes('window read', band.nbytes)
+                    shared, report = batchInterpolation.interpolateShared(X, Y, band, src.transform, cellSize, methods, src.nodata)
+                    del band
+                    for mth in methods:
+                        results.column(res, mth)[:] = shared[mth]
+                    print ("Unique stencils of " + dem + ": " + str(report['uniqueStencils']) + " for " + str(report['points']) +
+                           " points (ratio " + str(round(report['ratio'], 3)) + ")")
+                    windows = []
+                elif args.coefficient_cube: # the coefficients of every pixel and quadrant are cached, so a polynomial method is a gather and an evaluation
+                    for mth in methods:
+                        if mth in polyInterpolation.polyMethods:
+                            temp = time()
+                            with instrumentation.stage('window read'):
+                                cube = demCache.coefficientCube(dem, mth)
+                            with instrumentation.stage('evaluate'):
+                                results.column(res, mth)[:] = coefficientCube.cubeInterpolate(cube, X, Y, src.transform, cellSize, mth)
+                            if dem == DEMs[0]: timing[mth] = timing[mth] + (time() - temp)
+                            del cube
+                    windowMethods = [mth for mth in methods if mth not in polyInterpolation.polyMethods]
+                    windows = []
+                    if windowMethods: # WP and weighted average methods
+                        with instrumentation.stage('window read'):
+                            band = demCache.band(dem)[0]
+                            x, y, _, _, rasterBlock_elev = findValue.extractWindows(X, Y, band, src.transform, cellSize, src.nodata)
+                            del band
+                        windows = [(np.arange(len(X)), x, y, rasterBlock_elev)]
+                elif args.backend == 'numba' or (args.backend == 'auto' and fusedKernels.available and args.adaptive is None): # fused kernel of all methods
+                    with instrumentation.stage('window read'):
+                        band = demCache.band(dem)[0] if demCache else findValue.readBand(src)
+                        profiler.addBytes('window read', band.nbytes)
+                    temp = time()
+                    with instrumentation.stage('evaluate'):
+                        fusedKernels.interpolatePoints(X, Y, band, src.transform, cellSize, methods, src.nodata,
+                                                       out=results.estimates[:, DEMs.index(dem), :], backend='numba')
+                    if dem == DEMs[0]: # the methods are evaluated together, so only their total time is known
+                        timing = {'all methods (numba)': time() - temp}
+                    del band
+                    windows = []
+                else: # the whole DEM is read once
+                    with instrumentation.stage('window read'):
+                        band = demCache.band(dem)[0] if demCache else findValue.readBand(src)
+                        profiler.addBytes('window read', band.nbytes)
+                        x, y, _, _, rasterBlock_elev = findValue.extractWindows(X, Y, band, src.transform, cellSize, src.nodata)
+                        del band
+                    windows = [(np.arange(len(X)), x, y, rasterBlock_elev)]
+
+                # Curvature-adaptive mode: each point uses the lowest-order method that meets the tolerance; a sample of the points is compared with BiC16
+                if args.adaptive is not None:
+                    comparison = adaptiveInterpolation.AdaptiveStats()
+                    rng = np.random.default_rng(0)
+                    zAdaptive, zFull = np.full(len(X), np.nan), np.full(len(X), np.nan)
+                    choice = np.zeros(len(X), dtype='int64')
+
+                for index, x, y, rasterBlock_elev in windows:
+                    for mth in windowMethods:
+                        temp = time()
+                        results.column(res, mth)[index] = batchInterpolation.interpolateMethod(mth, x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, cellSize)
+                        if dem == DEMs[0]: timing[mth] = timing[mth] + (time() - temp)
+                    if args.adaptive is not None: # the roughness is computed from the same 5*5 matrices
+                        zAdaptive[index], choice[index], zFull[index] = adaptiveInterpolation.compareAdaptive(
+                            x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, cellSize, args.adaptive, comparison, args.adaptive_sample, rng)
+
+                if args.adaptive is not None:
+                    report = comparison.summary()
+                    report['RMSE'] = np.sqrt(np.nanmean((results.benchmark - zAdaptive) ** 2))
+                    if comparison.compared: # RMSE of both modes on the compared points
+                        compared = ~np.isnan(zFull)
+                        report['RMSE compared'] = np.sqrt(np.nanmean((results.benchmark[compared] - zAdaptive[compared]) ** 2))
+                        report['RMSE BiC16'] = np.sqrt(np.nanmean((results.benchmark[compared] - zFull[compared]) ** 2))
+                    print ("Adaptive mode of " + str(dem) + ": " + str(report))
+                    adaptive['estimates' + str(int(res))] = zAdaptive
+                    adaptive['method' + str(int(res))] = choice
 
-    # calculating the residuals for each interpolation method  (3m DEM - estimated elevation)
-    for fld in fields:
-        residuals[fld] = samples['elev3m']-samples[fld]
+                if args.prefetch:
+                    report = reader.report()
+                    reader.close()
+                    print ("Prefetching reader of " + dem + ": I/O wait " + str(round(report['ioWait'], 3)) + " s, compute " +
+                           str(round(report['compute'], 3)) + " s, " + str(report['blocks']) + " blocks")
+                elif args.block_cache:
+                    print ("Block cache of " + dem + ": " + str(blocks.report()))
 
-    samples.to_file(driver = 'ESRI Shapefile', filename = output + r'\samples.shp') # Export estimated eleavtions as a shapefile
-    residuals.to_file(driver = 'ESRI Shapefile', filename = output + r'\residuals.shp') # Export estimated residuals as a shapefile
+        if adaptive:
+            np.savez_compressed(output + r'\adaptive.npz', x=X, y=Y, ladder=np.array(adaptiveInterpolation.ladder), **adaptive)
+
+        # calculating the residuals for all interpolation methods at once (3m DEM - estimated elevation)
+        fields = results.fields()
+        with instrumentation.stage('residual'):
+            residuals = results.residuals().reshape(len(X), -1)
+
+        # Statistics of the residuals: one pass for RMSE, MAE, MBE, STD, MIN and MAX, and a second pass for RMSE95
+        with instrumentation.stage('stats'):
+            stats = residualStats.StatsTable(fields)
+            for i, fld in enumerate(fields):
+                stats.update(fld, residuals[:, i])
+                stats.stats[fld].rmse95Pass(residuals[:, i])
+
+        # Export estimated eleavtions and residuals in a columnar format (and optionally as vector files)
+        with instrumentation.stage('write'):
+            if args.results == 'parquet':
+                results.writeParquet(output + r'\samples.parquet')
+                results.writeParquet(output + r'\residuals.parquet', residuals=True)
+            else:
+                results.writeNpz(output + r'\results.npz')
+            if args.vector:
+                results.writeVector(output + r'\samples.' + args.vector, points.crs)
+                results.writeVector(output + r'\residuals.' + args.vector, points.crs, residuals=True)
+
+    if demCache:
+        demCache.flush()
+        print ("Raster cache: " + str(demCache.report()))
 
     # Calculate statistics for the residuals
-    df_stat = pd.DataFrame(index=fields, columns=['RMSE', 'MAE', 'MBE', 'STD', 'MIN', 'MAX'])
-    for fld in fields:
-        df_stat.loc[fld, 'RMSE'] = ((residuals[fld]) ** 2).mean() ** 0.5
-        df_stat.loc[fld, 'MAE'] = (residuals[fld].abs()).mean()
-        df_stat.loc[fld, 'MBE'] = residuals[fld].mean()
-        df_stat.loc[fld, 'STD'] = residuals[fld].std()
-        df_stat.loc[fld, 'MIN'] = residuals[fld].min()
-        df_stat.loc[fld, 'MAX'] = residuals[fld].max()
+    df_stat = stats.toDataFrame()
     df_stat.to_csv(output + r'\result.csv', sep=',') # save the statistics as a csv file
 
     # print the timing
-    for mth in methods:
-        print ("Processing time for " + mth + "is: " + str(globals()['time' + mth]))
+    for mth in timing:
+        print ("Processing time for " + mth + "is: " + str(timing[mth]))
+
+    # save the profiling reports
+    if args.cprofile:
+        cProfiler.disable()
+        cProfiler.dump_stats(args.cprofile)
+    if args.profile_report:
+        if args.profile_report.lower().endswith('.csv'):
+            profiler.writeCsv(args.profile_report)
+        else:
+            profiler.writeJson(args.profile_report)
+    if args.tracemalloc:
+        print ("Note: the stage times were measured under tracemalloc; run again without --tracemalloc to compare timings")
+    profiler.stop()
 
 
 
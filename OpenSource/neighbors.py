@@ -1,150 +1,82 @@
 import numpy as np
 
+# Contiguity configurations: m -> (row, col) of the m closest pixels in the 5*5 matrix for each quadrant of the central pixel
+# The quadrants are ordered as in the quadrant function: upper left, upper right, lower left, lower right
+# Configurations that are symmetric around the central pixel use the same pixels for the four quadrants
+_configurations = {
+    1: [[(2,2)]] * 4,
+    3: [[(2,2), (2,1), (1,2)],
+        [(2,2), (1,2), (2,3)],
+        [(2,2), (2,1), (3,2)],
+        [(2,2), (2,3), (3,2)]],
+    4: [[(2,2), (2,1), (1,1), (1,2)],
+        [(2,2), (1,3), (1,2), (2,3)],
+        [(2,2), (2,1), (3,1), (3,2)],
+        [(2,2), (2,3), (3,2), (3,3)]],
+    5: [[(2,2), (2,1), (1,2), (2,3), (3,2)]] * 4,
+    8: [[(2,1), (1,2), (2,3), (3,2), (1,1), (1,3), (3,1), (3,3)]] * 4,
+    9: [[(2,2), (1,2), (2,3), (3,2), (1,1), (1,3), (2,1), (3,1), (3,3)]] * 4,
+    16: [[(2,2), (0,1), (0,2), (0,3), (1,0), (1,1), (1,2), (1,3), (2,0), (2,1), (0,0), (2,3), (3,0), (3,1), (3,2), (3,3)],
+         [(2,2), (0,1), (0,2), (0,3), (1,4), (1,1), (1,2), (1,3), (2,4), (2,1), (0,4), (2,3), (3,4), (3,1), (3,2), (3,3)],
+         [(2,2), (4,1), (4,2), (4,3), (1,0), (1,1), (1,2), (1,3), (2,0), (2,1), (4,0), (2,3), (3,0), (3,1), (3,2), (3,3)],
+         [(2,2), (4,1), (4,2), (4,3), (1,4), (1,1), (1,2), (1,3), (2,4), (2,1), (4,4), (2,3), (3,4), (3,1), (3,2), (3,3)]],
+    17: [[(2,2), (1,2), (2,3), (3,2), (1,1), (1,3), (3,1), (3,3), (0,0), (0,2), (0,4), (2,0), (2,1), (2,4), (4,0), (4,2), (4,4)]] * 4,
+    25: [[(i,j) for i in range(5) for j in range(5)]] * 4,
+}
+
+# Index table: m -> (4, m) indices of the m closest pixels in the flattened 5*5 matrix, one row per quadrant
+stencilIndex = dict((m, np.array([[i * 5 + j for i, j in pixels] for pixels in quadrants]))
+                    for m, quadrants in _configurations.items())
+
+# Column of the central pixel (index 12 of the flattened 5*5 matrix) in the stencil of each configuration (None if it is not used)
+centerColumn = dict((m, int(np.flatnonzero(index[0] == 12)[0]) if 12 in index[0] else None) for m, index in stencilIndex.items())
+
+# This function finds the quadrant of the central pixel in which the point x,y is located
+def quadrant(x, y):
+    '''
+    The tests are the same as in neibr: a point with x <= 0 is on the left, and a point with y >= 0 is on the upper side
+    x,y is the location of sample points (scalars or arrays) in the local coordinate system of the 5*5 matrix
+    :return: 0 (upper left), 1 (upper right), 2 (lower left), or 3 (lower right)
+    '''
+    return (np.asarray(x) > 0).astype('int64') + 2 * (np.asarray(y) < 0)
+
 # This function get a 5*5 raster and return the m closest pixel to the point x,y located in the central pixel
 def neibr(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, m):
     '''
     This function create the m closest pixel to the point(x,y)
     rasterBlock is the 5 by 5 matrix
     x,y is the location of sample points that needs to be interpolated
+    m is the contiguity configuration (1, 3, 4, 5, 8, 9, 16, 17, or 25)
     '''
-
     if m == 1:
-        xCoor = rasterBlock_x[2,2]
-        yCoor = rasterBlock_y[2,2]
-        elev = rasterBlock_elev[2,2]
-
-    elif m ==3:
+        return rasterBlock_x[2,2], rasterBlock_y[2,2], rasterBlock_elev[2,2]
 
-        if x <= rasterBlock_x[2,2]:
-            if y >= rasterBlock_y[2,2]:
-                xCoor = np.array([rasterBlock_x[2,2], rasterBlock_x [2,1], rasterBlock_x[1,2]])
-                yCoor = np.array([rasterBlock_y[2,2], rasterBlock_y [2,1], rasterBlock_y[1,2]])
-                elev = np.array([rasterBlock_elev[2,2], rasterBlock_elev [2,1], rasterBlock_elev[1,2]])
-            elif y < rasterBlock_y[2,2]:
-                xCoor = np.array([rasterBlock_x[2,2], rasterBlock_x [2,1], rasterBlock_x[3,2]])
-                yCoor = np.array([rasterBlock_y[2,2], rasterBlock_y [2,1], rasterBlock_y[3,2]])
-                elev = np.array([rasterBlock_elev[2,2], rasterBlock_elev [2,1], rasterBlock_elev[3,2]])
-        elif x > rasterBlock_x[2,2]:
-            if y >= rasterBlock_y[2,2]:
-                xCoor = np.array([rasterBlock_x[2,2], rasterBlock_x[1,2], rasterBlock_x[2,3]])
-                yCoor = np.array([rasterBlock_y[2,2], rasterBlock_y[1,2], rasterBlock_y[2,3]])
-                elev = np.array([rasterBlock_elev[2,2], rasterBlock_elev[1,2], rasterBlock_elev[2,3]])
-            elif y < rasterBlock_y[2,2]:
-                xCoor = np.array([rasterBlock_x[2,2], rasterBlock_x [2,3], rasterBlock_x[3,2]])
-                yCoor = np.array([rasterBlock_y[2,2], rasterBlock_y [2,3], rasterBlock_y[3,2]])
-                elev = np.array([rasterBlock_elev[2,2], rasterBlock_elev [2,3], rasterBlock_elev[3,2]])
+    # the quadrant is found in the coordinate system of the 5*5 matrix
+    index = stencilIndex[m][quadrant(x - rasterBlock_x[2,2], y - rasterBlock_y[2,2])]
+    xCoor = np.ravel(rasterBlock_x)[index]
+    yCoor = np.ravel(rasterBlock_y)[index]
+    elev = np.ravel(rasterBlock_elev)[index]
 
-    elif m ==4:
-        if x <= rasterBlock_x[2,2]:
-            if y >= rasterBlock_y[2,2]:
-                xCoor = np.array([rasterBlock_x[2,2], rasterBlock_x [2,1], rasterBlock_x[1,1], rasterBlock_x[1,2]])
-                yCoor = np.array([rasterBlock_y[2,2], rasterBlock_y [2,1], rasterBlock_y[1,1], rasterBlock_y[1,2]])
-                elev = np.array([rasterBlock_elev[2,2], rasterBlock_elev [2,1], rasterBlock_elev[1,1], rasterBlock_elev[1,2]])
-            elif y < rasterBlock_y[2,2]:
-                xCoor = np.array([rasterBlock_x[2,2], rasterBlock_x [2,1], rasterBlock_x[3,1], rasterBlock_x[3,2]])
-                yCoor = np.array([rasterBlock_y[2,2], rasterBlock_y [2,1], rasterBlock_y[3,1], rasterBlock_y[3,2]])
-                elev = np.array([rasterBlock_elev[2,2], rasterBlock_elev [2,1], rasterBlock_elev[3,1], rasterBlock_elev[3,2]])
-        elif x > rasterBlock_x[2,2]:
-            if y >= rasterBlock_y[2,2]:
-                xCoor = np.array([rasterBlock_x[2,2], rasterBlock_x [1,3], rasterBlock_x[1,2], rasterBlock_x[2,3]])
-                yCoor = np.array([rasterBlock_y[2,2], rasterBlock_y [1,3], rasterBlock_y[1,2], rasterBlock_y[2,3]])
-                elev = np.array([rasterBlock_elev[2,2], rasterBlock_elev [1,3], rasterBlock_elev[1,2], rasterBlock_elev[2,3]])
-            elif y < rasterBlock_y[2,2]:
-                xCoor = np.array([rasterBlock_x[2,2], rasterBlock_x [2,3], rasterBlock_x[3,2], rasterBlock_x[3,3]])
-                yCoor = np.array([rasterBlock_y[2,2], rasterBlock_y [2,3], rasterBlock_y[3,2], rasterBlock_y[3,3]])
-                elev = np.array([rasterBlock_elev[2,2], rasterBlock_elev [2,3], rasterBlock_elev[3,2], rasterBlock_elev[3,3]])
-
-
-    elif m ==5:
-        xCoor = np.array([rasterBlock_x[2,2], rasterBlock_x [2,1], rasterBlock_x[1,2], rasterBlock_x[2,3], rasterBlock_x[3,2]])
-        yCoor = np.array([rasterBlock_y[2,2], rasterBlock_y [2,1], rasterBlock_y[1,2], rasterBlock_y[2,3], rasterBlock_y[3,2]])
-        elev = np.array([rasterBlock_elev[2,2], rasterBlock_elev [2,1], rasterBlock_elev[1,2], rasterBlock_elev[2,3], rasterBlock_elev[3,2]])
-
-    elif m ==8:
-        xCoor = np.array([rasterBlock_x [2,1], rasterBlock_x[1,2], rasterBlock_x[2,3], rasterBlock_x[3,2], rasterBlock_x[1,1],
-                          rasterBlock_x[1,3], rasterBlock_x[3,1], rasterBlock_x[3,3]])
-        yCoor = np.array([rasterBlock_y [2,1], rasterBlock_y[1,2], rasterBlock_y[2,3], rasterBlock_y[3,2], rasterBlock_y[1,1],
-                          rasterBlock_y[1,3], rasterBlock_y[3,1], rasterBlock_y[3,3]])
-        elev = np.array([rasterBlock_elev [2,1], rasterBlock_elev[1,2], rasterBlock_elev[2,3], rasterBlock_elev[3,2], rasterBlock_elev[1,1],
-                          rasterBlock_elev[1,3], rasterBlock_elev[3,1], rasterBlock_elev[3,3]])
-
-    elif m ==9:
-        xCoor = np.array([rasterBlock_x [2,2], rasterBlock_x[1,2], rasterBlock_x[2,3], rasterBlock_x[3,2], rasterBlock_x[1,1],
-                          rasterBlock_x[1,3], rasterBlock_x[2,1], rasterBlock_x[3,1], rasterBlock_x[3,3]])
-        yCoor = np.array([rasterBlock_y [2,2], rasterBlock_y[1,2], rasterBlock_y[2,3], rasterBlock_y[3,2], rasterBlock_y[1,1],
-                          rasterBlock_y[1,3], rasterBlock_y[2,1], rasterBlock_y[3,1], rasterBlock_y[3,3]])
-        elev = np.array([rasterBlock_elev [2,2], rasterBlock_elev[1,2], rasterBlock_elev[2,3], rasterBlock_elev[3,2], rasterBlock_elev[1,1],
-                          rasterBlock_elev[1,3], rasterBlock_elev[2,1], rasterBlock_elev[3,1], rasterBlock_elev[3,3]])
+    return xCoor, yCoor, elev
 
-    elif m ==16:
-        if x <= rasterBlock_x[2,2]:
-            if y >= rasterBlock_y[2,2]:
-                xCoor = np.array([rasterBlock_x [2,2], rasterBlock_x[0,1], rasterBlock_x[0,2], rasterBlock_x[0,3],
-                                 rasterBlock_x [1,0], rasterBlock_x[1,1], rasterBlock_x[1,2], rasterBlock_x[1,3],
-                                 rasterBlock_x [2,0], rasterBlock_x[2,1], rasterBlock_x[0,0], rasterBlock_x[2,3],
-                                 rasterBlock_x [3,0], rasterBlock_x[3,1], rasterBlock_x[3,2], rasterBlock_x[3,3]])
-                yCoor = np.array([rasterBlock_y [2,2], rasterBlock_y[0,1], rasterBlock_y[0,2], rasterBlock_y[0,3],
-                                 rasterBlock_y [1,0], rasterBlock_y[1,1], rasterBlock_y[1,2], rasterBlock_y[1,3],
-                                 rasterBlock_y [2,0], rasterBlock_y[2,1], rasterBlock_y[0,0], rasterBlock_y[2,3],
-                                 rasterBlock_y [3,0], rasterBlock_y[3,1], rasterBlock_y[3,2], rasterBlock_y[3,3]])
-                elev = np.array([rasterBlock_elev [2,2], rasterBlock_elev[0,1], rasterBlock_elev[0,2], rasterBlock_elev[0,3],
-                                 rasterBlock_elev [1,0], rasterBlock_elev[1,1], rasterBlock_elev[1,2], rasterBlock_elev[1,3],
-                                 rasterBlock_elev [2,0], rasterBlock_elev[2,1], rasterBlock_elev[0,0], rasterBlock_elev[2,3],
-                                 rasterBlock_elev [3,0], rasterBlock_elev[3,1], rasterBlock_elev[3,2], rasterBlock_elev[3,3]])
-            elif y < rasterBlock_y[2,2]:
-                xCoor = np.array([rasterBlock_x [2,2], rasterBlock_x[4,1], rasterBlock_x[4,2], rasterBlock_x[4,3],
-                                 rasterBlock_x [1,0], rasterBlock_x[1,1], rasterBlock_x[1,2], rasterBlock_x[1,3],
-                                 rasterBlock_x [2,0], rasterBlock_x[2,1], rasterBlock_x[4,0], rasterBlock_x[2,3],
-                                 rasterBlock_x [3,0], rasterBlock_x[3,1], rasterBlock_x[3,2], rasterBlock_x[3,3]])
-                yCoor = np.array([rasterBlock_y [2,2], rasterBlock_y[4,1], rasterBlock_y[4,2], rasterBlock_y[4,3],
-                                 rasterBlock_y [1,0], rasterBlock_y[1,1], rasterBlock_y[1,2], rasterBlock_y[1,3],
-                                 rasterBlock_y [2,0], rasterBlock_y[2,1], rasterBlock_y[4,0], rasterBlock_y[2,3],
-                                 rasterBlock_y [3,0], rasterBlock_y[3,1], rasterBlock_y[3,2], rasterBlock_y[3,3]])
-                elev = np.array([rasterBlock_elev [2,2], rasterBlock_elev[4,1], rasterBlock_elev[4,2], rasterBlock_elev[4,3],
-                                 rasterBlock_elev [1,0], rasterBlock_elev[1,1], rasterBlock_elev[1,2], rasterBlock_elev[1,3],
-                                 rasterBlock_elev [2,0], rasterBlock_elev[2,1], rasterBlock_elev[4,0], rasterBlock_elev[2,3],
-                                 rasterBlock_elev [3,0], rasterBlock_elev[3,1], rasterBlock_elev[3,2], rasterBlock_elev[3,3]])
-        elif x > rasterBlock_x[2,2]:
-            if y >= rasterBlock_y[2,2]:
-                xCoor = np.array([rasterBlock_x [2,2], rasterBlock_x[0,1], rasterBlock_x[0,2], rasterBlock_x[0,3],
-                                 rasterBlock_x [1,4], rasterBlock_x[1,1], rasterBlock_x[1,2], rasterBlock_x[1,3],
-                                 rasterBlock_x [2,4], rasterBlock_x[2,1], rasterBlock_x[0,4], rasterBlock_x[2,3],
-                                 rasterBlock_x [3,4], rasterBlock_x[3,1], rasterBlock_x[3,2], rasterBlock_x[3,3]])
-                yCoor = np.array([rasterBlock_y [2,2], rasterBlock_y[0,1], rasterBlock_y[0,2], rasterBlock_y[0,3],
-                                 rasterBlock_y [1,4], rasterBlock_y[1,1], rasterBlock_y[1,2], rasterBlock_y[1,3],
-                                 rasterBlock_y [2,4], rasterBlock_y[2,1], rasterBlock_y[0,4], rasterBlock_y[2,3],
-                                 rasterBlock_y [3,4], rasterBlock_y[3,1], rasterBlock_y[3,2], rasterBlock_y[3,3]])
-                elev = np.array([rasterBlock_elev [2,2], rasterBlock_elev[0,1], rasterBlock_elev[0,2], rasterBlock_elev[0,3],
-                                 rasterBlock_elev [1,4], rasterBlock_elev[1,1], rasterBlock_elev[1,2], rasterBlock_elev[1,3],
-                                 rasterBlock_elev [2,4], rasterBlock_elev[2,1], rasterBlock_elev[0,4], rasterBlock_elev[2,3],
-                                 rasterBlock_elev [3,4], rasterBlock_elev[3,1], rasterBlock_elev[3,2], rasterBlock_elev[3,3]])
-            elif y < rasterBlock_y[2,2]:
-                xCoor = np.array([rasterBlock_x [2,2], rasterBlock_x[4,1], rasterBlock_x[4,2], rasterBlock_x[4,3],
-                                 rasterBlock_x [1,4], rasterBlock_x[1,1], rasterBlock_x[1,2], rasterBlock_x[1,3],
-                                 rasterBlock_x [2,4], rasterBlock_x[2,1], rasterBlock_x[4,4], rasterBlock_x[2,3],
-                                 rasterBlock_x [3,4], rasterBlock_x[3,1], rasterBlock_x[3,2], rasterBlock_x[3,3]])
-                yCoor = np.array([rasterBlock_y [2,2], rasterBlock_y[4,1], rasterBlock_y[4,2], rasterBlock_y[4,3],
-                                 rasterBlock_y [1,4], rasterBlock_y[1,1], rasterBlock_y[1,2], rasterBlock_y[1,3],
-                                 rasterBlock_y [2,4], rasterBlock_y[2,1], rasterBlock_y[4,4], rasterBlock_y[2,3],
-                                 rasterBlock_y [3,4], rasterBlock_y[3,1], rasterBlock_y[3,2], rasterBlock_y[3,3]])
-                elev = np.array([rasterBlock_elev [2,2], rasterBlock_elev[4,1], rasterBlock_elev[4,2], rasterBlock_elev[4,3],
-                                 rasterBlock_elev [1,4], rasterBlock_elev[1,1], rasterBlock_elev[1,2], rasterBlock_elev[1,3],
-                                 rasterBlock_elev [2,4], rasterBlock_elev[2,1], rasterBlock_elev[4,4], rasterBlock_elev[2,3],
-                                 rasterBlock_elev [3,4], rasterBlock_elev[3,1], rasterBlock_elev[3,2], rasterBlock_elev[3,3]])
+# This function returns the m closest pixels of N points at once
+def neibrBatch(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, m):
+    '''
+    :param rasterBlock_x: (5, 5) or (N, 5, 5) x coordinates of the pixels in the local coordinate system of each point
+    :param rasterBlock_y: (5, 5) or (N, 5, 5) y coordinates of the pixels
+    :param rasterBlock_elev: (N, 5, 5) elevations of the pixels
+    :param x: (N,) x coordinates of the points in the local coordinate system (the center of the 5*5 matrix is (0,0))
+    :param y: (N,) y coordinates of the points in the local coordinate system
+    :param m: contiguity configuration (1, 3, 4, 5, 8, 9, 16, 17, or 25)
+    :return: three (N, m) arrays (x, y, and elevation of the neighbor pixels)
+    '''
+    index = stencilIndex[m][quadrant(x, y)] # (N, m) indices in the flattened 5*5 matrix
 
-    elif m ==17:
-        xCoor = np.array([rasterBlock_x [2,2], rasterBlock_x[1,2], rasterBlock_x[2,3], rasterBlock_x[3,2], rasterBlock_x[1,1],
-                      rasterBlock_x[1,3], rasterBlock_x[3,1], rasterBlock_x[3,3], rasterBlock_x[0,0], rasterBlock_x[0,2], rasterBlock_x[0,4],
-                          rasterBlock_x[2,0], rasterBlock_x[2,1], rasterBlock_x[2,4], rasterBlock_x[4,0], rasterBlock_x[4,2], rasterBlock_x[4,4]])
-        yCoor = np.array([rasterBlock_y [2,2], rasterBlock_y[1,2], rasterBlock_y[2,3], rasterBlock_y[3,2], rasterBlock_y[1,1],
-                      rasterBlock_y[1,3], rasterBlock_y[3,1], rasterBlock_y[3,3], rasterBlock_y[0,0], rasterBlock_y[0,2], rasterBlock_y[0,4],
-                          rasterBlock_y[2,0], rasterBlock_y[2,1], rasterBlock_y[2,4], rasterBlock_y[4,0], rasterBlock_y[4,2], rasterBlock_y[4,4]])
-        elev = np.array([rasterBlock_elev [2,2], rasterBlock_elev[1,2], rasterBlock_elev[2,3], rasterBlock_elev[3,2], rasterBlock_elev[1,1],
-                      rasterBlock_elev[1,3], rasterBlock_elev[3,1], rasterBlock_elev[3,3], rasterBlock_elev[0,0], rasterBlock_elev[0,2], rasterBlock_elev[0,4],
-                          rasterBlock_elev[2,0], rasterBlock_elev[2,1], rasterBlock_elev[2,4], rasterBlock_elev[4,0], rasterBlock_elev[4,2], rasterBlock_elev[4,4]])
-    elif m ==25:
-        xCoor = rasterBlock_x.flatten()
-        yCoor = rasterBlock_y.flatten()
-        elev = rasterBlock_elev.flatten()
+    def gather(rasterBlock):
+        rasterBlock = np.asarray(rasterBlock)
+        flat = rasterBlock.reshape(rasterBlock.shape[:-2] + (25,))
+        if flat.ndim == 1: # a local grid shared by all points
+            return flat[index]
+        return flat[np.arange(len(flat))[:, np.newaxis], index]
 
-    return xCoor, yCoor, elev
+    return gather(rasterBlock_x), gather(rasterBlock_y), gather(rasterBlock_elev)
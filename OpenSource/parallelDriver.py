@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import multiprocessing
+from time import time
+import numpy as np
+import rasterio
+from concurrent.futures import ProcessPoolExecutor
+
+import findValue
+import batchInterpolation
+
+# Memory-mapped elevation bands opened by a worker process (path -> array)
+_bands = {}
+
+# This function decodes the elevation band of a DEM once and stores it as a memory-mappable .npy file
+def shareBand(dem, path):
+    '''
+    The workers map this file instead of each decoding (and copying) the whole DEM
+    :param dem: path of the DEM
+    :param path: path of the .npy file
+    :return: a dictionary with the path of the .npy file and the georeferencing of the DEM
+    '''
+    with rasterio.open(dem) as src:
+        band = np.lib.format.open_memmap(path, mode='w+', dtype=src.dtypes[0], shape=(src.height, src.width))
+        findValue.readBandInto(src, band)
+        band.flush()
+        del band
+        return {'path': path, 'transform': src.transform, 'cellSize': src.res[0], 'nodata': src.nodata}
+
+# This function returns the memory-mapped elevation band of a shared DEM in a worker process
+def _sharedBand(path):
+    if path not in _bands:
+        _bands[path] = np.load(path, mmap_mode='r')
+    return _bands[path]
+
+# This function interpolates a chunk of points for one DEM in a worker process
+def _interpolateChunk(shared, X, Y, methods):
+    '''
+    :return: a dictionary (method -> estimated elevations) and a dictionary (method -> interpolation time in seconds)
+    '''
+    band = _sharedBand(shared['path'])
+    x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = findValue.extractWindows(X, Y, band, shared['transform'],
+                                                                                  shared['cellSize'], shared['nodata'])
+    estimates, timing = {}, {}
+    for mth in methods:
+        temp = time()
+        estimates[mth] = batchInterpolation.interpolateMethod(mth, x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, shared['cellSize'])
+        timing[mth] = time() - temp
+    return estimates, timing
+
+# This function estimates the surface-adjusted elevations of all points for all DEMs and methods on a process pool
+def interpolateParallel(X, Y, DEMs, methods, workers=None, chunkSize=100000, tempDir=None, cache=None, timing=None):
+    '''
+    The work is split by (DEM, point chunk). The results are merged in the original order of the points, so they are identical
+    to a serial run
+    :param X: (N,) x coordinates of points
+    :param Y: (N,) y coordinates of points
+    :param DEMs: list of DEM paths
+    :param methods: list of interpolation methods (see batchInterpolation.contiguity)
+    :param workers: number of worker processes (None: number of CPUs)
+    :param chunkSize: number of points per task
+    :param tempDir: directory for the shared bands (a temporary directory by default)
+    :param cache: a rasterCache.RasterCache; if given, the workers map the cached bands (decoded only once across runs)
+    :param timing: a dictionary that receives the interpolation time of each DEM and method summed over the tasks
+                   (DEM -> method -> seconds of the workers)
+    :return: a dictionary (DEM -> method -> (N,) estimated elevations)
+    '''
+    X = np.asarray(X, dtype='float64')
+    Y = np.asarray(Y, dtype='float64')
+    results = dict((dem, dict((mth, np.full(len(X), np.nan)) for mth in methods)) for dem in DEMs)
+
+    directory = tempfile.mkdtemp(dir=tempDir)
+    try:
+        # the workers are spawned (as on Windows), so the thread pools of the parent (GDAL, Numba) are never forked in a locked state
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            tasks = []
+            for i, dem in enumerate(DEMs):
+                if cache is not None:
+                    shared = cache.shareBand(dem)
+                else:
+                    shared = shareBand(dem, os.path.join(directory, 'band' + str(i) + '.npy'))
+                for start in range(0, len(X), chunkSize):
+                    stop = start + chunkSize
+                    future = pool.submit(_interpolateChunk, shared, X[start:stop], Y[start:stop], methods)
+                    tasks.append((dem, start, stop, future))
+            for dem, start, stop, future in tasks:
+                estimates, seconds = future.result()
+                for mth, estimate in estimates.items():
+                    results[dem][mth][start:stop] = estimate
+                    if timing is not None:
+                        timing.setdefault(dem, dict((m, 0.0) for m in methods))[mth] += seconds[mth]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
@@ -0,0 +1,211 @@
+import os
+import numpy as np
+import pandas as pd
+import rasterio
+
+import findValue
+import blockCache
+import batchInterpolation
+import fusedKernels
+import residualStats
+import instrumentation
+
+# This function reads the points of a shapefile, CSV or Parquet file in chunks of a fixed size
+def readPoints(path, chunkSize=100000, xField='x', yField='y'):
+    '''
+    Only one chunk of points is kept in memory at a time
+    :param path: path of the points (.shp, .gpkg, .csv, or .parquet)
+    :param chunkSize: number of points per chunk
+    :param xField: name of the x coordinate column (CSV and Parquet)
+    :param yField: name of the y coordinate column (CSV and Parquet)
+    :return: a generator of (start, X, Y), where start is the position of the first point of the chunk in the file
+    '''
+    extension = os.path.splitext(path)[1].lower()
+    start = 0
+    if extension == '.csv':
+        for chunk in pd.read_csv(path, usecols=[xField, yField], chunksize=chunkSize):
+            yield start, chunk[xField].values.astype('float64'), chunk[yField].values.astype('float64')
+            start += len(chunk)
+    elif extension == '.parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunkSize, columns=[xField, yField]):
+            X = batch.column(xField).to_numpy().astype('float64')
+            yield start, X, batch.column(yField).to_numpy().astype('float64')
+            start += len(X)
+    else: # shapefile or any other vector format: one reader (fiona) is kept open for all chunks, so the file is read once
+        import fiona
+        with fiona.open(path) as features:
+            coordinates = []
+            for feature in features:
+                coordinates.append(feature['geometry']['coordinates'][:2])
+                if len(coordinates) == chunkSize:
+                    XY = np.array(coordinates, dtype='float64')
+                    yield start, XY[:, 0], XY[:, 1]
+                    start += len(XY)
+                    coordinates = []
+            if coordinates:
+                XY = np.array(coordinates, dtype='float64')
+                yield start, XY[:, 0], XY[:, 1]
+
+class ChunkWriter(object):
+    '''
+    This class appends chunks of results (pandas DataFrames) to a CSV or Parquet file
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.parquet = os.path.splitext(path)[1].lower() == '.parquet'
+        self.writer = None
+        self.rows = 0
+        if os.path.exists(path):
+            os.remove(path)
+
+    def write(self, frame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='a', header=self.rows == 0, index=False)
+        self.rows += len(frame)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# This function pushes the points through window extraction, interpolation and residual computation one chunk at a time
+def streamPoints(pointsPath, benchmark, DEMs, resolutions, methods, samplesPath, residualsPath, chunkSize=100000,
+                 blockCacheSize=64, xField='x', yField='y'):
+    '''
+    The DEMs are read block by block through an LRU cache and the results are appended to the output files after each chunk,
+    so the peak memory is bounded by the chunk size and the cache size
+    :param pointsPath: path of the points (see readPoints)
+    :param benchmark: path of the benchmark DEM
+    :param DEMs: list of DEM paths
+    :param resolutions: nominal resolution of each DEM (for labeling the fields)
+    :param methods: list of interpolation methods (see batchInterpolation.contiguity)
+    :param samplesPath: output file (.csv or .parquet) of the estimated elevations
+    :param residualsPath: output file (.csv or .parquet) of the residuals (benchmark - estimated elevation)
+    :param chunkSize: number of points per chunk
+    :param blockCacheSize: number of raster blocks kept in memory for each DEM
+    :return: a residualStats.StatsTable of the residuals of all fields (the RMSE95 is estimated from histograms)
+    '''
+    stats = residualStats.StatsTable([mth + str(int(res)) for res in resolutions for mth in methods])
+    with instrumentation.stage('open'):
+        sources = [rasterio.open(dem) for dem in DEMs]
+        bench = rasterio.open(benchmark)
+    try:
+        caches = [blockCache.BlockCache(src, blockCacheSize) for src in sources]
+        benchCache = blockCache.BlockCache(bench, blockCacheSize)
+        with ChunkWriter(samplesPath) as samplesOut, ChunkWriter(residualsPath) as residualsOut:
+            for start, X, Y in readPoints(pointsPath, chunkSize, xField, yField):
+                samples = pd.DataFrame({'id': np.arange(start, start + len(X)), 'x': X, 'y': Y})
+                with instrumentation.profiler.forDEM(benchmark):
+                    samples['elev3m'] = blockCache.sampleValues(X, Y, benchCache)
+                residuals = samples.copy()
+
+                for dem, src, cache, res in zip(DEMs, sources, caches, resolutions):
+                    cellSize = src.res[0]
+                    rasterBlock_x, rasterBlock_y = findValue.localGrid(cellSize)
+                    estimates = dict((mth, np.full(len(X), np.nan)) for mth in methods)
+                    with instrumentation.profiler.forDEM(dem):
+                        for index, x, y, rasterBlock_elev in blockCache.iterBlockWindows(X, Y, cache):
+                            for mth in methods:
+                                estimates[mth][index] = batchInterpolation.interpolateMethod(mth, x, y, rasterBlock_x, rasterBlock_y,
+                                                                                             rasterBlock_elev, cellSize)
+                        for mth in methods:
+                            samples[mth + str(int(res))] = estimates[mth]
+                            with instrumentation.stage('residual'):
+                                residuals[mth + str(int(res))] = samples['elev3m'].values - estimates[mth]
+                            with instrumentation.stage('stats'):
+                                stats.update(mth + str(int(res)), residuals[mth + str(int(res))].values)
+
+                with instrumentation.stage('write'):
+                    samplesOut.write(samples)
+                    residualsOut.write(residuals)
+    finally:
+        for src in sources + [bench]:
+            src.close()
+    return stats
+
+# This function evaluates one chunk of points on all DEMs and methods, and returns the complete row of each point
+def evaluateChunk(X, Y, benchmark, grids, methods, out=None, backend=None):
+    '''
+    The coordinates of the chunk are converted once, the benchmark elevations are sampled once, and the residuals are computed
+    right after the estimates of each DEM while the chunk is still in cache
+    :param X: (n,) x coordinates of points
+    :param Y: (n,) y coordinates of points
+    :param benchmark: (band, transform, nodata) of the benchmark DEM
+    :param grids: list of (band, transform, cellSize, nodata), one per DEM
+    :param methods: list of interpolation methods (see batchInterpolation.contiguity)
+    :param out: (n, 1 + 2 * number of DEMs * number of methods) array that receives the rows
+    :param backend: backend of fusedKernels.interpolatePoints
+    :return: out: benchmark elevation, estimated elevations (DEM * method) and residuals (DEM * method) of each point
+    '''
+    X = np.asarray(X, dtype='float64')
+    Y = np.asarray(Y, dtype='float64')
+    nFields = len(grids) * len(methods)
+    if out is None:
+        out = np.empty((len(X), 1 + 2 * nFields))
+    with instrumentation.stage('benchmark sample'):
+        band, transform, nodata = benchmark
+        out[:, 0] = findValue.extractValues(X, Y, band, transform, nodata)
+
+    for i, (band, transform, cellSize, nodata) in enumerate(grids):
+        estimates = out[:, 1 + i * len(methods):1 + (i + 1) * len(methods)]
+        fusedKernels.interpolatePoints(X, Y, band, transform, cellSize, methods, nodata, estimates, backend)
+        with instrumentation.stage('residual'):
+            np.subtract(out[:, :1], estimates, out=out[:, 1 + nFields + i * len(methods):1 + nFields + (i + 1) * len(methods)])
+    return out
+
+# This function processes the points in one pass: each chunk is evaluated on all DEMs and written as complete rows
+def streamRows(pointsPath, benchmark, DEMs, resolutions, methods, rowsPath, chunkSize=100000, cache=None, backend=None,
+               xField='x', yField='y'):
+    '''
+    :param pointsPath: path of the points (see readPoints)
+    :param benchmark: path of the benchmark DEM
+    :param DEMs: list of DEM paths
+    :param resolutions: nominal resolution of each DEM (for labeling the fields)
+    :param methods: list of interpolation methods (see batchInterpolation.contiguity)
+    :param rowsPath: output file (.csv or .parquet) with the id, coordinates, benchmark elevation, estimated elevations and
+                     residuals (suffix _res) of each point
+    :param chunkSize: number of points per chunk
+    :param cache: a rasterCache.RasterCache; if given, the DEMs are memory-mapped from the cache instead of decoded
+    :param backend: backend of fusedKernels.interpolatePoints
+    :return: a residualStats.StatsTable of the residuals of all fields (the RMSE95 is estimated from histograms)
+    '''
+    fields = [mth + str(int(res)) for res in resolutions for mth in methods]
+    columns = ['elev3m'] + fields + [fld + '_res' for fld in fields]
+    stats = residualStats.StatsTable(fields)
+
+    # the bands are read (or mapped) once for all chunks
+    grids = []
+    for dem in [benchmark] + list(DEMs):
+        with instrumentation.profiler.forDEM(dem), instrumentation.stage('open'):
+            with rasterio.open(dem) as src:
+                band = cache.band(dem)[0] if cache else findValue.readBand(src)
+                grids.append((band, src.transform, src.res[0], src.nodata))
+    benchmarkGrid = (grids[0][0], grids[0][1], grids[0][3])
+
+    with ChunkWriter(rowsPath) as rowsOut:
+        for start, X, Y in readPoints(pointsPath, chunkSize, xField, yField):
+            rows = evaluateChunk(X, Y, benchmarkGrid, grids[1:], methods, backend=backend)
+            with instrumentation.stage('stats'):
+                for i, fld in enumerate(fields):
+                    stats.update(fld, rows[:, 1 + len(fields) + i])
+            with instrumentation.stage('write'):
+                frame = pd.DataFrame(rows, columns=columns)
+                frame.insert(0, 'y', Y)
+                frame.insert(0, 'x', X)
+                frame.insert(0, 'id', np.arange(start, start + len(X)))
+                rowsOut.write(frame)
+    return stats
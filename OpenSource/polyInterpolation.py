@@ -2,35 +2,159 @@
 import numpy as np
 from numpy.linalg import inv
 
-# This function calcuates the coefficient of each polynomial function
-def polyfit2d(x, y, z, order):
+import neighbors
+
+# Polynomial interpolation methods: method name -> (contiguity configuration, polynomial order)
+# The first four methods fit the polynomial exactly (as many pixels as coefficients); the others are best-fitting (least-squares) polynomials
+polyMethods = {'Li3': (3, 0), 'BiLi4': (4, 1), 'BiQ9': (9, 2), 'BiC16': (16, 3),
+               'Li5': (5, 0), 'BiLi9': (9, 1), 'BiQ16': (16, 2), 'BiQ25': (25, 2), 'BiC25': (25, 3)}
+
+# Polynomial order of a polynomial function based on its number of coefficients
+coefficientOrders = {3: 0, 4: 1, 9: 2, 16: 3}
+
+# This function builds the terms of the polynomial function for one point or for arrays of points
+def polyTerms2d(x, y, order):
+    '''
+    The terms are in the same order as the coefficients returned by polyfit2d
+    :param x: x coordinate(s) in the local coordinate system (scalar or array)
+    :param y: y coordinate(s) in the local coordinate system (same shape as x)
+    :param order: 0 (Linear), 1 (BiLinear), 2 (BiQuadratic), or 3 (BiCubic)
+    :return: array of shape x.shape + (number of coefficients,)
+    '''
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    one = np.ones_like(x)
     if order == 0:  # Linear
-        G = np.vstack([np.ones(len(x)), x, y]).T
+        terms = [one, x, y]
     if order == 1:  # BiLinear
-        G = np.vstack([np.ones(len(x)), x, y, x * y]).T
+        terms = [one, x, y, x * y]
     if order == 2:  # BiQuadratic9
-        G = np.vstack([np.ones(len(x)), x, y, x * y, x ** 2, y ** 2, x ** 2 * y ** 2, x ** 2 * y, y ** 2 * x]).T
+        terms = [one, x, y, x * y, x ** 2, y ** 2, x ** 2 * y ** 2, x ** 2 * y, y ** 2 * x]
     if order == 3:  # BiCubic
-        G = np.vstack([np.ones(len(x)), x, y, x * y, x ** 2, y ** 2, x ** 3, y ** 3, x ** 2 * y, y ** 2 * x, x ** 3 * y,
-                       y ** 3 * x, x ** 2 * y ** 2, y ** 3 * x ** 3, y ** 3 * x ** 2, y ** 2 * x ** 3]).T
+        terms = [one, x, y, x * y, x ** 2, y ** 2, x ** 3, y ** 3, x ** 2 * y, y ** 2 * x, x ** 3 * y,
+                 y ** 3 * x, x ** 2 * y ** 2, y ** 3 * x ** 3, y ** 3 * x ** 2, y ** 2 * x ** 3]
+
+    return np.stack(terms, axis=-1)
+
+# This function calcuates the coefficient of each polynomial function
+def polyfit2d(x, y, z, order):
+    G = polyTerms2d(x, y, order)
 
-    m = np.matmul(inv(G), z)
-    #m, _, _, _ = np.linalg.lstsq(G, z)
+    if G.shape[0] == G.shape[1]:
+        m = np.matmul(inv(G), z)
+    else: # more pixels than coefficients: best-fitting polynomial
+        m, _, _, _ = np.linalg.lstsq(G, z, rcond=None)
     return m
 
 # This function calcuates the elevation of unkown point based on the coefficient of the polynomial function
 def polyval2d(x, y, m):
-    if len(m) == 3:
-        z = np.dot(np.array([1, x, y]), m)
-    if len(m) == 4:
-        z = np.dot(np.array([1, x, y, x * y]), m)
-    if len(m) == 9:
-        z = np.dot(np.array([1, x, y, x * y, x ** 2, y ** 2, x ** 2 * y ** 2, x ** 2 * y, y ** 2 * x]), m)
-    if len(m) == 16:
-        z = np.dot(np.array(
-            [1, x, y, x * y, x ** 2, y ** 2, x ** 3, y ** 3, x ** 2 * y, y ** 2 * x, x ** 3 * y, y ** 3 * x,
-             x ** 2 * y ** 2, y ** 3 * x ** 3, y ** 3 * x ** 2, y ** 2 * x ** 3]), m)
+    order = coefficientOrders[len(m)]
+    z = np.dot(polyTerms2d(x, y, order), m)
 
     return z
 
+# This function calcuates the coefficients of the polynomial functions of N points at once
+def polyfit2dBatch(x, y, z, order):
+    '''
+    :param x: (N, m) x coordinates of the neighbor pixels of each point
+    :param y: (N, m) y coordinates of the neighbor pixels of each point
+    :param z: (N, m) elevations of the neighbor pixels of each point
+    :param order: polynomial order (see polyTerms2d)
+    :return: (N, number of coefficients) coefficients of each point
+    '''
+    G = polyTerms2d(x, y, order) # (N, m, number of coefficients) design matrices
+    z = np.asarray(z, dtype='float64')[..., np.newaxis]
+    if G.shape[-2] == G.shape[-1]:
+        m = np.linalg.solve(G, z)[..., 0]
+    else: # least squares
+        m = np.matmul(np.linalg.pinv(G), z)[..., 0]
+    return m
+
+# This function calcuates the elevations of N unknown points based on their polynomial coefficients
+def polyval2dBatch(x, y, m):
+    '''
+    :param x: (N,) x coordinates of the points in their local coordinate systems
+    :param y: (N,) y coordinates of the points in their local coordinate systems
+    :param m: (N, number of coefficients) coefficients returned by polyfit2dBatch
+    :return: (N,) estimated elevations
+    '''
+    order = coefficientOrders[m.shape[-1]]
+    z = np.sum(polyTerms2d(x, y, order) * m, axis=-1)
+    return z
+
+# This function interpolates the elevations of N points with one of the polynomial methods (Li3, BiLi4, BiQ9, BiC16)
+def polyInterpBatch(x, y, xCoords, yCoords, elevs, method):
+    '''
+    :param x: (N,) x coordinates of the points in their local coordinate systems
+    :param y: (N,) y coordinates of the points in their local coordinate systems
+    :param xCoords: (N, m) x coordinates of the neighbor pixels returned by the neighbors module
+    :param yCoords: (N, m) y coordinates of the neighbor pixels
+    :param elevs: (N, m) elevations of the neighbor pixels
+    :param method: name of the method in polyMethods
+    :return: (N,) estimated elevations
+    '''
+    m, order = polyMethods[method]
+    if np.shape(elevs)[-1] != m:
+        raise ValueError(method + ' needs ' + str(m) + ' neighbor pixels, got ' + str(np.shape(elevs)[-1]))
+    return polyval2dBatch(x, y, polyfit2dBatch(xCoords, yCoords, elevs, order))
+
+# Precomputed kernels: method name -> (4, number of coefficients, m) inverse design matrices, one per quadrant
+_kernels = {}
+
+# This function returns the inverse design matrices of a polynomial method in normalized cell units
+def stencilKernel(method):
+    '''
+    For a given contiguity configuration and quadrant, the neighbor pixels are always at the same offsets from the central pixel,
+    so the design matrix G only depends on the cell size (see neighbors.stencilIndex). Building G in cell units (cell size = 1) makes one kernel valid for DEMs
+    of any resolution, and keeps the BiCubic system well conditioned even for 1000 m DEMs.
+    For the least-squares methods the pseudo-inverse of G is precomputed, so a best-fitting polynomial costs the same as an exact fit.
+    :param method: name of the method in polyMethods
+    :return: (4, number of coefficients, m) inverse (or pseudo-inverse) of G for each quadrant (see neighbors.quadrant)
+    '''
+    if method not in _kernels:
+        m, order = polyMethods[method]
+        # 5*5 matrix of pixel centers in cell units; the center of the central pixel is (0,0)
+        offsets = np.arange(-2, 3, dtype='float64')
+        rasterBlock_x, rasterBlock_y = np.meshgrid(offsets, -offsets)
+        index = neighbors.stencilIndex[m] # (4, m) neighbor pixels of each quadrant
+        G = polyTerms2d(rasterBlock_x.ravel()[index], rasterBlock_y.ravel()[index], order)
+        _kernels[method] = inv(G) if G.shape[-2] == G.shape[-1] else np.linalg.pinv(G)
+    return _kernels[method]
+
+# This function calcuates the weights of the neighbor pixels of N points for a polynomial method
+def stencilWeights(x, y, cellSize, method):
+    '''
+    The estimated elevation of each point is the dot product of its weights with the elevations of its neighbor pixels
+    :param x: (N,) x coordinates of the points in the local coordinate system of the 5*5 matrix
+    :param y: (N,) y coordinates of the points in the local coordinate system of the 5*5 matrix
+    :param cellSize: raster cell size
+    :param method: name of the method in polyMethods
+    :return: (N, m) weights, ordered as the neighbor pixels returned by neighbors.neibr
+    '''
+    order = polyMethods[method][1]
+    kernel = stencilKernel(method)[neighbors.quadrant(x, y)] # (N, number of coefficients, m)
+    terms = polyTerms2d(np.asarray(x) / cellSize, np.asarray(y) / cellSize, order)
+    return np.einsum('nk,nkm->nm', terms, kernel)
+
+# This function interpolates the elevations of N points with the precomputed kernel of a polynomial method
+def polyInterpKernel(x, y, elevs, cellSize, method):
+    '''
+    :param x: (N,) x coordinates of the points in the local coordinate system of the 5*5 matrix
+    :param y: (N,) y coordinates of the points in the local coordinate system of the 5*5 matrix
+    :param elevs: (N, m) elevations of the neighbor pixels returned by neighbors.neibr
+    :param cellSize: raster cell size
+    :param method: name of the method in polyMethods
+    :return: (N,) estimated elevations
+    '''
+    return np.sum(stencilWeights(x, y, cellSize, method) * elevs, axis=-1)
 
+# This function calculates the polynomial coefficients (in normalized cell units) of N stencils with the precomputed kernels
+def stencilCoefficients(q, elevs, method):
+    '''
+    The coefficients only depend on the quadrant and the elevations of the neighbor pixels, so points that share a stencil can share them
+    :param q: (N,) quadrants of the stencils (see neighbors.quadrant)
+    :param elevs: (N, m) elevations of the neighbor pixels returned by neighbors.neibr
+    :param method: name of the method in polyMethods
+    :return: (N, number of coefficients) coefficients; evaluate them with polyval2dBatch(x / cellSize, y / cellSize, coefficients)
+    '''
+    return np.einsum('nkm,nm->nk', stencilKernel(method)[q], elevs)
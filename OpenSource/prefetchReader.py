@@ -0,0 +1,102 @@
+import threading
+from collections import deque
+from time import time
+from concurrent.futures import ThreadPoolExecutor
+import rasterio
+
+import blockCache
+import instrumentation
+
+class PrefetchReader(object):
+    '''
+    This class reads the raster blocks of the points on a thread pool while the previous blocks are being interpolated
+    At most depth blocks are read ahead (bounded queue), and each thread has its own raster handle (GDAL releases the GIL
+    while reading). The time the consumer waits for a block (I/O wait) is reported separately from the time it spends on the
+    blocks it has received (compute)
+    '''
+    def __init__(self, path, workers=4, depth=8, shape=None):
+        '''
+        :param path: path of the raster
+        :param workers: number of reading threads
+        :param depth: maximum number of blocks read ahead
+        :param shape: block shape (rows, cols); blockCache.blockShape is used by default
+        '''
+        self.path = path
+        self.workers = workers
+        self.depth = max(1, depth)
+        self.dataset = rasterio.open(path)
+        self.shape = shape or blockCache.blockShape(self.dataset)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self._local = threading.local()
+        self._caches = [] # block readers of the threads (one raster handle each)
+        self._lock = threading.Lock()
+        self.ioWait = 0.0
+        self.compute = 0.0
+        self.blocks = 0
+
+    def _read(self, blockRow, blockCol):
+        '''
+        This function reads a block and its halo in a worker thread
+        '''
+        cache = getattr(self._local, 'cache', None)
+        if cache is None:
+            cache = blockCache.BlockCache(rasterio.open(self.path), 0, self.shape)
+            self._local.cache = cache
+            with self._lock:
+                self._caches.append(cache)
+        bytesRead = cache.bytesRead
+        block = cache.readBlock(blockRow, blockCol)
+        return block, cache.bytesRead - bytesRead
+
+    def windows(self, X, Y, stageName='window read'):
+        '''
+        :param X: (N,) x coordinates of points
+        :param Y: (N,) y coordinates of points
+        :param stageName: stage of the instrumentation module that the I/O wait is recorded in
+        :return: a generator of (index, x, y, rasterBlock_elev) per block, as blockCache.iterBlockWindows
+        '''
+        transform = self.dataset.transform
+        rows, cols, schedule = blockCache.blockSchedule(X, Y, transform, self.shape)
+        pending = deque()
+        position = 0
+        while position < len(schedule) or pending:
+            # keep the queue of blocks read ahead full
+            while position < len(schedule) and len(pending) < self.depth:
+                index, blockRow, blockCol = schedule[position]
+                pending.append((index, blockRow, blockCol, self.pool.submit(self._read, blockRow, blockCol)))
+                position += 1
+
+            index, blockRow, blockCol, future = pending.popleft()
+            temp = time()
+            with instrumentation.stage(stageName):
+                block, bytesRead = future.result()
+                instrumentation.profiler.addBytes(stageName, bytesRead)
+            self.ioWait += time() - temp
+            self.blocks += 1
+
+            temp = time()
+            x, y, rasterBlock_elev = blockCache.blockWindows(X, Y, rows, cols, index, block, blockRow, blockCol, self.shape, transform)
+            yield index, x, y, rasterBlock_elev
+            self.compute += time() - temp
+
+    def report(self):
+        '''
+        :return: a dictionary with the I/O wait and compute times (seconds), the number of blocks and the bytes read
+        '''
+        with self._lock:
+            bytesRead = sum(cache.bytesRead for cache in self._caches)
+        return {'workers': self.workers, 'depth': self.depth, 'blocks': self.blocks, 'ioWait': self.ioWait,
+                'compute': self.compute, 'bytesRead': bytesRead}
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        for cache in self._caches:
+            cache.dataset.close()
+        self._caches = []
+        self.dataset.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
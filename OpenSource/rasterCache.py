@@ -0,0 +1,189 @@
+import os
+import json
+import hashlib
+from time import time
+import numpy as np
+import rasterio
+
+import findValue
+import coefficientCube
+
+# Version of the layout of the cached arrays (the entries of older versions are never reused)
+version = 1
+
+# This function returns the files of a DEM (an ESRI Grid is a directory of files)
+def _sourceFiles(dem):
+    if os.path.isdir(dem):
+        return sorted(os.path.join(root, name) for root, _, names in os.walk(dem) for name in names)
+    return [dem]
+
+# This function returns the names, sizes and modification times of the files of a DEM (a cheap test for changes)
+def sourceSignature(dem):
+    return [[os.path.relpath(path, dem) if path != dem else '', os.path.getsize(path), os.path.getmtime(path)] for path in _sourceFiles(dem)]
+
+# This function returns the content hash (SHA-1) of the files of a DEM
+def contentHash(dem):
+    sha = hashlib.sha1()
+    for path in _sourceFiles(dem):
+        sha.update((os.path.relpath(path, dem) if path != dem else '').encode('utf-8'))
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(2 ** 20), b''):
+                sha.update(block)
+    return sha.hexdigest()
+
+class RasterCache(object):
+    '''
+    Directory of memory-mappable .npy arrays derived from the DEMs: decoded elevation bands and coefficient cubes
+    The entries are keyed by a content hash of the source DEM plus the kind of array, the method and the version, so an entry is
+    invalidated automatically when its source changes. The least recently used entries are removed when the size of the cache
+    exceeds maxBytes. A warm run only maps the files (no decoding). The last use of the entries is kept in memory and saved in the
+    index with the next insertion, or by flush
+    '''
+    def __init__(self, directory, maxBytes=8 * 2 ** 30):
+        '''
+        :param directory: cache directory (created if it does not exist)
+        :param maxBytes: maximum size of the cached arrays
+        '''
+        self.directory = directory
+        self.maxBytes = maxBytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.indexPath = os.path.join(directory, 'index.json')
+        self.index = {'entries': {}, 'fingerprints': {}}
+        if os.path.exists(self.indexPath):
+            with open(self.indexPath) as f:
+                self.index = json.load(f)
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+
+    def _save(self):
+        with open(self.indexPath + '.tmp', 'w') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(self.indexPath + '.tmp', self.indexPath)
+        self.dirty = False
+
+    def flush(self):
+        '''
+        This function saves the index if the last use of an entry changed since it was saved
+        '''
+        if self.dirty:
+            self._save()
+
+    def fingerprint(self, dem):
+        '''
+        Content hash (SHA-1) of the files of a DEM. The hash is only recomputed when the sizes or modification times of the files change
+        '''
+        signature = sourceSignature(dem)
+        known = self.index['fingerprints'].get(os.path.abspath(dem))
+        if known is not None and known['signature'] == signature:
+            return known['hash']
+        self.index['fingerprints'][os.path.abspath(dem)] = {'signature': signature, 'hash': contentHash(dem)}
+        self._save()
+        return self.index['fingerprints'][os.path.abspath(dem)]['hash']
+
+    def _lookup(self, dem, kind, method=None):
+        '''
+        :return: the key and the entry of a cached array (None if it is missing)
+        '''
+        fingerprint = self.fingerprint(dem)
+        key = hashlib.sha1('/'.join([fingerprint, kind, str(method), str(version)]).encode('utf-8')).hexdigest()
+        entry = self.index['entries'].get(key)
+        if entry is not None and not os.path.exists(os.path.join(self.directory, entry['file'])):
+            entry = None
+        if entry is not None:
+            self.hits += 1
+            entry['lastUsed'] = time()
+            self.dirty = True
+        else:
+            self.misses += 1
+        return key, entry
+
+    def _insert(self, key, dem, kind, method, path, meta):
+        '''
+        This function registers a new array, removes the stale entries of the same source and evicts the least recently used entries
+        '''
+        source = os.path.abspath(dem)
+        for other, entry in list(self.index['entries'].items()):
+            if entry['source'] == source and entry['kind'] == kind and entry['method'] == method:
+                self._remove(other)
+        self.index['entries'][key] = {'file': os.path.basename(path), 'source': source, 'kind': kind, 'method': method,
+                                      'bytes': os.path.getsize(path), 'lastUsed': time(), 'meta': meta}
+        self._evict(keep=key)
+        self._save()
+        return self.index['entries'][key]
+
+    def _remove(self, key):
+        entry = self.index['entries'][key]
+        try:
+            os.remove(os.path.join(self.directory, entry['file']))
+        except OSError: # e.g. the file is still mapped (Windows); it is overwritten by the next insertion of the key
+            pass
+        del self.index['entries'][key]
+
+    def _evict(self, keep=None):
+        entries = self.index['entries']
+        total = sum(entry['bytes'] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['lastUsed']):
+            if total <= self.maxBytes:
+                break
+            if key != keep:
+                total -= entries[key]['bytes']
+                self._remove(key)
+
+    def size(self):
+        '''
+        :return: total size of the cached arrays in bytes
+        '''
+        return sum(entry['bytes'] for entry in self.index['entries'].values())
+
+    def report(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.index['entries']), 'bytes': self.size()}
+
+    def shareBand(self, dem):
+        '''
+        This function decodes the elevation band of a DEM once (cold run) and returns its cached .npy file
+        :param dem: path of the DEM
+        :return: a dictionary with the path of the .npy file and the georeferencing of the DEM (as parallelDriver.shareBand)
+        '''
+        key, entry = self._lookup(dem, 'band')
+        if entry is None:
+            path = os.path.join(self.directory, key + '.npy')
+            with rasterio.open(dem) as src:
+                band = np.lib.format.open_memmap(path + '.tmp', mode='w+', dtype=src.dtypes[0], shape=(src.height, src.width))
+                findValue.readBandInto(src, band)
+                band.flush()
+                del band
+                t = src.transform
+                meta = {'transform': [t.a, t.b, t.c, t.d, t.e, t.f], 'cellSize': src.res[0], 'nodata': src.nodata}
+            os.replace(path + '.tmp', path)
+            entry = self._insert(key, dem, 'band', None, path, meta)
+        meta = entry['meta']
+        return {'path': os.path.join(self.directory, entry['file']), 'transform': rasterio.Affine(*meta['transform']),
+                'cellSize': meta['cellSize'], 'nodata': meta['nodata']}
+
+    def band(self, dem):
+        '''
+        :param dem: path of the DEM
+        :return: the memory-mapped elevation band of the DEM and its georeferencing (see shareBand)
+        '''
+        shared = self.shareBand(dem)
+        return np.load(shared['path'], mmap_mode='r'), shared
+
+    def coefficientCube(self, dem, method, blockSize=512):
+        '''
+        :param dem: path of the DEM
+        :param method: name of the method in polyInterpolation.polyMethods
+        :param blockSize: number of rows and columns of the blocks used for building the cube (cold run)
+        :return: the memory-mapped coefficient cube of the DEM (see coefficientCube.buildCoefficientCube)
+        '''
+        key, entry = self._lookup(dem, 'coefficients', method)
+        if entry is None:
+            path = os.path.join(self.directory, key + '.npy')
+            band, shared = self.band(dem)
+            cube = coefficientCube.buildCoefficientCube(band, method, shared['nodata'], blockSize, path=path + '.tmp')
+            cube.flush()
+            del cube, band
+            os.replace(path + '.tmp', path)
+            entry = self._insert(key, dem, 'coefficients', method, path, {})
+        return np.load(os.path.join(self.directory, entry['file']), mmap_mode='r')
@@ -0,0 +1,89 @@
+import numpy as np
+import rasterio
+from time import time
+from rasterio.windows import Window
+
+import findValue
+import blockCache
+import batchInterpolation
+import residualStats
+import instrumentation
+
+# Creation options of the output rasters (tiled and compressed GeoTIFF)
+outputProfile = {'driver': 'GTiff', 'dtype': 'float32', 'count': 1, 'nodata': -9999, 'tiled': True, 'blockxsize': 256,
+                 'blockysize': 256, 'compress': 'deflate', 'predictor': 3, 'BIGTIFF': 'IF_SAFER'}
+
+# This function returns the coordinates of the pixel centers of a window of a raster
+def pixelCenters(window, transform):
+    '''
+    :param window: a rasterio Window
+    :param transform: affine transform of the raster
+    :return: (rows * cols,) x and y coordinates of the pixel centers (row-major order)
+    '''
+    cols = window.col_off + np.arange(window.width) + 0.5
+    rows = window.row_off + np.arange(window.height) + 0.5
+    X = transform.c + cols * transform.a
+    Y = transform.f + rows * transform.e
+    X, Y = np.meshgrid(X, Y)
+    return X.ravel(), Y.ravel()
+
+# This function resamples a coarse DEM onto the grid of the benchmark DEM with one interpolation method
+def resampleDEM(dem, benchmark, outputPath, residualPath=None, method='BiC16', blockSize=512, cacheBlocks=16):
+    '''
+    The benchmark grid is processed in windows of blockSize * blockSize pixels; the coarse DEM is read through a BlockCache
+    (blocks with a 2-pixel halo), so the memory does not depend on the size of the rasters
+    :param dem: path of the coarse DEM (e.g. dem30m)
+    :param benchmark: path of the benchmark DEM (e.g. dem3m); its grid is used for the outputs
+    :param outputPath: GeoTIFF of the interpolated elevations
+    :param residualPath: GeoTIFF of the residuals (benchmark - interpolated elevation); None skips it
+    :param method: interpolation method (see batchInterpolation.contiguity)
+    :param blockSize: number of rows and columns of the windows of the benchmark grid
+    :param cacheBlocks: number of blocks of the coarse DEM kept in memory
+    :return: a report (pixels, seconds, megapixels per second and block cache statistics) and the ResidualStats of the residuals
+    '''
+    stats = residualStats.ResidualStats()
+    pixels = 0
+    temp = time()
+    with rasterio.open(dem) as src, rasterio.open(benchmark) as ref:
+        cellSize = src.res[0]
+        rasterBlock_x, rasterBlock_y = findValue.localGrid(cellSize)
+        cache = blockCache.BlockCache(src, cacheBlocks)
+
+        profile = dict(outputProfile, crs=ref.crs, transform=ref.transform, width=ref.width, height=ref.height)
+        dst = rasterio.open(outputPath, 'w', **profile)
+        res = rasterio.open(residualPath, 'w', **profile) if residualPath else None
+        try:
+            for r0 in range(0, ref.height, blockSize):
+                for c0 in range(0, ref.width, blockSize):
+                    window = Window(c0, r0, min(blockSize, ref.width - c0), min(blockSize, ref.height - r0))
+                    X, Y = pixelCenters(window, ref.transform)
+
+                    estimate = np.full(len(X), np.nan)
+                    for index, x, y, rasterBlock_elev in blockCache.iterBlockWindows(X, Y, cache):
+                        estimate[index] = batchInterpolation.interpolateMethod(method, x, y, rasterBlock_x, rasterBlock_y,
+                                                                               rasterBlock_elev, cellSize)
+                    estimate = estimate.reshape(int(window.height), int(window.width))
+
+                    with instrumentation.stage('write'):
+                        dst.write(np.where(np.isnan(estimate), outputProfile['nodata'], estimate).astype('float32'), 1, window=window)
+                    if res is not None:
+                        with instrumentation.stage('benchmark sample'):
+                            elev = ref.read(1, window=window).astype('float64')
+                            if ref.nodata is not None:
+                                elev[elev == ref.nodata] = np.nan
+                        with instrumentation.stage('residual'):
+                            residual = elev - estimate
+                        with instrumentation.stage('stats'):
+                            stats.update(residual)
+                        with instrumentation.stage('write'):
+                            res.write(np.where(np.isnan(residual), outputProfile['nodata'], residual).astype('float32'), 1, window=window)
+                    pixels += estimate.size
+        finally:
+            dst.close()
+            if res is not None:
+                res.close()
+
+    seconds = time() - temp
+    report = {'dem': dem, 'method': method, 'pixels': pixels, 'seconds': seconds,
+              'megapixelsPerSecond': pixels / seconds / 1e6 if seconds else None, 'blockCache': cache.report()}
+    return report, stats
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+class ResidualStats(object):
+    '''
+    One-pass accumulator of the residual statistics of one (DEM, method) field
+    Each chunk of residuals updates the count, mean and sum of squared deviations (Welford/Chan), the sums of squares and absolute
+    values, and the extrema. Accumulators of different chunks or worker processes can be merged.
+    The RMSE95 (RMSE of the residuals inside the 95% confidence interval) is computed exactly with a second pass (rmse95Pass),
+    or estimated from a histogram of the residuals without a second pass
+    '''
+    def __init__(self, binWidth=0.01, ddof=1):
+        '''
+        :param binWidth: width of the histogram bins (in meters) used for estimating the RMSE95; None disables the histogram
+        :param ddof: delta degrees of freedom of the STD: 1 as in the pandas table of result.csv, 0 as in the ArcPy version (np.std)
+        '''
+        self.count = 0
+        self.mean = 0.0
+        self.M2 = 0.0 # sum of squared deviations from the mean
+        self.sumSq = 0.0
+        self.sumAbs = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.binWidth = binWidth
+        self.ddof = ddof
+        self.histogram = {} # bin -> [count, sum of squares]
+        self.count95 = 0
+        self.sumSq95 = 0.0
+
+    def update(self, residuals):
+        '''
+        This function adds a chunk of residuals (nan values are skipped)
+        '''
+        residuals = np.asarray(residuals, dtype='float64')
+        residuals = residuals[~np.isnan(residuals)]
+        if len(residuals) == 0:
+            return
+        chunk = ResidualStats(self.binWidth, self.ddof)
+        chunk.count = len(residuals)
+        chunk.mean = residuals.mean()
+        chunk.M2 = ((residuals - chunk.mean) ** 2).sum()
+        chunk.sumSq = (residuals ** 2).sum()
+        chunk.sumAbs = np.abs(residuals).sum()
+        chunk.min = residuals.min()
+        chunk.max = residuals.max()
+        if self.binWidth:
+            bins, inverse = np.unique(np.floor(residuals / self.binWidth).astype('int64'), return_inverse=True)
+            counts = np.bincount(inverse)
+            sumSq = np.bincount(inverse, weights=residuals ** 2)
+            chunk.histogram = dict((b, [c, s]) for b, c, s in zip(bins.tolist(), counts.tolist(), sumSq.tolist()))
+        self.merge(chunk)
+
+    def merge(self, other):
+        '''
+        This function merges the accumulator of another chunk or worker process into this one
+        '''
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.M2 = self.M2 + other.M2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.sumSq += other.sumSq
+        self.sumAbs += other.sumAbs
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for b, (c, s) in other.histogram.items():
+            if b in self.histogram:
+                self.histogram[b][0] += c
+                self.histogram[b][1] += s
+            else:
+                self.histogram[b] = [c, s]
+        self.count95 += other.count95
+        self.sumSq95 += other.sumSq95
+
+    def std(self):
+        '''
+        :return: standard deviation of the residuals with ddof delta degrees of freedom (nan if there are not enough residuals)
+        '''
+        return np.sqrt(self.M2 / (self.count - self.ddof)) if self.count > self.ddof else np.nan
+
+    def limits(self):
+        '''
+        :return: lower and upper bounds of the 95% confidence interval (MBE -/+ 1.96 STD)
+        '''
+        return self.mean - 1.96 * self.std(), self.mean + 1.96 * self.std()
+
+    def rmse95Pass(self, residuals):
+        '''
+        Second pass for the exact RMSE95: call it with every chunk of residuals after all of the chunks have been added with update
+        '''
+        residuals = np.asarray(residuals, dtype='float64')
+        lowerLim, upperLim = self.limits()
+        inside = residuals[(residuals >= lowerLim) & (residuals <= upperLim)]
+        self.count95 += len(inside)
+        self.sumSq95 += (inside ** 2).sum()
+
+    def rmse95(self):
+        '''
+        :return: the exact RMSE95 if rmse95Pass has been used, otherwise an estimate from the histogram
+        '''
+        if self.count95:
+            return np.sqrt(self.sumSq95 / self.count95)
+        if not self.histogram:
+            return np.nan
+        lowerLim, upperLim = self.limits()
+        bins = np.array(sorted(self.histogram))
+        counts, sumSq = np.array([self.histogram[b] for b in bins]).T
+        # fraction of each bin inside the confidence interval (bins crossing a bound are counted partially)
+        lower = bins * self.binWidth
+        fraction = np.clip((np.minimum(lower + self.binWidth, upperLim) - np.maximum(lower, lowerLim)) / self.binWidth, 0, 1)
+        return np.sqrt((fraction * sumSq).sum() / (fraction * counts).sum())
+
+    def summary(self):
+        '''
+        :return: a dictionary of the statistics (same names as the stats table of the ArcPy version); all of them are nan if
+                 there are no residuals (e.g. a field that is nan at every point)
+        '''
+        if self.count == 0:
+            return dict((column, np.nan) for column in StatsTable.columns)
+        lowerLim, upperLim = self.limits()
+        return {'RMSE': np.sqrt(self.sumSq / self.count), 'MAE': self.sumAbs / self.count, 'MBE': self.mean, 'STD': self.std(),
+                'MIN': self.min, 'MAX': self.max, 'upperLim': upperLim, 'LowerLim': lowerLim, 'RMSE95': self.rmse95()}
+
+class StatsTable(object):
+    '''
+    Residual statistics of several fields (one ResidualStats per DEM and method)
+    '''
+    columns = ['RMSE', 'MAE', 'MBE', 'STD', 'MIN', 'MAX', 'upperLim', 'LowerLim', 'RMSE95']
+
+    def __init__(self, fields, binWidth=0.01, ddof=1):
+        self.fields = list(fields)
+        self.stats = dict((fld, ResidualStats(binWidth, ddof)) for fld in self.fields)
+
+    def update(self, field, residuals):
+        self.stats[field].update(residuals)
+
+    def merge(self, other):
+        for fld in other.fields:
+            if fld not in self.stats:
+                self.fields.append(fld)
+                self.stats[fld] = ResidualStats(other.stats[fld].binWidth, other.stats[fld].ddof)
+            self.stats[fld].merge(other.stats[fld])
+
+    def toDataFrame(self):
+        '''
+        :return: a DataFrame with one row per field (the result.csv table)
+        '''
+        return pd.DataFrame([self.stats[fld].summary() for fld in self.fields], index=self.fields, columns=self.columns)
@@ -0,0 +1,93 @@
+import os
+import numpy as np
+import pandas as pd
+
+class ResultTable(object):
+    '''
+    Preallocated columns of results: the benchmark elevation of each point and its estimated elevations (points * DEM * method)
+    The columns are numeric NumPy arrays (optionally memory-mapped), so they can be filled in place by any driver
+    '''
+    def __init__(self, X, Y, resolutions, methods, dtype='float64', path=None):
+        '''
+        :param X: (N,) x coordinates of points
+        :param Y: (N,) y coordinates of points
+        :param resolutions: nominal resolution of each DEM (for labeling the fields)
+        :param methods: list of interpolation methods
+        :param dtype: float32 or float64 estimates
+        :param path: if given, the estimates are stored in a memory-mapped .npy file instead of RAM
+        '''
+        self.X = np.asarray(X, dtype='float64')
+        self.Y = np.asarray(Y, dtype='float64')
+        self.resolutions = list(resolutions)
+        self.methods = list(methods)
+        self.benchmark = np.full(len(self.X), np.nan)
+        shape = (len(self.X), len(self.resolutions), len(self.methods))
+        if path is None:
+            self.estimates = np.full(shape, np.nan, dtype=dtype)
+        else:
+            self.estimates = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+            self.estimates[:] = np.nan
+
+    def fields(self):
+        '''
+        :return: names of the estimated fields (method + resolution), in the order of the flattened (DEM, method) axes
+        '''
+        return [mth + str(int(res)) for res in self.resolutions for mth in self.methods]
+
+    def column(self, res, method):
+        '''
+        :return: the estimated elevations of one DEM and method (a view that can be filled in place)
+        '''
+        return self.estimates[:, self.resolutions.index(res), self.methods.index(method)]
+
+    def residuals(self):
+        '''
+        The residuals of all DEMs and methods are computed with one vectorized subtraction
+        :return: (N, number of DEMs, number of methods) residuals (benchmark - estimated elevation)
+        '''
+        return self.benchmark[:, np.newaxis, np.newaxis] - self.estimates
+
+    def toDataFrame(self, residuals=False):
+        '''
+        :param residuals: return the residuals instead of the estimated elevations
+        :return: a DataFrame with the coordinates, the benchmark elevation and one column per field
+        '''
+        values = self.residuals() if residuals else self.estimates
+        frame = pd.DataFrame(values.reshape(len(self.X), -1), columns=self.fields())
+        frame.insert(0, 'elev3m', self.benchmark)
+        frame.insert(0, 'y', self.Y)
+        frame.insert(0, 'x', self.X)
+        return frame
+
+    def writeNpz(self, path):
+        '''
+        This function saves the columns in a compressed .npz file
+        '''
+        np.savez_compressed(path, x=self.X, y=self.Y, elev3m=self.benchmark, estimates=self.estimates,
+                            residuals=self.residuals(), resolutions=np.array(self.resolutions), methods=np.array(self.methods))
+
+    def writeParquet(self, path, residuals=False):
+        '''
+        This function saves the estimated elevations (or the residuals) in a Parquet file
+        '''
+        self.toDataFrame(residuals).to_parquet(path, index=False)
+
+    def writeVector(self, path, crs=None, residuals=False):
+        '''
+        This function saves the estimated elevations (or the residuals) as a point shapefile or GeoPackage (based on the extension)
+        '''
+        import geopandas as gpd
+        frame = self.toDataFrame(residuals)
+        driver = 'GPKG' if os.path.splitext(path)[1].lower() == '.gpkg' else 'ESRI Shapefile'
+        gpd.GeoDataFrame(frame, geometry=gpd.points_from_xy(self.X, self.Y), crs=crs).to_file(path, driver=driver)
+
+# This function loads the columns saved by ResultTable.writeNpz
+def readNpz(path):
+    '''
+    :return: a ResultTable
+    '''
+    with np.load(path) as data:
+        table = ResultTable(data['x'], data['y'], data['resolutions'], [str(mth) for mth in data['methods']], data['estimates'].dtype)
+        table.benchmark[:] = data['elev3m']
+        table.estimates[:] = data['estimates']
+    return table
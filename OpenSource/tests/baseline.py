@@ -0,0 +1,16 @@
+'''
+The original per-point functions (ArcPy version of the repository) used as references for the vectorized paths
+'''
+import os
+import importlib.util
+
+_root = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'ArcPy')
+
+def _load(name):
+    spec = importlib.util.spec_from_file_location('baseline_' + name, os.path.join(_root, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+neighbors = _load('neighbors') # branchy neibr
+polyInterpolation = _load('polyInterpolation') # polyfit2d (inverse of the design matrix) and polyval2d
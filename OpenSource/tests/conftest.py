@@ -0,0 +1,24 @@
+import os
+import sys
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+# The modules of the package are imported by their names (e.g. import findValue), as in main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def demFile(tmp_path):
+    '''
+    A tiled GeoTIFF (64*64 blocks) of a smooth surface with noise and one nodata pixel
+    :return: path of the DEM and its elevations
+    '''
+    rows, cols = np.mgrid[0:200, 0:170]
+    band = (500 + 40 * np.sin(rows / 17.0) * np.cos(cols / 23.0) + np.random.default_rng(0).normal(0, 0.5, rows.shape)).astype('float32')
+    band[100, 80] = -9999
+    path = str(tmp_path / 'dem10m.tif')
+    with rasterio.open(path, 'w', driver='GTiff', height=200, width=170, count=1, dtype='float32', crs='EPSG:32617',
+                       transform=from_origin(500000, 4000000, 10, 10), nodata=-9999, tiled=True, blockxsize=64, blockysize=64) as dst:
+        dst.write(band, 1)
+    return path, band
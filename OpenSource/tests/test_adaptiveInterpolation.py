@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import findValue
+import polyInterpolation
+import batchInterpolation
+import adaptiveInterpolation
+
+# x and y of the pixels of a 5*5 matrix in cell units (the center of the central pixel is (0,0))
+offsets = np.arange(-2, 3, dtype='float64')
+gridX, gridY = np.meshgrid(offsets, -offsets)
+
+surfaces = {'planar': lambda x, y: 100 + 2 * x - 3 * y,
+            'quadratic': lambda x, y: 100 + x ** 2 - y ** 2 + x * y,
+            'cubic': lambda x, y: 100 + x ** 3 + x ** 2 + y ** 2}
+
+@pytest.fixture
+def windows():
+    '''
+    Windows of the three surfaces with a small noise, one window with nodata, and random points in their central pixels (10 m DEM)
+    '''
+    rng = np.random.default_rng(12)
+    rasterBlock_elev = np.concatenate([np.repeat(f(gridX, gridY)[np.newaxis], 50, axis=0) for f in surfaces.values()])
+    rasterBlock_elev = rasterBlock_elev + rng.normal(0, 0.001, rasterBlock_elev.shape)
+    rasterBlock_elev[-1, 2, 3] = np.nan
+    x, y = rng.uniform(-5, 5, len(rasterBlock_elev)), rng.uniform(-5, 5, len(rasterBlock_elev))
+    return x, y, rasterBlock_elev
+
+def test_select_methods():
+    rasterBlock_elev = np.stack([f(gridX, gridY) for f in surfaces.values()])
+    errorBiLi, errorBiQ = adaptiveInterpolation.roughness(rasterBlock_elev)
+    np.testing.assert_allclose(errorBiLi, [0, 0.5, 0.5])
+    np.testing.assert_allclose(errorBiQ, [0, 0, 6 / 16.0])
+    assert list(adaptiveInterpolation.selectMethods(rasterBlock_elev, 0.1)) == [0, 1, 2] # BiLi4, BiQ9, BiC16
+    assert list(adaptiveInterpolation.selectMethods(rasterBlock_elev, 0.5)) == [0, 0, 0]
+
+    # windows with nodata use BiC16, whatever the tolerance (also when the roughness does not read the nodata pixel)
+    rasterBlock_elev[0, 0, 0] = np.nan
+    rasterBlock_elev[1, 2, 4] = np.nan
+    assert list(adaptiveInterpolation.selectMethods(rasterBlock_elev, 1000)) == [2, 2, 0]
+
+def test_interpolate_adaptive(windows):
+    x, y, rasterBlock_elev = windows
+    rasterBlock_x, rasterBlock_y = findValue.localGrid(10.0)
+    z, choice = adaptiveInterpolation.interpolateAdaptive(x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, 10.0, 0.1)
+    assert list(np.bincount(choice)) == [50, 50, 50] and choice[-1] == 2
+    for i, mth in enumerate(adaptiveInterpolation.ladder):
+        group = choice == i
+        np.testing.assert_array_equal(z[group], batchInterpolation.interpolateMethod(mth, x[group], y[group], rasterBlock_x, rasterBlock_y,
+                                                                                     rasterBlock_elev[group], 10.0))
+    assert np.isnan(z[-1]) and not np.isnan(z[:-1]).any()
+
+def test_adaptive_stats(windows):
+    x, y, rasterBlock_elev = windows
+    rasterBlock_x, rasterBlock_y = findValue.localGrid(10.0)
+    full = batchInterpolation.interpolateMethod('BiC16', x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, 10.0)
+    cost = np.array([(polyInterpolation.polyMethods[mth][0] + 1) * polyInterpolation.stencilKernel(mth).shape[1]
+                     for mth in adaptiveInterpolation.ladder])
+
+    # without a comparison, BiC16 is not evaluated and only the counts and the modeled saving are reported
+    stats = adaptiveInterpolation.AdaptiveStats()
+    z, choice, zFull = adaptiveInterpolation.compareAdaptive(x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, 10.0, 0.1, stats)
+    assert np.isnan(zFull).all() and stats.secondsFull == 0
+    summary = stats.summary()
+    assert (summary['BiLi4'], summary['BiQ9'], summary['BiC16'], summary['points'], summary['compared']) == (50, 50, 50, 150, 0)
+    np.testing.assert_allclose(summary['modeledComputeSaved'], 1 - 50.0 * cost.sum() / (150 * cost[-1]))
+    assert summary['computeSaved'] is None and summary['meanAbsAdded'] is None and summary['maxAbsAdded'] is None
+
+    # all of the points are compared
+    stats = adaptiveInterpolation.AdaptiveStats()
+    z, choice, zFull = adaptiveInterpolation.compareAdaptive(x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, 10.0, 0.1, stats, 1.0)
+    np.testing.assert_array_equal(zFull, full)
+    added = np.abs(z - full)[:-1]
+    summary = stats.summary()
+    assert summary['compared'] == 150 and summary['computeSaved'] is not None
+    np.testing.assert_allclose([summary['meanAbsAdded'], summary['rmsAdded'], summary['maxAbsAdded']],
+                               [added.mean(), np.sqrt((added ** 2).mean()), added.max()])
+
+    # a sample of the points is compared
+    stats = adaptiveInterpolation.AdaptiveStats()
+    z, choice, zFull = adaptiveInterpolation.compareAdaptive(x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, 10.0, 0.1, stats, 0.3,
+                                                             np.random.default_rng(0))
+    compared = ~np.isnan(zFull)
+    assert 0 < stats.compared < 150 and stats.compared >= compared.sum()
+    np.testing.assert_array_equal(zFull[compared], full[compared])
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+import rasterio
+
+import findValue
+import batchInterpolation
+
+@pytest.fixture
+def points(demFile):
+    '''
+    Dense points (about 20 per pixel) around the nodata pixel and across the edges of the DEM, plus points on the pixel centers
+    and on the boundaries of the quadrants
+    '''
+    path, band = demFile
+    with rasterio.open(path) as dataset:
+        rng = np.random.default_rng(6)
+        X = np.concatenate([rng.uniform(500750, 500880, 4000), rng.uniform(499980, 500060, 1000), [500805.0, 500800.0, 500805.0]])
+        Y = np.concatenate([rng.uniform(3998940, 3999060, 4000), rng.uniform(3999950, 4000020, 1000), [3998995.0, 3998995.0, 3999000.0]])
+        return X, Y, findValue.readBand(dataset), dataset.transform, dataset.nodata
+
+@pytest.mark.parametrize('method', sorted(batchInterpolation.contiguity))
+def test_shared_stencils(points, method):
+    X, Y, band, transform, nodata = points
+    estimates, report = batchInterpolation.interpolateShared(X, Y, band, transform, 10.0, [method], nodata)
+    assert report['points'] == len(X) and report['uniqueStencils'] < len(X) / 5
+
+    x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = findValue.extractWindows(X, Y, band, transform, 10.0, nodata)
+    reference = batchInterpolation.interpolateWindows(x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, 10.0, [method])[method]
+    assert np.isnan(reference).any() and not np.isnan(reference).all()
+    np.testing.assert_allclose(estimates[method], reference, rtol=1e-9, atol=1e-9)
+
+def test_no_points(points):
+    X, Y, band, transform, nodata = points
+    methods = sorted(batchInterpolation.contiguity)
+    estimates, report = batchInterpolation.interpolateShared(np.empty(0), np.empty(0), band, transform, 10.0, methods, nodata)
+    assert report == {'points': 0, 'uniqueStencils': 0, 'ratio': 0.0}
+
+    # the same empty arrays as the per-point windows
+    x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = findValue.extractWindows(np.empty(0), np.empty(0), band, transform, 10.0, nodata)
+    reference = batchInterpolation.interpolateWindows(x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, 10.0, methods)
+    for mth in methods:
+        assert estimates[mth].shape == reference[mth].shape == (0,) and estimates[mth].dtype == reference[mth].dtype
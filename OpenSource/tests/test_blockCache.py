@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+import rasterio
+
+import findValue
+import blockCache
+
+def randomPoints(dataset, n):
+    # points all over the raster, including its edges and a few points outside of it
+    rng = np.random.default_rng(3)
+    left, bottom, right, top = dataset.bounds
+    return rng.uniform(left - 20, right + 20, n), rng.uniform(bottom - 20, top + 20, n)
+
+def test_morton_key():
+    rows, cols = np.meshgrid(np.arange(4), np.arange(4), indexing='ij')
+    order = np.argsort(blockCache.mortonKey(rows.ravel(), cols.ravel()))
+    assert list(zip(rows.ravel()[order][:4], cols.ravel()[order][:4])) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+
+@pytest.mark.parametrize('maxBlocks', [1, 64])
+def test_block_windows(demFile, maxBlocks):
+    path, band = demFile
+    with rasterio.open(path) as dataset:
+        assert blockCache.blockShape(dataset) == (64, 64)
+        X, Y = randomPoints(dataset, 3000)
+        x, y, _, _, rasterBlock_elev = findValue.extractWindows(X, Y, findValue.readBand(dataset), dataset.transform, 10.0,
+                                                               dataset.nodata)
+        cache = blockCache.BlockCache(dataset, maxBlocks)
+        visited = np.zeros(len(X), dtype='int64')
+        for index, blockX, blockY, blockElev in blockCache.iterBlockWindows(X, Y, cache):
+            visited[index] += 1
+            np.testing.assert_array_equal(blockX, x[index])
+            np.testing.assert_array_equal(blockY, y[index])
+            np.testing.assert_array_equal(blockElev, rasterBlock_elev[index])
+    assert (visited == 1).all()
+
+    # each block is read once (the points are grouped by block), whatever the size of the cache
+    rows, cols = findValue.pointIndex(X, Y, dataset.transform)
+    report = cache.report()
+    assert report['hits'] == 0 and report['misses'] == len(set(zip(rows // 64, cols // 64)))
+    assert report['evictions'] == max(report['misses'] - maxBlocks, 0)
+
+def test_lru(demFile):
+    path, band = demFile
+    with rasterio.open(path) as dataset:
+        cache = blockCache.BlockCache(dataset, 2)
+        for key in [(0, 0), (0, 1), (0, 0), (1, 1), (0, 0), (0, 1)]:
+            cache.getBlock(*key)
+    # (0, 1) is evicted by (1, 1), then read again
+    assert (cache.hits, cache.misses, cache.evictions) == (2, 4, 2)
+    assert list(cache.blocks) == [(0, 0), (0, 1)]
+
+def test_sample_values(demFile):
+    path, band = demFile
+    with rasterio.open(path) as dataset:
+        X, Y = randomPoints(dataset, 3000)
+        reference = findValue.extractValues(X, Y, findValue.readBand(dataset), dataset.transform, dataset.nodata)
+        np.testing.assert_array_equal(blockCache.sampleValues(X, Y, blockCache.BlockCache(dataset, 4)), reference)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import rasterio
+
+import findValue
+import polyInterpolation
+import batchInterpolation
+import coefficientCube
+import baseline
+
+exactMethods = ['Li3', 'BiLi4', 'BiQ9', 'BiC16']
+
+@pytest.fixture
+def points(demFile):
+    path, band = demFile
+    with rasterio.open(path) as dataset:
+        rng = np.random.default_rng(4)
+        left, bottom, right, top = dataset.bounds
+        X, Y = rng.uniform(left + 30, right - 30, 200), rng.uniform(bottom + 30, top - 30, 200)
+        return X, Y, dataset.transform, findValue.readBand(dataset).astype('float64'), dataset.nodata
+
+@pytest.mark.parametrize('method', exactMethods)
+def test_matches_polyfit2d(points, method):
+    X, Y, transform, band, nodata = points
+    band = band.copy()
+    band[band == nodata] = 500.0 # the original functions do not handle nodata
+    z = coefficientCube.cubeInterpolate(coefficientCube.buildCoefficientCube(band, method, blockSize=37), X, Y, transform, 10.0, method)
+
+    m, order = polyInterpolation.polyMethods[method]
+    rasterBlock_x, rasterBlock_y = findValue.localGrid(10.0)
+    x, y, _, _, rasterBlock_elev = findValue.extractWindows(X, Y, band, transform, 10.0)
+    for i in range(len(X)):
+        xCoor, yCoor, elev = baseline.neighbors.neibr(rasterBlock_x, rasterBlock_y, rasterBlock_elev[i], x[i], y[i], m)
+        reference = baseline.polyInterpolation.polyval2d(x[i], y[i], baseline.polyInterpolation.polyfit2d(xCoor, yCoor, elev, order))
+        np.testing.assert_allclose(z[i], reference, rtol=1e-9)
+
+@pytest.mark.parametrize('method', sorted(polyInterpolation.polyMethods))
+def test_matches_batch(tmp_path, points, method):
+    X, Y, transform, band, nodata = points
+    # points near the nodata pixel and outside of the DEM
+    X = np.r_[X, transform.c + 805.0, transform.c + 795.0, transform.c - 5.0]
+    Y = np.r_[Y, transform.f - 1005.0, transform.f - 1015.0, transform.f - 5.0]
+    cube = coefficientCube.buildCoefficientCube(band, method, nodata, blockSize=64, path=str(tmp_path / 'cube.npy'))
+    z = coefficientCube.cubeInterpolate(cube, X, Y, transform, 10.0, method)
+
+    x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = findValue.extractWindows(X, Y, band, transform, 10.0, nodata)
+    reference = batchInterpolation.interpolateMethod(method, x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, 10.0)
+    np.testing.assert_array_equal(np.isnan(z), np.isnan(reference))
+    np.testing.assert_allclose(z, reference, rtol=1e-12)
+    assert np.isnan(z[-3]) and np.isnan(z[-1]) # nodata central pixel and point outside of the DEM
+
+def test_block_size(points):
+    X, Y, transform, band, nodata = points
+    whole = coefficientCube.buildCoefficientCube(band, 'BiQ9', nodata, blockSize=1000)
+    np.testing.assert_allclose(coefficientCube.buildCoefficientCube(band, 'BiQ9', nodata, blockSize=23), whole, rtol=1e-13)
@@ -0,0 +1,114 @@
+import gc
+import weakref
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+
+import findValue
+import batchInterpolation
+import demPyramid
+
+# This function aggregates the blocks of factor * factor pixels of the band directly (reference of the pyramid levels)
+def blockReduce(elev, factor, reduce):
+    rows, cols = elev.shape[0] // factor, elev.shape[1] // factor
+    blocks = elev[:rows * factor, :cols * factor].reshape(rows, factor, cols, factor).transpose(0, 2, 1, 3).reshape(rows, cols, -1)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return reduce(blocks, axis=-1)
+
+@pytest.fixture
+def benchmark(demFile):
+    path, band = demFile
+    elev = np.where(band == -9999, np.nan, band.astype('float64'))
+    elev[:4, :4] = np.nan # a whole 4*4 block of nodata
+    return path, elev
+
+def test_aggregate(benchmark):
+    _, elev = benchmark
+    coarse, count = demPyramid.aggregate(elev, 3)
+    assert coarse.shape == (66, 56)
+    np.testing.assert_allclose(coarse, blockReduce(elev, 3, np.nanmean), rtol=1e-12)
+    np.testing.assert_array_equal(count, blockReduce(~np.isnan(elev), 3, np.sum))
+    np.testing.assert_array_equal(demPyramid.aggregate(elev, 3, 'median')[0], blockReduce(elev, 3, np.nanmedian))
+    with pytest.raises(ValueError):
+        demPyramid.aggregate(elev, 3, 'mode')
+
+def test_pyramid_levels(benchmark):
+    _, elev = benchmark
+    transform = rasterio.transform.from_origin(500000, 4000000, 10, 10)
+    levels = list(demPyramid.pyramidLevels(elev, transform, 10.0, [40, 20, 30, 80, 60]))
+    assert [res for res, _, _, _ in levels] == [20, 30, 40, 60, 80]
+    for res, coarse, levelTransform, cellSize in levels:
+        factor = int(res // 10)
+        # the means of the levels built from other levels are weighted by the number of benchmark pixels, so they are exact
+        np.testing.assert_allclose(coarse, blockReduce(elev, factor, np.nanmean), rtol=1e-12)
+        assert cellSize == res and levelTransform == rasterio.transform.from_origin(500000, 4000000, res, res)
+    assert np.isnan(levels[0][1][:2, :2]).all() and np.isnan(levels[2][1][0, 0])
+
+    # the median levels aggregated from the benchmark are exact medians
+    for res, coarse, _, _ in demPyramid.pyramidLevels(elev, transform, 10.0, [20, 30], method='median'):
+        np.testing.assert_array_equal(coarse, blockReduce(elev, int(res // 10), np.nanmedian))
+
+    with pytest.raises(ValueError):
+        list(demPyramid.pyramidLevels(elev, transform, 10.0, [4]))
+
+def test_snapped_resolutions(benchmark):
+    _, elev = benchmark
+    # e.g. the 1000 m level of a 3 m benchmark is a 999 m level
+    with pytest.warns(UserWarning, match='snapped to 999'):
+        assert demPyramid.levelFactor(1000, 3.0) == 333
+    assert demPyramid.levelFactor(30.000000001, 10.0) == 3
+
+    transform = rasterio.transform.from_origin(500000, 4000000, 10, 10)
+    with pytest.warns(UserWarning):
+        levels = list(demPyramid.pyramidLevels(elev, transform, 10.0, [25, 30, 44]))
+    # 25 m and 30 m are the same level
+    assert [res for res, _, _, _ in levels] == [30, 40]
+    np.testing.assert_allclose(levels[1][1], blockReduce(elev, 4, np.nanmean), rtol=1e-12)
+
+def test_level_memory(demFile):
+    path, band = demFile
+    transform = rasterio.transform.from_origin(500000, 4000000, 10, 10)
+    reference = band.copy()
+    levels = demPyramid.pyramidLevels(band, transform, 10.0, [20, 30, 60], nodata=-9999)
+
+    # the levels keep the data type of the benchmark, and the nodata pixels are skipped without changing the benchmark
+    res, coarse, _, _ = next(levels)
+    elev = np.where(band == -9999, np.nan, band.astype('float64'))
+    assert coarse.dtype == np.float32
+    np.testing.assert_allclose(coarse, blockReduce(elev, 2, np.nanmean), rtol=1e-6)
+    np.testing.assert_array_equal(band, reference)
+
+    # the 20 m level is released once the 30 m level is built (60 m is aggregated from 30 m)
+    released = weakref.ref(coarse)
+    del coarse
+    res, coarse, _, _ = next(levels)
+    gc.collect()
+    assert res == 30 and released() is None
+    res, coarse, _, _ = next(levels)
+    np.testing.assert_allclose(coarse, blockReduce(elev, 6, np.nanmean), rtol=1e-6)
+
+    # the strips of the aggregation do not change the results
+    np.testing.assert_array_equal(demPyramid.aggregate(elev, 3, stripSize=1)[0], demPyramid.aggregate(elev, 3)[0])
+
+def test_sweep_resolutions(demFile):
+    path, band = demFile
+    rng = np.random.default_rng(10)
+    X, Y = rng.uniform(500000, 501700, 500), rng.uniform(3998000, 4000000, 500)
+    methods = ['WA4', 'BiLi4', 'BiC16']
+    stats, frame = demPyramid.sweepResolutions(X, Y, path, [30, 20], methods, chunkSize=128, backend='numpy')
+    assert list(frame['resolution']) == [20] * 3 + [30] * 3 and list(frame['method']) == methods * 2
+
+    with rasterio.open(path) as src:
+        elev = findValue.extractValues(X, Y, findValue.readBand(src), src.transform, src.nodata)
+        levels = demPyramid.pyramidLevels(findValue.readBand(src), src.transform, 10.0, [20, 30], src.nodata)
+        for res, coarse, transform, cellSize in levels:
+            x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = findValue.extractWindows(X, Y, coarse, transform, cellSize)
+            estimates = batchInterpolation.interpolateWindows(x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, cellSize, methods)
+            for mth in methods:
+                residuals = pd.Series(elev - estimates[mth]).dropna()
+                summary = stats.stats[mth + '{:g}'.format(res)].summary()
+                np.testing.assert_allclose([summary['MBE'], summary['STD'], summary['MAX']],
+                                           [residuals.mean(), residuals.std(), residuals.max()], rtol=1e-9)
@@ -0,0 +1,87 @@
+import json
+import threading
+import time
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+import numpy as np
+import pytest
+from rasterio.transform import from_origin
+
+import fusedKernels
+import elevationService
+
+@pytest.fixture
+def dems():
+    band = np.random.default_rng(0).uniform(100, 200, (60, 60))
+    return {'dem10m': (band, from_origin(0, 600, 10, 10), 10.0, None)}
+
+@pytest.fixture
+def server(dems):
+    server = elevationService.makeServer(dems, port=0, backend='numpy', timeout=5.0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def post(server, body):
+    request = Request('http://127.0.0.1:' + str(server.server_address[1]) + '/elevation', json.dumps(body).encode('utf-8'),
+                      {'Content-Type': 'application/json'})
+    try:
+        with urlopen(request) as response:
+            return response.status, json.loads(response.read().decode('utf-8'))
+    except HTTPError as error:
+        return error.code, json.loads(error.read().decode('utf-8'))
+
+def test_query(dems):
+    batcher = elevationService.MicroBatcher(dems, backend='numpy')
+    X, Y = np.array([105.0, 233.3]), np.array([395.0, 411.7])
+    result = batcher.query('dem10m', ['WA25', 'BiC16'], X, Y)
+    band, transform, cellSize, nodata = dems['dem10m']
+    reference = fusedKernels.interpolatePoints(X, Y, band, transform, cellSize, ['WA25', 'BiC16'], backend='numpy')
+    np.testing.assert_array_equal(result['WA25'], reference[:, 0])
+    np.testing.assert_array_equal(result['BiC16'], reference[:, 1])
+
+def test_invalid_methods(server):
+    assert post(server, {'dem': 'dem10m', 'methods': 'BiQ9', 'x': [105.0], 'y': [395.0]})[0] == 400
+    assert post(server, {'dem': 'dem10m', 'methods': ['BiQ9', 3], 'x': [105.0], 'y': [395.0]})[0] == 400
+    assert post(server, {'dem': 'dem10m', 'methods': ['Bi'], 'x': [105.0], 'y': [395.0]})[0] == 400
+    status, body = post(server, {'dem': 'dem10m', 'methods': ['BiQ9'], 'x': [105.0], 'y': [395.0]})
+    assert status == 200 and len(body['elevations']['BiQ9']) == 1
+
+def test_failed_batch(server, monkeypatch):
+    # an error outside of the evaluation of a DEM fails the queries of its batch, and the thread keeps serving the next batches
+    batcher = server.batcher
+    evaluate = batcher._evaluate
+    def failingEvaluate(batch):
+        monkeypatch.setattr(batcher, '_evaluate', evaluate)
+        raise MemoryError('evaluate failed')
+    monkeypatch.setattr(batcher, '_evaluate', failingEvaluate)
+    assert post(server, {'dem': 'dem10m', 'x': [105.0], 'y': [395.0]})[0] == 500
+    assert batcher.thread.is_alive()
+    assert post(server, {'dem': 'dem10m', 'x': [105.0], 'y': [395.0]})[0] == 200
+
+def test_timeout(server, monkeypatch):
+    interpolatePoints = fusedKernels.interpolatePoints
+    def slowInterpolation(*args, **kwargs):
+        time.sleep(0.5)
+        return interpolatePoints(*args, **kwargs)
+    monkeypatch.setattr(fusedKernels, 'interpolatePoints', slowInterpolation)
+    with pytest.raises(TimeoutError):
+        server.batcher.query('dem10m', ['BiC16'], [105.0], [395.0], timeout=0.05)
+    server.batcher.timeout = 0.05
+    assert post(server, {'dem': 'dem10m', 'x': [105.0], 'y': [395.0]})[0] == 504
+
+def test_load_dems(tmp_path, demFile):
+    path, band = demFile
+    dems = elevationService.loadDEMs([path], directory=str(tmp_path))
+    mapped, transform, cellSize, nodata = dems['dem10m']
+    # the band is memory-mapped from a decoded copy instead of read into the memory of the process
+    assert isinstance(mapped, np.memmap) and mapped.filename == str(tmp_path / 'band0.npy')
+    np.testing.assert_array_equal(mapped, band)
+    assert (transform, cellSize, nodata) == (from_origin(500000, 4000000, 10, 10), 10.0, -9999)
+
+    batcher = elevationService.MicroBatcher(dems, backend='numpy')
+    result = batcher.query('dem10m', ['BiC16'], [500805.0, 500405.0], [3998995.0, 3999005.0])
+    assert np.isnan(result['BiC16'][0]) and not np.isnan(result['BiC16'][1])
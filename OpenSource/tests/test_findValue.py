@@ -0,0 +1,43 @@
+import numpy as np
+import rasterio
+
+import findValue
+
+def randomPoints(dataset, n, margin):
+    rng = np.random.default_rng(2)
+    left, bottom, right, top = dataset.bounds
+    return rng.uniform(left + margin, right - margin, n), rng.uniform(bottom + margin, top - margin, n)
+
+def test_extract_windows(demFile):
+    path, band = demFile
+    with rasterio.open(path) as dataset:
+        X, Y = randomPoints(dataset, 300, 3 * dataset.res[0])
+        x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = findValue.extractWindows(X, Y, findValue.readBand(dataset),
+                                                                                      dataset.transform, 10.0)
+        for i in range(len(X)):
+            reference = findValue.extractWindow(X[i], Y[i], dataset, 10.0)
+            np.testing.assert_allclose([x[i], y[i]], reference[:2], atol=1e-8)
+            np.testing.assert_allclose(rasterBlock_x, reference[2], atol=1e-8)
+            np.testing.assert_allclose(rasterBlock_y, reference[3], atol=1e-8)
+            np.testing.assert_array_equal(rasterBlock_elev[i], reference[4])
+
+def test_edges_and_nodata(demFile):
+    path, band = demFile
+    with rasterio.open(path) as dataset:
+        X = np.array([dataset.bounds.left + 5.0, dataset.bounds.left + 805.0])
+        Y = np.array([dataset.bounds.top - 5.0, dataset.bounds.top - 1005.0])
+        _, _, _, _, rasterBlock_elev = findValue.extractWindows(X, Y, findValue.readBand(dataset), dataset.transform, 10.0,
+                                                               dataset.nodata)
+    assert np.isnan(rasterBlock_elev[0, :2]).all() and np.isnan(rasterBlock_elev[0, :, :2]).all() # outside of the raster
+    np.testing.assert_array_equal(rasterBlock_elev[0, 2:, 2:], band[:3, :3])
+    assert np.isnan(rasterBlock_elev[1, 2, 2]) # nodata pixel
+    assert np.isnan(rasterBlock_elev[1]).sum() == 1
+
+def test_point_index_and_values(demFile):
+    path, band = demFile
+    with rasterio.open(path) as dataset:
+        X, Y = randomPoints(dataset, 300, 0)
+        rows, cols = findValue.pointIndex(X, Y, dataset.transform)
+        assert [dataset.index(x, y) for x, y in zip(X, Y)] == list(zip(rows.tolist(), cols.tolist()))
+        values = findValue.extractValues(X, Y, findValue.readBand(dataset), dataset.transform)
+        np.testing.assert_array_equal(values, [findValue.extractValue(x, y, dataset) for x, y in zip(X, Y)])
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from rasterio.transform import from_origin
+
+import findValue
+import batchInterpolation
+import fusedKernels
+
+methods = sorted(batchInterpolation.contiguity)
+
+@pytest.fixture
+def dem():
+    band = np.random.default_rng(0).uniform(100, 200, (40, 50)).astype('float32')
+    band[20, 20] = -9999
+    return band, from_origin(1000, 2000, 30, 30), 30.0, -9999
+
+def points(transform, shape, n=2000):
+    rng = np.random.default_rng(1)
+    X = transform.c + rng.uniform(0, shape[1] * transform.a, n)
+    Y = transform.f + rng.uniform(0, shape[0] * -transform.e, n)
+    # pixel centers, pixel edges and points near the edges of the raster
+    X[:3], Y[:3] = transform.c + 45.0, transform.f - 45.0
+    X[3:6], Y[3:6] = transform.c + 60.0, transform.f - 75.0
+    return X, Y
+
+def test_numpy_matches_batch(dem):
+    band, transform, cellSize, nodata = dem
+    X, Y = points(transform, band.shape)
+    out = fusedKernels.interpolatePoints(X, Y, band, transform, cellSize, methods, nodata, backend='numpy')
+    x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = findValue.extractWindows(X, Y, band, transform, cellSize, nodata)
+    for j, mth in enumerate(methods):
+        np.testing.assert_array_equal(out[:, j], batchInterpolation.interpolateMethod(mth, x, y, rasterBlock_x, rasterBlock_y,
+                                                                                      rasterBlock_elev, cellSize))
+
+@pytest.mark.skipif(not fusedKernels.available, reason='Numba is not installed')
+def test_numba_matches_numpy(dem):
+    band, transform, cellSize, nodata = dem
+    X, Y = points(transform, band.shape)
+    numba = fusedKernels.interpolatePoints(X, Y, band, transform, cellSize, methods, nodata, backend='numba')
+    numpy = fusedKernels.interpolatePoints(X, Y, band, transform, cellSize, methods, nodata, backend='numpy')
+    np.testing.assert_array_equal(np.isnan(numba), np.isnan(numpy))
+    np.testing.assert_allclose(numba, numpy, rtol=1e-10, atol=1e-9)
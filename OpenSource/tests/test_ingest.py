@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import rasterio
+
+import rasterCache
+import ingest
+
+def test_convert(tmp_path, demFile):
+    path, band = demFile
+    target = ingest.convertDEM(path, str(tmp_path / 'dem10m_store.tif'), blockSize=64)
+    with rasterio.open(path) as src, rasterio.open(target) as dst:
+        np.testing.assert_array_equal(dst.read(1), band)
+        assert (dst.transform, dst.crs, dst.nodata, dst.dtypes[0]) == (src.transform, src.crs, src.nodata, src.dtypes[0])
+        assert dst.block_shapes == [(64, 64)] and dst.compression.value == 'DEFLATE'
+        assert dst.overviews(1) == [2] # 170 // 4 columns would not fill a tile
+        assert dst.tags()['SOURCE_HASH'] == rasterCache.contentHash(path)
+    assert not os.path.exists(target + '.tmp.tif')
+
+def test_up_to_date(tmp_path, demFile):
+    path, band = demFile
+    directory = str(tmp_path / 'store')
+    target = ingest.storePath(path, directory)
+    assert target == os.path.join(directory, 'dem10m.tif') and not ingest.isUpToDate(path, target, 64)
+
+    stores, converted = ingest.ingestDEMs([path], directory, blockSize=64)
+    assert stores == {path: target} and converted == [path]
+    assert ingest.isUpToDate(path, target, 64)
+    assert ingest.ingestDEMs([path], directory, blockSize=64)[1] == [] # skipped
+
+    # touched but not modified: the content hash matches, and the new signature is recorded
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 100))
+    assert ingest.isUpToDate(path, target, 64)
+    with rasterio.open(target) as dst:
+        assert dst.tags()['SOURCE_SIGNATURE'] == repr(rasterCache.sourceSignature(path))
+    assert ingest.ingestDEMs([path], directory, blockSize=64)[1] == []
+
+    # modified: the DEM is converted again
+    with rasterio.open(path, 'r+') as src:
+        src.write(band + 1, 1)
+    assert not ingest.isUpToDate(path, target, 64)
+    assert ingest.ingestDEMs([path], directory, blockSize=64)[1] == [path]
+    with rasterio.open(target) as dst:
+        np.testing.assert_array_equal(dst.read(1), band + 1)
+
+def test_options_changed(tmp_path, demFile):
+    path, band = demFile
+    directory = str(tmp_path / 'store')
+    target = ingest.ingestDEMs([path], directory, blockSize=64)[0][path]
+
+    # a new tile size or compression converts the DEM again
+    assert not ingest.isUpToDate(path, target, 128) and not ingest.isUpToDate(path, target, 64, 'lzw')
+    assert ingest.ingestDEMs([path], directory, blockSize=128)[1] == [path]
+    with rasterio.open(target) as dst:
+        assert dst.block_shapes == [(128, 128)]
+        np.testing.assert_array_equal(dst.read(1), band)
+    assert ingest.ingestDEMs([path], directory, blockSize=128)[1] == []
+    assert ingest.ingestDEMs([path], directory, blockSize=128, compress='lzw')[1] == [path]
+    with rasterio.open(target) as dst:
+        assert dst.compression.value == 'LZW'
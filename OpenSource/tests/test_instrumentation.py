@@ -0,0 +1,83 @@
+import csv
+import json
+import numpy as np
+import rasterio
+
+import instrumentation
+import benchmark
+import findValue
+import blockCache
+import batchInterpolation
+
+def test_stages():
+    profiler = instrumentation.Profiler()
+    with profiler.stage('window read'): # disabled: nothing is recorded
+        pass
+    assert profiler.report() == []
+
+    profiler.start()
+    with profiler.forDEM('dem10m'):
+        for _ in range(3):
+            with profiler.stage('evaluate'):
+                np.ones(1000)
+        profiler.addBytes('window read', 100)
+    profiler.stop()
+    records = dict((r['stage'], r) for r in profiler.report())
+    assert records['evaluate']['calls'] == 3 and records['evaluate']['dem'] == 'dem10m'
+    assert records['window read']['bytesRead'] == 100
+    assert not records['evaluate']['tracemalloc'] and records['evaluate']['peakMemory'] is None
+
+def test_tracemalloc_label(tmp_path):
+    profiler = instrumentation.Profiler(traceMemory=True)
+    profiler.start()
+    with profiler.stage('evaluate'):
+        np.ones(10 ** 5)
+    profiler.stop()
+    record = profiler.report()[0]
+    assert record['tracemalloc'] and record['peakMemory'] >= 8 * 10 ** 5
+
+    profiler.writeCsv(str(tmp_path / 'profile.csv'))
+    with open(str(tmp_path / 'profile.csv')) as f:
+        assert next(csv.DictReader(f))['tracemalloc'] == 'True'
+
+def test_measure():
+    calls = []
+    seconds, peak, result = benchmark.measure(lambda n: calls.append(n) or np.ones(n), 10 ** 5)
+    assert len(calls) == 2 # one run for the time and one under tracemalloc for the peak memory
+    assert len(result) == 10 ** 5 and peak >= 8 * 10 ** 5 and seconds >= 0
+
+def test_synthetic_terrain(tmp_path):
+    # the fractal DEMs of all resolutions are aggregated from the same surface
+    DEMs = dict(((surface, res), path) for surface, res, path in benchmark.makeDEMs(str(tmp_path), 3000.0, [10, 30, 100]))
+    assert sorted(res for surface, res in DEMs if surface == 'fractal') == [10, 30, 100]
+    with rasterio.open(DEMs[('fractal', 10)]) as fine, rasterio.open(DEMs[('fractal', 30)]) as coarse:
+        elev = fine.read(1).astype('float64')
+        assert coarse.shape == (100, 100) and coarse.res == (30.0, 30.0)
+        np.testing.assert_allclose(coarse.read(1), elev.reshape(100, 3, 100, 3).mean(axis=(1, 3)), atol=1e-3)
+
+def test_pipeline_stages(demFile, monkeypatch, tmp_path):
+    path, band = demFile
+    monkeypatch.setattr(instrumentation, 'profiler', instrumentation.Profiler(enabled=True))
+    with rasterio.open(path) as dataset:
+        X = dataset.bounds.left + np.random.default_rng(0).uniform(30, 1600, 500)
+        Y = dataset.bounds.top - np.random.default_rng(1).uniform(30, 1900, 500)
+        rasterBlock_x, rasterBlock_y = findValue.localGrid(10.0)
+        cache = blockCache.BlockCache(dataset, 4)
+        with instrumentation.profiler.forDEM('dem10m'):
+            for index, x, y, rasterBlock_elev in blockCache.iterBlockWindows(X, Y, cache):
+                z = batchInterpolation.interpolateMethod('BiC16', x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, 10.0)
+                # the hooks do not change the results
+                monkeypatch.setattr(instrumentation.profiler, 'enabled', False)
+                np.testing.assert_array_equal(z, batchInterpolation.interpolateMethod('BiC16', x, y, rasterBlock_x, rasterBlock_y,
+                                                                                      rasterBlock_elev, 10.0))
+                monkeypatch.setattr(instrumentation.profiler, 'enabled', True)
+
+    records = dict((r['stage'], r) for r in instrumentation.profiler.report())
+    assert [r['stage'] for r in instrumentation.profiler.report()] == ['window read', 'neighbor select', 'fit', 'evaluate']
+    assert records['window read']['bytesRead'] == cache.bytesRead > 0
+    assert records['window read']['calls'] == records['fit']['calls'] == cache.misses
+    assert all(r['dem'] == 'dem10m' for r in records.values())
+
+    instrumentation.profiler.writeJson(str(tmp_path / 'profile.json'))
+    with open(str(tmp_path / 'profile.json')) as f:
+        assert json.load(f) == instrumentation.profiler.report()
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from rasterio.transform import from_origin
+
+import findValue
+import neighbors
+import inverseDistanecWeighting
+import batchInterpolation
+import fusedKernels
+
+backends = ['numpy'] + (['numba'] if fusedKernels.available else [])
+
+@pytest.fixture
+def dem():
+    band = np.random.default_rng(0).uniform(100, 200, (50, 50))
+    return band, from_origin(0, 500, 10, 10), 10.0
+
+def test_center_column():
+    for m, index in neighbors.stencilIndex.items():
+        if neighbors.centerColumn[m] is None:
+            assert 12 not in index
+        else:
+            assert (index[:, neighbors.centerColumn[m]] == 12).all()
+
+@pytest.mark.parametrize('backend', backends)
+@pytest.mark.parametrize('method', batchInterpolation.idwMethods)
+def test_pixel_center(dem, method, backend):
+    # a point on a pixel center gets the elevation of the pixel (the weight of the central pixel is infinite)
+    band, transform, cellSize = dem
+    X, Y = np.array([105.0, 155.0]), np.array([395.0, 245.0])
+    z = fusedKernels.interpolatePoints(X, Y, band, transform, cellSize, [method], backend=backend)[:, 0]
+    rows, cols = findValue.pointIndex(X, Y, transform)
+    np.testing.assert_array_equal(z, band[rows, cols])
+
+@pytest.mark.parametrize('method', batchInterpolation.idwMethods)
+def test_pixel_center_shared(dem, method):
+    band, transform, cellSize = dem
+    X, Y = np.array([105.0, 155.0, 105.0]), np.array([395.0, 245.0, 395.0])
+    estimates, report = batchInterpolation.interpolateShared(X, Y, band, transform, cellSize, [method])
+    rows, cols = findValue.pointIndex(X, Y, transform)
+    np.testing.assert_array_equal(estimates[method], band[rows, cols])
+
+@pytest.mark.parametrize('backend', backends)
+@pytest.mark.parametrize('method', batchInterpolation.idwMethods)
+def test_matches_idw(dem, method, backend):
+    band, transform, cellSize = dem
+    rng = np.random.default_rng(1)
+    X, Y = rng.uniform(30, 470, 200), rng.uniform(30, 470, 200)
+    z = fusedKernels.interpolatePoints(X, Y, band, transform, cellSize, [method], backend=backend)[:, 0]
+
+    x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = findValue.extractWindows(X, Y, band, transform, cellSize)
+    reference = []
+    for i in range(len(X)):
+        xCoor, yCoor, elev = neighbors.neibr(rasterBlock_x, rasterBlock_y, rasterBlock_elev[i], x[i], y[i],
+                                             batchInterpolation.contiguity[method])
+        reference.append(inverseDistanecWeighting.IDW(x[i], y[i], xCoor, yCoor, elev, batchInterpolation.idwPower))
+    np.testing.assert_allclose(z, reference, rtol=1e-12)
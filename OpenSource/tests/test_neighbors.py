@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import findValue
+import neighbors
+import baseline
+
+configurations = [1, 3, 4, 5, 8, 9, 16, 17, 25]
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(-15, 15, 200), rng.uniform(-15, 15, 200)
+    # points on the axes of the central pixel (x <= 0 is on the left, y >= 0 is on the upper side)
+    x[:4], y[:4] = [0.0, 0.0, 3.0, -3.0], [3.0, -3.0, 0.0, 0.0]
+    return x, y
+
+@pytest.mark.parametrize('m', configurations)
+def test_neibr(points, m):
+    rasterBlock_x, rasterBlock_y = findValue.localGrid(30.0)
+    rasterBlock_elev = np.random.default_rng(1).uniform(100, 200, (5, 5))
+    for x, y in zip(*points):
+        for new, old in zip(neighbors.neibr(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, m),
+                            baseline.neighbors.neibr(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, m)):
+            np.testing.assert_array_equal(new, old)
+
+@pytest.mark.parametrize('m', configurations)
+def test_neibr_batch(points, m):
+    x, y = points
+    rasterBlock_x, rasterBlock_y = findValue.localGrid(30.0)
+    rasterBlock_elev = np.random.default_rng(1).uniform(100, 200, (len(x), 5, 5))
+    xCoor, yCoor, elev = neighbors.neibrBatch(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, m)
+    for i in range(len(x)):
+        reference = baseline.neighbors.neibr(rasterBlock_x, rasterBlock_y, rasterBlock_elev[i], x[i], y[i], m)
+        np.testing.assert_array_equal(np.reshape(xCoor[i], np.shape(reference[0])), reference[0])
+        np.testing.assert_array_equal(np.reshape(yCoor[i], np.shape(reference[1])), reference[1])
+        np.testing.assert_array_equal(np.reshape(elev[i], np.shape(reference[2])), reference[2])
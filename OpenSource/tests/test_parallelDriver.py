@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+import findValue
+import batchInterpolation
+import parallelDriver
+import rasterCache
+
+methods = ['WP', 'WA25', 'BiQ9', 'BiC16']
+
+@pytest.fixture
+def dem(tmp_path):
+    band = np.random.default_rng(0).uniform(100, 200, (150, 120)).astype('float32')
+    band[5, 7] = -9999
+    path = str(tmp_path / 'dem.tif')
+    with rasterio.open(path, 'w', driver='GTiff', height=150, width=120, count=1, dtype='float32', transform=from_origin(0, 1500, 10, 10),
+                       nodata=-9999) as dst:
+        dst.write(band, 1)
+    return path, band
+
+def test_read_band_into(dem):
+    path, band = dem
+    out = np.zeros(band.shape, dtype=band.dtype)
+    with rasterio.open(path) as src:
+        findValue.readBandInto(src, out, stripRows=7) # the last strip is shorter
+    np.testing.assert_array_equal(out, band)
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_share_band(tmp_path, dem, cached):
+    path, band = dem
+    if cached:
+        shared = rasterCache.RasterCache(str(tmp_path / 'cache')).shareBand(path)
+    else:
+        shared = parallelDriver.shareBand(path, str(tmp_path / 'band.npy'))
+    np.testing.assert_array_equal(np.load(shared['path']), band)
+    assert shared['cellSize'] == 10 and shared['nodata'] == -9999
+
+def test_parallel_matches_serial(dem):
+    path, band = dem
+    rng = np.random.default_rng(1)
+    X, Y = rng.uniform(0, 1200, 500), rng.uniform(0, 1500, 500)
+    timing = {}
+    estimates = parallelDriver.interpolateParallel(X, Y, [path], methods, workers=2, chunkSize=128, timing=timing)
+
+    with rasterio.open(path) as src:
+        windows = findValue.extractWindows(X, Y, findValue.readBand(src), src.transform, 10.0, src.nodata)
+    serial = batchInterpolation.interpolateWindows(*(windows + (10.0, methods)))
+    for mth in methods:
+        np.testing.assert_array_equal(estimates[path][mth], serial[mth])
+        assert timing[path][mth] > 0
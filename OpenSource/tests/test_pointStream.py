@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+import findValue
+import batchInterpolation
+import pointStream
+
+@pytest.fixture
+def coordinates():
+    rng = np.random.default_rng(0)
+    return rng.uniform(0, 1000, 1003), rng.uniform(0, 1000, 1003)
+
+def checkChunks(chunks, X, Y, chunkSize):
+    assert [start for start, _, _ in chunks] == list(range(0, len(X), chunkSize))
+    assert all(len(chunkX) == chunkSize for _, chunkX, _ in chunks[:-1])
+    np.testing.assert_allclose(np.concatenate([chunkX for _, chunkX, _ in chunks]), X, rtol=1e-15)
+    np.testing.assert_allclose(np.concatenate([chunkY for _, _, chunkY in chunks]), Y, rtol=1e-15)
+
+def test_csv(tmp_path, coordinates):
+    X, Y = coordinates
+    pd.DataFrame({'x': X, 'y': Y}).to_csv(str(tmp_path / 'points.csv'), index=False, float_format='%.17g')
+    checkChunks(list(pointStream.readPoints(str(tmp_path / 'points.csv'), 100)), X, Y, 100)
+
+def test_shapefile(tmp_path, coordinates, monkeypatch):
+    fiona = pytest.importorskip('fiona')
+    X, Y = coordinates
+    path = str(tmp_path / 'points.shp')
+    schema = {'geometry': 'Point', 'properties': {'id': 'int'}}
+    with fiona.open(path, 'w', driver='ESRI Shapefile', schema=schema) as dst:
+        dst.writerecords({'geometry': {'type': 'Point', 'coordinates': (x, y)}, 'properties': {'id': i}}
+                         for i, (x, y) in enumerate(zip(X, Y)))
+
+    # the file is opened once for all chunks
+    opened = []
+    fionaOpen = fiona.open
+    monkeypatch.setattr(fiona, 'open', lambda *args, **kwargs: opened.append(args) or fionaOpen(*args, **kwargs))
+    checkChunks(list(pointStream.readPoints(path, 100)), X, Y, 100)
+    assert len(opened) == 1
+
+@pytest.fixture
+def grids(tmp_path, demFile):
+    '''
+    The demFile DEM (used as the benchmark) and a 20 m DEM aggregated from it
+    '''
+    path, band = demFile
+    coarse = band.astype('float64').reshape(100, 2, 85, 2).mean(axis=(1, 3)).astype('float32')
+    coarse[50, 40] = -9999
+    coarsePath = str(tmp_path / 'dem20m.tif')
+    with rasterio.open(coarsePath, 'w', driver='GTiff', height=100, width=85, count=1, dtype='float32', crs='EPSG:32617',
+                       transform=from_origin(500000, 4000000, 20, 20), nodata=-9999) as dst:
+        dst.write(coarse, 1)
+    return path, [path, coarsePath]
+
+def referenceRows(X, Y, benchmark, DEMs, methods):
+    # the benchmark elevations, the estimates of each DEM and method, and the residuals, from the per-DEM batch path
+    with rasterio.open(benchmark) as src:
+        elev = findValue.extractValues(X, Y, findValue.readBand(src), src.transform, src.nodata)
+    estimates = []
+    for dem in DEMs:
+        with rasterio.open(dem) as src:
+            x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = findValue.extractWindows(X, Y, findValue.readBand(src), src.transform,
+                                                                                          src.res[0], src.nodata)
+            z = batchInterpolation.interpolateWindows(x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, src.res[0], methods)
+        estimates += [z[mth] for mth in methods]
+    estimates = np.stack(estimates, axis=1)
+    return np.column_stack([elev, estimates, elev[:, np.newaxis] - estimates])
+
+@pytest.fixture
+def points(grids):
+    rng = np.random.default_rng(9)
+    X, Y = rng.uniform(499990, 501710, 1003), rng.uniform(3997990, 4000010, 1003)
+    X[:2], Y[:2] = [500805.0, 500805.0], [3998995.0, 3998985.0] # on the nodata pixels
+    return X, Y
+
+def test_evaluate_chunk(grids, points):
+    benchmark, DEMs = grids
+    X, Y = points
+    methods = ['WP', 'WA9', 'BiLi4', 'BiC16']
+    loaded = []
+    for dem in DEMs:
+        with rasterio.open(dem) as src:
+            loaded.append((findValue.readBand(src), src.transform, src.res[0], src.nodata))
+    rows = pointStream.evaluateChunk(X, Y, (loaded[0][0], loaded[0][1], loaded[0][3]), loaded, methods, backend='numpy')
+    expected = referenceRows(X, Y, benchmark, DEMs, methods)
+    assert np.isnan(expected[0, 0]) and np.isnan(expected[1, 5:9]).all()
+    np.testing.assert_allclose(rows, expected, rtol=1e-9)
+
+def test_stream_rows(tmp_path, grids, points):
+    benchmark, DEMs = grids
+    X, Y = points
+    methods = ['WA4', 'BiQ9']
+    pd.DataFrame({'x': X, 'y': Y}).to_csv(str(tmp_path / 'points.csv'), index=False, float_format='%.17g')
+    stats = pointStream.streamRows(str(tmp_path / 'points.csv'), benchmark, DEMs, [10, 20], methods, str(tmp_path / 'rows.csv'),
+                                   chunkSize=100, backend='numpy')
+
+    fields = ['WA410', 'BiQ910', 'WA420', 'BiQ920']
+    frame = pd.read_csv(str(tmp_path / 'rows.csv'))
+    assert list(frame.columns) == ['id', 'x', 'y', 'elev3m'] + fields + [fld + '_res' for fld in fields]
+    np.testing.assert_array_equal(frame['id'].values, np.arange(len(X)))
+    expected = referenceRows(X, Y, benchmark, DEMs, methods)
+    np.testing.assert_allclose(frame.values[:, 3:], expected, rtol=1e-9, atol=1e-9) # CSV precision
+
+    # the statistics are merged over the chunks
+    for i, fld in enumerate(fields):
+        residuals = pd.Series(expected[:, 1 + len(fields) + i]).dropna()
+        summary = stats.stats[fld].summary()
+        np.testing.assert_allclose([summary['MBE'], summary['STD'], summary['RMSE']],
+                                   [residuals.mean(), residuals.std(), np.sqrt((residuals ** 2).mean())], rtol=1e-9)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+import findValue
+import neighbors
+import polyInterpolation
+import baseline
+
+exactMethods = ['Li3', 'BiLi4', 'BiQ9', 'BiC16']
+bestFitMethods = ['Li5', 'BiLi9', 'BiQ16', 'BiQ25', 'BiC25']
+
+@pytest.fixture
+def windows():
+    '''
+    Points all over the central pixel of a 30 m DEM (and on the boundaries of its quadrants), and their 5*5 matrix
+    '''
+    rng = np.random.default_rng(7)
+    x, y = rng.uniform(-15, 15, 300), rng.uniform(-15, 15, 300)
+    x[:4], y[:4] = [0.0, 0.0, 3.0, -3.0], [3.0, -3.0, 0.0, 0.0]
+    rasterBlock_x, rasterBlock_y = findValue.localGrid(30.0)
+    rasterBlock_elev = 1000 + np.cumsum(rng.normal(0, 3, (len(x), 5, 5)), axis=1)
+    return x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev
+
+# This function returns the reference estimate of one point: the baseline neighbor pixels and the baseline fit (exact methods) or
+# a least-squares fit (best-fitting methods)
+def reference(method, x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev):
+    m, order = polyInterpolation.polyMethods[method]
+    xCoor, yCoor, elev = baseline.neighbors.neibr(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, m)
+    xCoor, yCoor, elev = np.ravel(xCoor), np.ravel(yCoor), np.ravel(elev)
+    if method in exactMethods:
+        return baseline.polyInterpolation.polyval2d(x, y, baseline.polyInterpolation.polyfit2d(xCoor, yCoor, elev, order))
+    coefficients = np.linalg.lstsq(polyInterpolation.polyTerms2d(xCoor, yCoor, order), elev, rcond=None)[0]
+    return np.dot(polyInterpolation.polyTerms2d(x, y, order), coefficients)
+
+@pytest.mark.parametrize('method', exactMethods)
+def test_polyfit2d_batch(windows, method):
+    x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = windows
+    m, order = polyInterpolation.polyMethods[method]
+    xCoor, yCoor, elev = neighbors.neibrBatch(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, m)
+    coefficients = polyInterpolation.polyfit2dBatch(xCoor, yCoor, elev, order)
+    for i in range(len(x)):
+        old = baseline.neighbors.neibr(rasterBlock_x, rasterBlock_y, rasterBlock_elev[i], x[i], y[i], m)
+        np.testing.assert_allclose(coefficients[i], baseline.polyInterpolation.polyfit2d(*[np.ravel(v) for v in old] + [order]),
+                                   rtol=1e-7, atol=1e-9)
+
+@pytest.mark.parametrize('method', exactMethods + bestFitMethods)
+def test_batch_and_kernel(windows, method):
+    x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = windows
+    expected = np.array([reference(method, x[i], y[i], rasterBlock_x, rasterBlock_y, rasterBlock_elev[i]) for i in range(len(x))])
+
+    xCoor, yCoor, elev = neighbors.neibrBatch(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, polyInterpolation.polyMethods[method][0])
+    np.testing.assert_allclose(polyInterpolation.polyInterpBatch(x, y, xCoor, yCoor, elev, method), expected, rtol=1e-9)
+    np.testing.assert_allclose(polyInterpolation.polyInterpKernel(x, y, elev, 30.0, method), expected, rtol=1e-9)
+
+    # coefficients shared by the points of a stencil, evaluated at the coordinates of each point
+    coefficients = polyInterpolation.stencilCoefficients(neighbors.quadrant(x, y), elev, method)
+    np.testing.assert_allclose(polyInterpolation.polyval2dBatch(x / 30.0, y / 30.0, coefficients), expected, rtol=1e-9)
+
+@pytest.mark.parametrize('method', bestFitMethods)
+def test_best_fit_residuals(method):
+    # a least-squares fit reproduces the polynomials of its own order exactly
+    m, order = polyInterpolation.polyMethods[method]
+    kernel = polyInterpolation.stencilKernel(method)
+    assert kernel.shape == (4, polyInterpolation.polyTerms2d(0.0, 0.0, order).shape[-1], m)
+    offsets = np.arange(-2, 3, dtype='float64')
+    rasterBlock_x, rasterBlock_y = np.meshgrid(offsets, -offsets)
+    coefficients = np.random.default_rng(8).normal(size=kernel.shape[1])
+    for q in range(4):
+        index = neighbors.stencilIndex[m][q]
+        elev = polyInterpolation.polyTerms2d(rasterBlock_x.ravel()[index], rasterBlock_y.ravel()[index], order).dot(coefficients)
+        np.testing.assert_allclose(kernel[q].dot(elev), coefficients, atol=1e-9)
+
+def test_wrong_stencil_size(windows):
+    x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = windows
+    xCoor, yCoor, elev = neighbors.neibrBatch(rasterBlock_x, rasterBlock_y, rasterBlock_elev, x, y, 9)
+    with pytest.raises(ValueError):
+        polyInterpolation.polyInterpBatch(x, y, xCoor, yCoor, elev, 'BiC16')
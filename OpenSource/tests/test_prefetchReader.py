@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+import rasterio
+
+import findValue
+import blockCache
+import instrumentation
+import prefetchReader
+
+@pytest.mark.parametrize('workers, depth', [(1, 1), (4, 8)])
+def test_windows(demFile, monkeypatch, workers, depth):
+    path, band = demFile
+    rng = np.random.default_rng(11)
+    with rasterio.open(path) as dataset:
+        left, bottom, right, top = dataset.bounds
+        X, Y = rng.uniform(left - 20, right + 20, 3000), rng.uniform(bottom - 20, top + 20, 3000)
+        x, y, _, _, rasterBlock_elev = findValue.extractWindows(X, Y, findValue.readBand(dataset), dataset.transform, 10.0,
+                                                               dataset.nodata)
+        # the same blocks read by a single block reader
+        sequential = blockCache.BlockCache(dataset, 0)
+        for _ in blockCache.iterBlockWindows(X, Y, sequential):
+            pass
+
+    monkeypatch.setattr(instrumentation, 'profiler', instrumentation.Profiler(enabled=True))
+    visited = np.zeros(len(X), dtype='int64')
+    with prefetchReader.PrefetchReader(path, workers, depth) as reader:
+        for index, blockX, blockY, blockElev in reader.windows(X, Y):
+            visited[index] += 1
+            np.testing.assert_array_equal(blockX, x[index])
+            np.testing.assert_array_equal(blockY, y[index])
+            np.testing.assert_array_equal(blockElev, rasterBlock_elev[index])
+        report = reader.report()
+    assert (visited == 1).all()
+
+    # each block is read once, by one of the threads
+    assert report['blocks'] == sequential.misses and report['bytesRead'] == sequential.bytesRead > 0
+    record = [r for r in instrumentation.profiler.report() if r['stage'] == 'window read'][0]
+    assert record['bytesRead'] == report['bytesRead'] and record['calls'] == report['blocks']
+    assert report['ioWait'] >= 0 and report['compute'] >= 0
@@ -0,0 +1,90 @@
+import os
+import json
+import numpy as np
+import rasterio
+
+import coefficientCube
+import rasterCache
+
+def test_band(tmp_path, demFile, monkeypatch):
+    path, band = demFile
+    cache = rasterCache.RasterCache(str(tmp_path / 'cache'))
+    cached, shared = cache.band(path)
+    np.testing.assert_array_equal(cached, band)
+    assert shared['cellSize'] == 10.0 and shared['nodata'] == -9999 and (cache.hits, cache.misses) == (0, 1)
+
+    # a hit only updates the last use in memory; the index is saved by flush
+    saved = []
+    monkeypatch.setattr(cache, '_save', lambda save=cache._save: saved.append(1) or save())
+    cache.band(path)
+    assert (cache.hits, cache.misses) == (1, 1) and saved == [] and cache.dirty
+    cache.flush()
+    assert saved == [1] and not cache.dirty
+    cache.flush()
+    assert saved == [1]
+
+    # the entries are reused by the next runs
+    cache = rasterCache.RasterCache(str(tmp_path / 'cache'))
+    np.testing.assert_array_equal(cache.band(path)[0], band)
+    assert (cache.hits, cache.misses) == (1, 0)
+
+def test_invalidation(tmp_path, demFile):
+    path, band = demFile
+    cache = rasterCache.RasterCache(str(tmp_path / 'cache'))
+    cache.band(path)
+
+    # touched but not modified: same content hash
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 100))
+    cache.band(path)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # modified: the entry is built again and the stale one is removed
+    with rasterio.open(path, 'r+') as src:
+        src.write(band + 1, 1)
+    np.testing.assert_array_equal(cache.band(path)[0], band + 1)
+    assert (cache.hits, cache.misses) == (1, 2) and cache.report()['entries'] == 1
+    assert sorted(os.listdir(str(tmp_path / 'cache'))) == sorted(['index.json', list(cache.index['entries'].values())[0]['file']])
+
+def test_eviction(tmp_path, demFile):
+    path, band = demFile
+    paths = [path]
+    for name in ['dem30m.tif', 'dem100m.tif']:
+        paths.append(str(tmp_path / name))
+        with rasterio.open(path) as src:
+            profile = src.profile
+        with rasterio.open(paths[-1], 'w', **profile) as dst:
+            dst.write(band + len(paths), 1)
+
+    # room for two bands: the least recently used band is evicted
+    cache = rasterCache.RasterCache(str(tmp_path / 'cache'), maxBytes=int(2.5 * band.nbytes))
+    cache.band(paths[0])
+    cache.band(paths[1])
+    cache.band(paths[0])
+    cache.band(paths[2])
+    with open(cache.indexPath) as f:
+        sources = sorted(entry['source'] for entry in json.load(f)['entries'].values())
+    assert sources == sorted(os.path.abspath(p) for p in [paths[0], paths[2]])
+    assert cache.size() <= cache.maxBytes
+
+    # an entry larger than the cache is kept until the next insertion
+    cache = rasterCache.RasterCache(str(tmp_path / 'small'), maxBytes=1)
+    np.testing.assert_array_equal(cache.band(paths[1])[0], band + 2)
+    assert cache.report()['entries'] == 1
+
+def test_coefficient_cube(tmp_path, demFile):
+    path, band = demFile
+    cache = rasterCache.RasterCache(str(tmp_path / 'cache'))
+    cube = np.array(cache.coefficientCube(path, 'BiQ9', blockSize=37))
+    np.testing.assert_array_equal(cube, coefficientCube.buildCoefficientCube(band, 'BiQ9', -9999, blockSize=37))
+    assert sorted(entry['kind'] for entry in cache.index['entries'].values()) == ['band', 'coefficients']
+
+    cache.coefficientCube(path, 'BiQ9')
+    cache.coefficientCube(path, 'BiLi4')
+    assert cache.report()['entries'] == 3
+
+    # the cubes are invalidated with their source (the constant term of the new surface is one more)
+    with rasterio.open(path, 'r+') as src:
+        src.write(np.where(band == -9999, band, band + 1), 1)
+    np.testing.assert_allclose(cache.coefficientCube(path, 'BiQ9')[..., 0], cube[..., 0] + 1)
+    assert cache.report()['entries'] == 3
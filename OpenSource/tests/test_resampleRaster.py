@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+import findValue
+import batchInterpolation
+import resampleRaster
+
+@pytest.fixture
+def benchmarkFile(tmp_path):
+    '''
+    A 2.5 m benchmark DEM that overlaps the edges of the demFile DEM (its last columns are outside of it), with one nodata pixel
+    '''
+    rng = np.random.default_rng(5)
+    band = (500 + rng.normal(0, 5, (230, 190))).astype('float32')
+    band[7, 11] = -9999
+    path = str(tmp_path / 'dem3m.tif')
+    with rasterio.open(path, 'w', driver='GTiff', height=230, width=190, count=1, dtype='float32', crs='EPSG:32617',
+                       transform=from_origin(501300, 3999900, 2.5, 2.5), nodata=-9999) as dst:
+        dst.write(band, 1)
+    return path, band
+
+def test_pixel_centers():
+    transform = from_origin(100, 200, 2, 2)
+    X, Y = resampleRaster.pixelCenters(Window(3, 1, 2, 2), transform)
+    np.testing.assert_array_equal(X, [107, 109, 107, 109])
+    np.testing.assert_array_equal(Y, [197, 197, 195, 195])
+
+@pytest.mark.parametrize('method', ['WA9', 'BiLi4', 'BiC16'])
+def test_resample(tmp_path, demFile, benchmarkFile, method):
+    path, band = demFile
+    benchmark, reference = benchmarkFile
+    output, residual = str(tmp_path / 'z.tif'), str(tmp_path / 'residual.tif')
+    report, stats = resampleRaster.resampleDEM(path, benchmark, output, residual, method, blockSize=64, cacheBlocks=2)
+    assert report['pixels'] == reference.size
+
+    # the estimates at the pixel centers of the benchmark, from the whole band of the coarse DEM
+    with rasterio.open(path) as src, rasterio.open(benchmark) as ref:
+        X, Y = resampleRaster.pixelCenters(Window(0, 0, ref.width, ref.height), ref.transform)
+        x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev = findValue.extractWindows(X, Y, findValue.readBand(src), src.transform,
+                                                                                      10.0, src.nodata)
+    expected = batchInterpolation.interpolateMethod(method, x, y, rasterBlock_x, rasterBlock_y, rasterBlock_elev, 10.0)
+    expected = expected.reshape(reference.shape)
+    assert np.isnan(expected[:, -1]).all() and not np.isnan(expected[:, 0]).any()
+
+    with rasterio.open(output) as dst:
+        z = dst.read(1, masked=True).astype('float64').filled(np.nan)
+    np.testing.assert_allclose(z, expected.astype('float32'), rtol=0)
+
+    elev = reference.astype('float64')
+    elev[reference == -9999] = np.nan
+    with rasterio.open(residual) as res:
+        np.testing.assert_allclose(res.read(1, masked=True).astype('float64').filled(np.nan), (elev - expected).astype('float32'), rtol=0)
+
+    # the statistics are accumulated window by window
+    values = pd.Series((elev - expected).ravel()).dropna()
+    summary = stats.summary()
+    assert stats.count == len(values)
+    np.testing.assert_allclose([summary['MBE'], summary['STD'], summary['MIN'], summary['MAX']],
+                               [values.mean(), values.std(), values.min(), values.max()], rtol=1e-9)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import residualStats
+
+@pytest.fixture
+def residuals():
+    res = np.random.default_rng(0).normal(0.3, 2.0, 5000)
+    res[::97] = np.nan
+    return res
+
+# statistics of the ArcPy version (ArcPy/main.py), computed in memory
+def arcpyStats(res):
+    res = res[~np.isnan(res)]
+    MBE, STD = res.mean(), res.std()
+    newRes = res[(res >= MBE - 1.96 * STD) & (res <= MBE + 1.96 * STD)]
+    return {'RMSE': np.sqrt((res ** 2).mean()), 'MAE': np.abs(res).mean(), 'MBE': MBE, 'STD': STD, 'MIN': res.min(),
+            'MAX': res.max(), 'upperLim': MBE + 1.96 * STD, 'LowerLim': MBE - 1.96 * STD, 'RMSE95': np.sqrt((newRes ** 2).mean())}
+
+def test_chunks_match_pandas(residuals):
+    stats = residualStats.ResidualStats()
+    for chunk in np.array_split(residuals, 7):
+        stats.update(chunk)
+    summary = stats.summary()
+    series = pd.Series(residuals)
+    np.testing.assert_allclose(summary['RMSE'], ((series) ** 2).mean() ** 0.5)
+    np.testing.assert_allclose(summary['MAE'], series.abs().mean())
+    np.testing.assert_allclose(summary['MBE'], series.mean())
+    np.testing.assert_allclose(summary['STD'], series.std())
+    assert summary['MIN'] == series.min() and summary['MAX'] == series.max()
+
+def test_merge_matches_arcpy(residuals):
+    # workers accumulate their chunks separately, then the accumulators are merged and the second pass gives the exact RMSE95
+    chunks = np.array_split(residuals, 5)
+    workers = [residualStats.ResidualStats(ddof=0) for _ in range(2)]
+    for i, chunk in enumerate(chunks):
+        workers[i % 2].update(chunk)
+    stats = residualStats.ResidualStats(ddof=0)
+    for worker in workers:
+        stats.merge(worker)
+    for chunk in chunks:
+        stats.rmse95Pass(chunk)
+    summary = stats.summary()
+    for name, value in arcpyStats(residuals).items():
+        np.testing.assert_allclose(summary[name], value, rtol=1e-12, err_msg=name)
+
+def test_histogram_rmse95(residuals):
+    stats = residualStats.ResidualStats(binWidth=0.01, ddof=0)
+    stats.update(residuals)
+    np.testing.assert_allclose(stats.rmse95(), arcpyStats(residuals)['RMSE95'], rtol=1e-3)
+
+def test_empty():
+    stats = residualStats.ResidualStats()
+    stats.update(np.full(10, np.nan))
+    stats.update([])
+    summary = stats.summary()
+    assert sorted(summary) == sorted(residualStats.StatsTable.columns)
+    assert all(np.isnan(value) for value in summary.values())
+
+def test_table():
+    table = residualStats.StatsTable(['BiC16', 'WA25'])
+    table.update('BiC16', [1.0, -1.0, 2.0])
+    df = table.toDataFrame()
+    assert df.loc['BiC16', 'MAX'] == 2.0
+    assert df.loc['WA25'].isna().all()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import resultStore
+
+resolutions = [10, 30, 100]
+methods = ['WP', 'WA4', 'BiC16']
+
+def filledTable(dtype='float64', path=None):
+    rng = np.random.default_rng(0)
+    table = resultStore.ResultTable(rng.uniform(0, 1000, 50), rng.uniform(0, 1000, 50), resolutions, methods, dtype, path)
+    table.benchmark[:] = rng.uniform(100, 200, 50)
+    for res in resolutions:
+        for mth in methods:
+            table.column(res, mth)[:] = table.benchmark + rng.normal(0, 1, 50)
+    table.column(30, 'WA4')[7] = np.nan
+    return table
+
+def test_columns():
+    table = filledTable()
+    assert table.fields() == ['WP10', 'WA410', 'BiC1610', 'WP30', 'WA430', 'BiC1630', 'WP100', 'WA4100', 'BiC16100']
+
+    # the tables of the original workflow: one column per field, residuals = elev3m - estimated elevation
+    samples = table.toDataFrame()
+    residuals = table.toDataFrame(residuals=True)
+    for res in resolutions:
+        for mth in methods:
+            np.testing.assert_array_equal(samples[mth + str(res)], table.column(res, mth))
+            pd.testing.assert_series_equal(residuals[mth + str(res)], samples['elev3m'] - samples[mth + str(res)], check_names=False)
+    assert np.isnan(residuals['WA430'][7])
+    assert list(samples.columns[:3]) == ['x', 'y', 'elev3m']
+
+@pytest.mark.parametrize('dtype', ['float32', 'float64'])
+def test_npz(tmp_path, dtype):
+    table = filledTable(dtype)
+    table.writeNpz(str(tmp_path / 'results.npz'))
+    loaded = resultStore.readNpz(str(tmp_path / 'results.npz'))
+    assert loaded.estimates.dtype == dtype and loaded.methods == methods and loaded.resolutions == resolutions
+    np.testing.assert_array_equal(loaded.estimates, table.estimates)
+    np.testing.assert_array_equal(loaded.benchmark, table.benchmark)
+    np.testing.assert_array_equal(loaded.X, table.X)
+
+def test_memmap(tmp_path):
+    table = filledTable(path=str(tmp_path / 'estimates.npy'))
+    table.estimates.flush()
+    np.testing.assert_array_equal(np.load(str(tmp_path / 'estimates.npy')), table.estimates)
+
+def test_parquet(tmp_path):
+    pytest.importorskip('pyarrow')
+    table = filledTable()
+    table.writeParquet(str(tmp_path / 'samples.parquet'))
+    pd.testing.assert_frame_equal(pd.read_parquet(str(tmp_path / 'samples.parquet')), table.toDataFrame())